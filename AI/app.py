@@ -1,188 +1,951 @@
-from flask import Flask, request, jsonify
+import time
+
+STARTED_AT = time.perf_counter()
+
+import os
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context, url_for
 from flask_cors import CORS
-import pandas as pd
-import joblib
+from coalescer import MicroBatcher
+from job_queue import FINISHED, InFlight, JobQueue, JobQueueFull, job_summary
+from metrics import BATCH_RECORDS_TOTAL, Metrics, RequestTimer, record_request
+from prediction_cache import PredictionCache
+from model_store import ModelNotLoaded, ServedModel, start_loading, watch_registry
+from model_specs import AI_DIR, COMMUNITY, COMMUNITY_RESOURCES, INDIVIDUAL
+from request_schema import SchemaError
+from sampling_profiler import SamplingProfiler
+
+# pandas, joblib and sklearn are imported on first use rather than here, so a
+# cold start can begin serving /api/health before any model work happens.
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
-# ================== LOAD INDIVIDUAL MODEL ==================
-try:
-    schemes_model = joblib.load("D:/Tribal-Earth-360/AI/Individual/schemes_model.pkl")
-    print("✅ Individual model loaded successfully from 'schemes_model.pkl'")
-    individual_model_loaded = True
-except Exception as e:
-    print(f"❌ Error loading individual model: {e}")
-    individual_model_loaded = False
-
-# ================== LOAD COMMUNITY MODEL ==================
-try:
-    community_model = joblib.load("D:/Tribal-Earth-360/AI/Community/community_model.pkl")
-    print("✅ Community model loaded successfully from 'community_model.pkl'")
-    community_model_loaded = True
-except Exception as e:
-    print(f"❌ Error loading community model: {e}")
-    community_model_loaded = False
-
-# ================== LOAD COMMUNITY RESOURCES DSS MODEL ==================
-try:
-    community_resources_model = joblib.load(
-        "D:/Tribal-Earth-360/AI/community resource/community_resources_model.pkl"
+# With AI_MODEL_MMAP=1 NumPy arrays inside the (uncompressed) .pkl files are
+# memory-mapped read-only instead of copied, so worker processes share them.
+MODEL_MMAP_MODE = 'r' if os.environ.get("AI_MODEL_MMAP", "0") == "1" else None
+
+# With AI_FAST_INFERENCE=1 each loaded pipeline is also compiled into flat NumPy
+# arrays (see fast_inference.py) and single-record routes skip pandas entirely.
+FAST_INFERENCE = os.environ.get("AI_FAST_INFERENCE", "0") == "1"
+
+# With AI_TABULATE=1 all-categorical models (community, community resources) are
+# evaluated once over every decision-relevant input combination at load time
+# and answer from a lookup table (see lookup_table.py). Models whose table would
+# exceed AI_TABULATE_MAX_CELLS cells, or that have numeric inputs, fall back.
+TABULATE = os.environ.get("AI_TABULATE", "0") == "1"
+TABULATE_MAX_CELLS = int(os.environ.get("AI_TABULATE_MAX_CELLS", 250_000))
+
+# With AI_MODEL_FORMAT=compact models load from their memory-mapped .compact
+# artifacts (see compact_model.py) when present, falling back to the .pkl files.
+MODEL_FORMAT = os.environ.get("AI_MODEL_FORMAT", "pickle")
+
+# With AI_VOCABULARY_ENCODING=1 requests for sklearn pipelines are encoded by
+# dict lookups into each model's vocabulary and fed straight to the forests,
+# skipping the ColumnTransformer (see encoding_store.py); identical results.
+VOCABULARY_ENCODING = os.environ.get("AI_VOCABULARY_ENCODING", "0") == "1"
+
+# ================== MODELS ==================
+# Features, scheme mappings and artifact paths come from the specs shared with
+# the training library (model_specs.py). Artifacts are resolved against
+# AI_MODEL_DIR and loaded according to AI_MODEL_LOADING (lazy / background /
+# eager), see model_store.py.
+def serve(spec):
+    return ServedModel(
+        spec.name, spec.label, spec.artifact_file,
+        spec.features, spec.scheme_mapping, MODEL_MMAP_MODE, FAST_INFERENCE,
+        TABULATE, TABULATE_MAX_CELLS, MODEL_FORMAT == 'compact', VOCABULARY_ENCODING
     )
-    print("✅ Community Resources DSS model loaded successfully")
-    community_resources_model_loaded = True
-except Exception as e:
-    print(f"❌ Error loading community resources DSS model: {e}")
-    community_resources_model_loaded = False
-
-# ================== FEATURES ==================
-# Individual features
-individual_features = [
-    "State", "Scheduled Tribe", "Other Traditional Forest Dweller", "Age",
-    "For Habitation", "For Self-Cultivation", "DisputedLands", "Pattas",
-    "Land from Where Displaced Without Compensation", "Extent of Land in Forest Villages"
-]
-
-# Community features
-community_features = [
-    "State", "FDST community", "OTFD community", "Community rights such as nistar",
-    "Rights over minor forest produce", "Uses", "Grazing",
-    "Traditional resource access for nomadic and pastoralist",
-    "Community tenures of habitat and habitation",
-    "Right to access biodiversity", "Other traditional rights"
-]
-
-# Community Resources DSS features
-community_resources_features = [
-    "Village", "Gram Panchayat", "Taluka", "District",
-    "Compartment No", "Bordering Villages", "List of Evidence in Support"
-]
-
-# ================== SCHEME MAPPINGS ==================
-# Individual schemes
-individual_scheme_mapping = {
-    0: {"name": "ST/OTFD Scholarship", "desc": "Educational scholarships for students from Scheduled Tribe/Other Traditional Forest Dweller communities."},
-    1: {"name": "Rehabilitation & Resettlement Package", "desc": "Compensation and support for persons displaced without prior compensation."},
-    2: {"name": "PM-KISAN Scheme", "desc": "Financial assistance for land-holding farmers."},
-    3: {"name": "PM Awas Yojana (Housing Scheme)", "desc": "Housing assistance for eligible rural families."},
-}
 
-# Community schemes
-community_scheme_mapping = {
-    0: {"name": "Community Forest Rights (CFR) Recognition", "desc": "Formal recognition of rights over common forest lands, as per the Forest Rights Act."},
-    1: {"name": "Minor Forest Produce (MFP) Support Scheme", "desc": "Financial and technical support for sustainable harvesting and marketing of forest produce."},
-    2: {"name": "Customary Grazing Rights Recognition", "desc": "Recognition of traditional grazing rights in forest areas."},
-}
+individual_model = serve(INDIVIDUAL)
+community_model = serve(COMMUNITY)
+community_resources_model = serve(COMMUNITY_RESOURCES)
 
-# Community Resources DSS schemes
-community_resources_scheme_mapping = {
-    0: {"name": "Community Infrastructure Grant", "desc": "Grant for developing community infrastructure, based on community resolutions and evidence."},
-    1: {"name": "Resource Conservation Fund", "desc": "Funding for projects to conserve and protect specific forest compartments."},
+served_models = {
+    served.name: served for served in (individual_model, community_model, community_resources_model)
 }
 
+# ================== REQUEST COALESCING (optional) ==================
+# With AI_COALESCE=1 concurrent single-record requests for the same model are
+# queued for up to AI_COALESCE_MAX_WAIT_MS and scored with one predict() call of
+# at most AI_COALESCE_MAX_BATCH records (see coalescer.py).
+COALESCE = os.environ.get("AI_COALESCE", "0") == "1"
+COALESCE_MAX_BATCH = int(os.environ.get("AI_COALESCE_MAX_BATCH", 32))
+COALESCE_MAX_WAIT_MS = float(os.environ.get("AI_COALESCE_MAX_WAIT_MS", 5))
+
+def make_batcher(served):
+    if not COALESCE:
+        return None
+    def predict_batch(records, active):
+        # Scored by the version each request pinned, never re-resolved here
+        labels, probabilities = records_scores(active, records)
+        return list(zip(labels, probabilities))
+    return MicroBatcher(served.name, predict_batch, COALESCE_MAX_BATCH, COALESCE_MAX_WAIT_MS / 1000)
+
+# ================== PREDICTION CACHE ==================
+# Identical forms are resubmitted constantly while officers edit them, so each
+# model gets an LRU/TTL cache keyed by its normalized feature vector
+# (see prediction_cache.py). AI_CACHE_MAX_ENTRIES=0 turns caching off.
+CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", 10000))
+CACHE_MAX_BYTES = int(os.environ.get("AI_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+CACHE_TTL_SECONDS = float(os.environ.get("AI_CACHE_TTL_SECONDS", 300))
+
+def make_cache():
+    if CACHE_MAX_ENTRIES <= 0:
+        return None
+    return PredictionCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_SECONDS)
+
+for served in served_models.values():
+    served.batcher = make_batcher(served)
+    served.cache = make_cache()
+
+start_loading(served_models.values())
+watch_registry(served_models.values())
+
+# ================== MULTI-MODEL SCREENING ==================
+# /api/screen checks one form against several models at once. Each model is
+# scored on a small shared thread pool (the forests release the GIL in NumPy),
+# so the response takes about as long as the slowest model rather than the sum.
+SCREEN_WORKERS = int(os.environ.get("AI_SCREEN_WORKERS", len(served_models)))
+_screen_pool = None
+_screen_pool_lock = threading.Lock()
+
+def screen_pool():
+    global _screen_pool
+    with _screen_pool_lock:
+        if _screen_pool is None:
+            _screen_pool = ThreadPoolExecutor(max_workers=max(1, SCREEN_WORKERS), thread_name_prefix='screen')
+    return _screen_pool
+
+# ================== SCORING JOBS ==================
+# Registers too large for one request are submitted to /api/jobs and scored in
+# the background, with results kept in a local SQLite store (see job_queue.py).
+# At most AI_JOB_MAX_RUNNING jobs run at once across all worker processes,
+# submissions beyond AI_JOB_MAX_PENDING waiting jobs are answered 429, and job
+# threads step aside between chunks while interactive requests are in flight.
+JOB_DIR = os.environ.get("AI_JOB_DIR", os.path.join(AI_DIR, "jobs"))
+JOB_MAX_UPLOAD_BYTES = int(float(os.environ.get("AI_JOB_MAX_UPLOAD_MB", 256)) * 1024 * 1024)
+JOB_PAGE_SIZE = int(os.environ.get("AI_JOB_PAGE_SIZE", 500))
+JOB_MAX_PAGE_SIZE = int(os.environ.get("AI_JOB_MAX_PAGE_SIZE", 5000))
+
+# The routes someone is waiting on; job threads yield to these
+INTERACTIVE_ENDPOINTS = {'predict_individual', 'predict_community', 'predict_community_resources', 'screen'}
+interactive_requests = InFlight()
+
+def open_job_scorer(job):
+    """
+    (model version, score) for a job: one version for the whole job, like a
+    /batch stream. A resumed job keeps the version it started with, and fails
+    if that version is gone rather than mixing results of two versions.
+    """
+    served = served_models[job['model']]
+    active = served.get_version(job['model_version']) if job['model_version'] else served.get()
+    def score(chunk):
+        return score_chunk(served, active, chunk, job['options'])[0]
+    return active.version, score
+
+job_queue = JobQueue(
+    JOB_DIR, open_job_scorer, interactive_requests,
+    workers=int(os.environ.get("AI_JOB_WORKERS", 1)),
+    max_running=int(os.environ.get("AI_JOB_MAX_RUNNING", 1)),
+    max_pending=int(os.environ.get("AI_JOB_MAX_PENDING", 8)),
+    chunk_size=int(os.environ.get("AI_JOB_CHUNK_SIZE", 250)),
+    max_yield=float(os.environ.get("AI_JOB_MAX_YIELD_MS", 100)) / 1000,
+    stale_after=float(os.environ.get("AI_JOB_STALE_SECONDS", 120)),
+    ttl=float(os.environ.get("AI_JOB_TTL_HOURS", 72)) * 3600,
+)
+
+# Reload/rollback/profiler/job admin routes require this token in X-Admin-Token.
+# Without one they are refused, unless AI_ADMIN_OPEN=1 opens them explicitly
+# (local development only: the service listens on all interfaces).
+ADMIN_TOKEN = os.environ.get("AI_ADMIN_TOKEN")
+ADMIN_OPEN = os.environ.get("AI_ADMIN_OPEN", "0") == "1"
+
+# ================== INSTRUMENTATION ==================
+# Every request is timed stage by stage (parse, features, transform, predict,
+# serialize) and folded into per-route, per-model histograms served from
+# /metrics (see metrics.py). The sampling profiler keeps stacks of requests
+# slower than AI_PROFILER_SLOW_MS; it is off unless AI_PROFILER=1 and can be
+# switched at runtime through /api/profiler (see sampling_profiler.py).
+metrics = Metrics()
+profiler = SamplingProfiler(
+    enabled=os.environ.get("AI_PROFILER", "0") == "1",
+    interval=float(os.environ.get("AI_PROFILER_INTERVAL_MS", 5)) / 1000,
+    slow_seconds=float(os.environ.get("AI_PROFILER_SLOW_MS", 250)) / 1000,
+    sample_rate=float(os.environ.get("AI_PROFILER_SAMPLE_RATE", 1.0)),
+)
+
+def span(stage):
+    """Times a stage of the current request; a no-op outside one (e.g. in the coalescer thread)."""
+    timer = g.get('timer') if has_request_context() else None
+    return timer.span(stage) if timer is not None else nullcontext()
+
+def label_request(served):
+    """Attributes the current request's metrics to a model."""
+    timer = g.get('timer')
+    if timer is not None:
+        timer.model = served.name
+
+def prediction_error(e):
+    """Counts a failed prediction and builds the error body the frontend expects."""
+    timer = g.get('timer')
+    if timer is not None:
+        timer.fail(e)
+    return jsonify({'success': False, 'error': str(e)})
+
+def request_error(e):
+    """A payload rejected by validation (SchemaError): same body, plus the field, with its 4xx status."""
+    timer = g.get('timer')
+    if timer is not None:
+        timer.fail(e)
+    body = {'success': False, 'error': str(e)}
+    if e.field is not None:
+        body['field'] = e.field
+    return jsonify(body), e.status
+
+@app.before_request
+def start_request_timer():
+    g.timer = RequestTimer(request.url_rule.rule if request.url_rule else 'unmatched')
+    g.profile = profiler.begin()
+    if request.endpoint in INTERACTIVE_ENDPOINTS:
+        interactive_requests.enter()
+        g.interactive = True
+
+@app.after_request
+def note_response_status(response):
+    timer = g.get('timer')
+    if timer is not None:
+        timer.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_timer(error):
+    # Runs after a streamed batch response has been fully sent
+    if g.pop('interactive', False):
+        interactive_requests.exit()
+    timer = g.pop('timer', None)
+    if timer is None:
+        return
+    if error is not None and timer.error is None:
+        timer.fail(error)
+    duration = timer.elapsed()
+    record_request(metrics, timer, duration)
+    profiler.end(g.pop('profile', None), duration, {
+        'method': request.method,
+        'route': timer.route,
+        'model': timer.model,
+        'status': timer.status,
+        'error': timer.error,
+        'spans_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timer.spans.items()},
+    })
+
+def collect_model_metrics():
+    for name, served in served_models.items():
+        yield 'ai_model_loaded', {'model': name, 'version': served.version or ''}, int(served.loaded)
+        if served.cache is not None:
+            stats = served.cache.stats()
+            yield 'ai_prediction_cache_hits_total', {'model': name}, stats['hits']
+            yield 'ai_prediction_cache_misses_total', {'model': name}, stats['misses']
+            yield 'ai_prediction_cache_entries', {'model': name}, stats['entries']
+        if served.batcher is not None:
+            yield 'ai_coalescer_queue_depth', {'model': name}, served.batcher.stats()['queue_depth']
+    yield 'ai_profiler_enabled', {}, int(profiler.enabled)
+    # Only once jobs were used; a scrape should not create the job store
+    if os.path.exists(job_queue.store.path):
+        for status, count in job_queue.store.counts().items():
+            yield 'ai_jobs', {'status': status}, count
+
+metrics.describe('ai_model_loaded', 'gauge', "1 if the model is loaded, labelled with the served version.")
+metrics.describe('ai_prediction_cache_hits_total', 'counter', "Prediction cache hits.")
+metrics.describe('ai_prediction_cache_misses_total', 'counter', "Prediction cache misses.")
+metrics.describe('ai_prediction_cache_entries', 'gauge', "Entries held in the prediction cache.")
+metrics.describe('ai_coalescer_queue_depth', 'gauge', "Records waiting in the request coalescer.")
+metrics.describe('ai_profiler_enabled', 'gauge', "1 while the sampling profiler is switched on.")
+metrics.describe('ai_jobs', 'gauge', "Scoring jobs in the job store, by status.")
+metrics.add_collector(collect_model_metrics)
+
+# ================== BATCH SETTINGS ==================
+# Number of records scored per vectorized predict() call on the /batch routes.
+# Can be overridden per request with the `chunkSize` query parameter.
+DEFAULT_BATCH_CHUNK_SIZE = int(os.environ.get("AI_BATCH_CHUNK_SIZE", 500))
+MAX_BATCH_CHUNK_SIZE = int(os.environ.get("AI_BATCH_MAX_CHUNK_SIZE", 5000))
+
+# ================== HELPERS ==================
+
+def recommend_schemes(predictions, scheme_mapping):
+    """Turns one row of model output into the list of recommended schemes."""
+    return [
+        {'name': scheme_mapping[i]['name'], 'description': scheme_mapping[i]['desc']}
+        for i, eligible in enumerate(predictions) if eligible
+    ]
+
+def flag(value):
+    """A boolean option: JSON true/false, or a query-string 'true'/'false'/'1'/'0' in any case."""
+    if isinstance(value, str):
+        return value.strip().lower() not in ('', 'false', '0')
+    return bool(value)
+
+def scoring_options(data=None):
+    """
+    Reads the optional scoring parameters from the JSON body or, for the batch
+    routes, the query string: `threshold` (0-1, eligibility cut-off applied to
+    the probabilities instead of the model's labels), `topK` (number of ranked
+    schemes to return) and `includeProbabilities`. Returns None when none is
+    given, so responses stay exactly as before. Raises SchemaError (400).
+    """
+    source = data if isinstance(data, dict) else request.args
+    threshold = source.get('threshold')
+    top_k = source.get('topK')
+    include = source.get('includeProbabilities')
+    if threshold is None and top_k is None and (include is None or not flag(include)):
+        return None
+    if threshold is not None:
+        try:
+            # JSON true/false are ints to Python, not thresholds
+            threshold = math.nan if isinstance(threshold, bool) else float(threshold)
+        except (TypeError, ValueError):
+            threshold = math.nan
+        if not 0 <= threshold <= 1:
+            raise SchemaError("threshold must be between 0 and 1", status=400, field='threshold')
+    if top_k is not None:
+        if isinstance(top_k, bool) or (isinstance(top_k, float) and not top_k.is_integer()):
+            top_k = 0
+        try:
+            top_k = int(top_k)
+        except (TypeError, ValueError):
+            top_k = 0
+        if top_k < 1:
+            raise SchemaError("topK must be an integer of at least 1", status=400, field='topK')
+    return {'threshold': threshold, 'top_k': top_k}
+
+def request_body():
+    """The JSON object a prediction request was sent with. Raises SchemaError (400)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise SchemaError("Request body must be a JSON object", status=400)
+    return data
+
+def read_prediction_request():
+    """(userData, scoring options) of a single-record request. Raises SchemaError (400)."""
+    data = request_body()
+    return data.get('userData', {}), scoring_options(data)
+
+def subject_fields(served, user_data):
+    """The name each model's route reports the prediction for."""
+    if served is individual_model:
+        return {'userName': user_data.get('Name of the Claimant', 'Applicant')}
+    if served is community_model:
+        return {'community': f"{user_data.get('FDST community', '')} / {user_data.get('OTFD community', '')}"}
+    return {'communityName': user_data.get('Village', 'Community')}
+
+def scheme_fields(scores, scheme_mapping, options):
+    """Response fields for one scored record: the usual list, plus probabilities and ranking on request."""
+    labels, probabilities = scores
+    if options is None:
+        return {'recommendedSchemes': recommend_schemes(labels, scheme_mapping)}
+    from scoring import rank_schemes
+    return rank_schemes(labels, probabilities, scheme_mapping, **options)
+
+def pipeline_scores(model, frame):
+    """
+    (labels, probabilities) for a DataFrame from a single predict_proba() pass
+    (see scoring.py). Labels equal Pipeline.predict. Preprocessing and the
+    forest are timed as separate stages.
+    """
+    from scoring import model_classes, proba_list, scores_from_proba
+    steps = getattr(model, 'steps', None) or [(None, model)]
+    with span('transform'):
+        for _, step in steps[:-1]:
+            if step is not None and step != 'passthrough':
+                frame = step.transform(frame)
+    with span('predict'):
+        classifier = steps[-1][1]
+        return scores_from_proba(model_classes(classifier), proba_list(classifier.predict_proba(frame)))
+
+def records_scores(active, records):
+    """
+    (labels, probabilities) for validated records. With a vocabulary the
+    records are encoded by dict lookups and go straight to the forests; else
+    they become a DataFrame for the full pipeline.
+    """
+    if active.vocabulary is None:
+        with span('features'):
+            frame = active.schema.frame(records)
+        return pipeline_scores(active.model, frame)
+    from scoring import model_classes, proba_list, scores_from_proba
+    with span('transform'):
+        X = active.vocabulary.encode_records(records)
+    with span('predict'):
+        classifier = active.model.steps[-1][1]
+        return scores_from_proba(model_classes(classifier), proba_list(classifier.predict_proba(X)))
+
+def predict_record(served, active, record):
+    """
+    Scores one validated record (see request_schema.py) with the given active
+    model version and returns (labels, probabilities), answering from the
+    prediction cache when possible and otherwise from the lookup table or the
+    compiled fast path when available, or the request coalescer when enabled.
+    """
+    def compute(record):
+        if active.table is not None:
+            with span('lookup'):
+                return active.table.score_one(record)
+        if active.compiled is not None:
+            with span('transform'):
+                x = active.compiled.encode(record)
+            with span('predict'):
+                return active.compiled.score_encoded(x)
+        if served.batcher is not None:
+            # Queue wait included: that is where a coalesced request spends its time
+            with span('predict'):
+                return served.batcher.submit(record, active)
+        labels, probabilities = records_scores(active, [record])
+        return labels[0], probabilities[0]
+
+    # A request still finishing on a swapped-out version bypasses the cache
+    # rather than rebinding it to the old model
+    if served.cache is not None and served.active is active:
+        return served.cache.get_or_compute(active.model, record, active.features, compute)
+    return compute(record)
+
+def batch_chunk_size():
+    """Reads the `chunkSize` query parameter, clamped to the configured bounds."""
+    chunk_size = request.args.get('chunkSize', DEFAULT_BATCH_CHUNK_SIZE, type=int)
+    return max(1, min(chunk_size, MAX_BATCH_CHUNK_SIZE))
+
+def iter_batch_records():
+    """
+    Yields (record_id, user_data) pairs from a batch request.
+
+    Accepts either a JSON body of the form {"userData": [{...}, {...}]} or an
+    NDJSON body (one record per line). NDJSON is read line by line so large
+    uploads never have to be held in memory. A record may carry its own "id";
+    otherwise its position in the input is used.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = (line for line in request.stream if line.strip())
+        records = (json.loads(line) for line in lines)
+    else:
+        data = request.get_json(silent=True)
+        if data is None:
+            raise ValueError("request body is not valid JSON")
+        records = data.get('userData', []) if isinstance(data, dict) else data
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            # Rejected by the schema on its own line, like any other invalid record
+            yield index, record
+            continue
+        record_id = record.get('id', index)
+        user_data = record.get('userData', record)
+        yield record_id, user_data
+
+def score_chunk(served, active, chunk, options=None):
+    """
+    Scores (record_id, user_data) pairs with one predict_proba() call and
+    returns (response bodies, in input order; the scoring error or None). A
+    record that fails validation gets its own error body (with the field and
+    status a single request would get) and does not affect the rest of its
+    chunk. Shared by the /batch routes and the job queue.
+    """
+    records = []
+    bodies = [None] * len(chunk)
+    with span('features'):
+        for i, (record_id, user_data) in enumerate(chunk):
+            try:
+                records.append((i, active.schema.record(user_data)))
+            except SchemaError as e:
+                bodies[i] = {'id': record_id, 'success': False, 'error': str(e), 'field': e.field, 'status': e.status}
+    rejected = len(chunk) - len(records)
+    if rejected:
+        metrics.inc(BATCH_RECORDS_TOTAL, rejected, model=served.name, outcome='invalid')
+    if not records:
+        return bodies, None
+    valid = [record for _, record in records]
+    try:
+        if active.table is not None:
+            # Tabulated models need no DataFrame at all
+            with span('lookup'):
+                labels, probabilities = active.table.score(valid)
+        else:
+            labels, probabilities = records_scores(active, valid)
+    except Exception as e:
+        metrics.inc(BATCH_RECORDS_TOTAL, len(records), model=served.name, outcome='error')
+        for i, _ in records:
+            bodies[i] = {'id': chunk[i][0], 'success': False, 'error': str(e)}
+        return bodies, e
+    metrics.inc(BATCH_RECORDS_TOTAL, len(records), model=served.name, outcome='success')
+    with span('serialize'):
+        for (i, _), scores in zip(records, zip(labels, probabilities)):
+            bodies[i] = {
+                'id': chunk[i][0],
+                'success': True,
+                **scheme_fields(scores, active.scheme_mapping, options),
+                'modelVersion': active.version
+            }
+    return bodies, None
+
+def stream_batch_predictions(served, chunk_size, options=None):
+    """
+    Scores batch records in chunks of `chunk_size` (see score_chunk) and
+    yields one NDJSON line per record, keyed by record id. `options` come from
+    scoring_options(). The last line has no id and summarizes the stream:
+    {"success", "summary": {"records", "succeeded", "failed"}}, plus "error"
+    when the input was malformed partway through. A stream without it was cut
+    short.
+    """
+    # One version for the whole stream, even if a reload lands halfway through
+    active = served.get()
+    summary = {'records': 0, 'succeeded': 0, 'failed': 0}
+
+    def predict_chunk(chunk):
+        bodies, error = score_chunk(served, active, chunk, options)
+        if error is not None:
+            g.timer.fail(error)
+        succeeded = sum(1 for body in bodies if body['success'])
+        summary['records'] += len(bodies)
+        summary['succeeded'] += succeeded
+        summary['failed'] += len(bodies) - succeeded
+        # Lines are built inside the span and sent after it as one write per chunk,
+        # so time spent by the client reading the stream is not counted
+        with span('serialize'):
+            lines = ''.join(json.dumps(body) + "\n" for body in bodies)
+        yield lines
+
+    chunk = []
+    input_error = None
+    records = iter_batch_records()
+    try:
+        while True:
+            with span('parse'):
+                record = next(records, None)
+            if record is None:
+                break
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield from predict_chunk(chunk)
+                chunk = []
+    except (ValueError, AttributeError) as e:
+        # Malformed input mid-stream: score what was read so far, then report it.
+        input_error = e
+        g.timer.fail(e)
+    if chunk:
+        yield from predict_chunk(chunk)
+    if input_error is not None:
+        yield json.dumps({'success': False, 'error': f"Invalid batch input: {input_error}", 'summary': summary}) + "\n"
+    else:
+        yield json.dumps({'success': True, 'summary': summary}) + "\n"
+
+def batch_response(served):
+    label_request(served)
+    try:
+        options = scoring_options()
+    except SchemaError as e:
+        return request_error(e)
+    try:
+        served.get()
+    except ModelNotLoaded as e:
+        return prediction_error(e)
+    generator = stream_batch_predictions(served, batch_chunk_size(), options)
+    return Response(stream_with_context(generator), mimetype='application/x-ndjson')
+
 # ================== ROUTES ==================
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'individual_model_loaded': individual_model_loaded,
-        'community_model_loaded': community_model_loaded,
-        'community_resources_model_loaded': community_resources_model_loaded,
+        'individual_model_loaded': individual_model.loaded,
+        'community_model_loaded': community_model.loaded,
+        'community_resources_model_loaded': community_resources_model.loaded,
+        'models': {name: served.status() for name, served in served_models.items()},
+        'startup_seconds': STARTUP_SECONDS,
+        'coalescing': COALESCE,
+        'prediction_cache': {
+            name: served.cache.stats() for name, served in served_models.items() if served.cache is not None
+        },
         'message': 'Flask server is running with AI models'
     })
 
+@app.route('/api/coalescer/stats', methods=['GET'])
+def coalescer_stats():
+    return jsonify({
+        'enabled': COALESCE,
+        'models': {
+            name: served.batcher.stats() for name, served in served_models.items() if served.batcher is not None
+        }
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# ----------------- Model Versions -----------------
+def admin_denied():
+    if not ADMIN_TOKEN and not ADMIN_OPEN:
+        return jsonify({'success': False, 'error': 'Admin routes are disabled: AI_ADMIN_TOKEN is not set'}), 403
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 403
+    name = request.view_args.get('name')
+    if name is not None and name not in served_models:
+        return jsonify({'success': False, 'error': f"Unknown model '{name}'"}), 404
+    return None
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify({name: served.status() for name, served in served_models.items()})
+
+@app.route('/api/models/<name>/reload', methods=['POST'])
+def reload_model(name):
+    denied = admin_denied()
+    if denied:
+        return denied
+    version = (request.get_json(silent=True) or {}).get('version')
+    # An explicit version is pinned in the registry so every worker process converges on it
+    if not served_models[name].reload_async(version, pin=True):
+        return jsonify({'success': False, 'error': 'A reload is already in progress'}), 409
+    return jsonify({'success': True, 'message': f"Reloading {name} in the background"}), 202
+
+@app.route('/api/models/<name>/rollback', methods=['POST'])
+def rollback_model(name):
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        active = served_models[name].rollback()
+    except ModelNotLoaded as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'modelVersion': active.version})
+
+# ----------------- Sampling Profiler -----------------
+@app.route('/api/profiler', methods=['GET'])
+def profiler_status():
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(profiler.status())
+
+@app.route('/api/profiler', methods=['POST'])
+def configure_profiler():
+    """Switches the profiler at runtime, e.g. {"enabled": true, "slowMs": 100, "sampleRate": 0.1}."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    settings = request.get_json(silent=True) or {}
+    try:
+        profiler.configure(
+            enabled=settings.get('enabled'),
+            interval=settings['intervalMs'] / 1000 if 'intervalMs' in settings else None,
+            slow_seconds=settings['slowMs'] / 1000 if 'slowMs' in settings else None,
+            sample_rate=settings.get('sampleRate'),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    status = profiler.status()
+    del status['captures']
+    return jsonify(dict(status, success=True))
+
 # ----------------- Individual Prediction -----------------
 @app.route('/api/predict', methods=['POST'])
 def predict_individual():
+    label_request(individual_model)
     try:
-        if not individual_model_loaded:
-            return jsonify({'success': False, 'error': 'Individual model not loaded'})
+        with span('parse'):
+            user_data, options = read_prediction_request()
         
-        data = request.get_json()
-        user_data = data.get('userData', {})
+        active = individual_model.get()
+        with span('features'):
+            record = active.schema.record(user_data)
+        scores = predict_record(individual_model, active, record)
         
-        user_data_df = pd.DataFrame([{feature: user_data.get(feature, '') for feature in individual_features}])
-        predictions_raw = schemes_model.predict(user_data_df)
-        predictions = predictions_raw[0]
-        
-        recommended_schemes = []
-        for i, eligible in enumerate(predictions):
-            if eligible:
-                scheme_info = individual_scheme_mapping[i]
-                recommended_schemes.append({
-                    'name': scheme_info['name'],
-                    'description': scheme_info['desc']
-                })
-        
-        return jsonify({
-            'success': True,
-            'recommendedSchemes': recommended_schemes,
-            'userName': user_data.get('Name of the Claimant', 'Applicant')
-        })
+        with span('serialize'):
+            return jsonify({
+                'success': True,
+                **scheme_fields(scores, active.scheme_mapping, options),
+                'modelVersion': active.version,
+                **subject_fields(individual_model, user_data)
+            })
+    except SchemaError as e:
+        return request_error(e)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return prediction_error(e)
 
 # ----------------- Community Prediction -----------------
 @app.route('/api/community/predict', methods=['POST'])
 def predict_community():
+    label_request(community_model)
     try:
-        if not community_model_loaded:
-            return jsonify({'success': False, 'error': 'Community model not loaded'})
-        
-        data = request.get_json()
-        user_data = data.get('userData', {})
-        
-        user_data_df = pd.DataFrame([{feature: user_data.get(feature, '') for feature in community_features}])
-        predictions_raw = community_model.predict(user_data_df)
-        predictions = predictions_raw[0]
+        with span('parse'):
+            user_data, options = read_prediction_request()
         
-        recommended_schemes = []
-        for i, eligible in enumerate(predictions):
-            if eligible:
-                scheme_info = community_scheme_mapping[i]
-                recommended_schemes.append({
-                    'name': scheme_info['name'],
-                    'description': scheme_info['desc']
-                })
+        active = community_model.get()
+        with span('features'):
+            record = active.schema.record(user_data)
+        scores = predict_record(community_model, active, record)
         
-        return jsonify({
-            'success': True,
-            'recommendedSchemes': recommended_schemes,
-            'community': f"{user_data.get('FDST community', '')} / {user_data.get('OTFD community', '')}"
-        })
+        with span('serialize'):
+            return jsonify({
+                'success': True,
+                **scheme_fields(scores, active.scheme_mapping, options),
+                'modelVersion': active.version,
+                **subject_fields(community_model, user_data)
+            })
+    except SchemaError as e:
+        return request_error(e)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return prediction_error(e)
 
 # ----------------- Community Resources DSS Prediction -----------------
 @app.route('/api/community-resources/predict', methods=['POST'])
 def predict_community_resources():
+    label_request(community_resources_model)
     try:
-        if not community_resources_model_loaded:
-            return jsonify({'success': False, 'error': 'Community resources model not loaded'})
-        
-        data = request.get_json()
-        user_data = data.get('userData', {})
+        with span('parse'):
+            user_data, options = read_prediction_request()
         
-        df_input = pd.DataFrame([user_data])
-        predictions_raw = community_resources_model.predict(df_input)
-        predictions = predictions_raw[0]
-
-        recommended_schemes = []
-        for i, eligible in enumerate(predictions):
-            if eligible:
-                recommended_schemes.append({
-                    'name': community_resources_scheme_mapping[i]['name'],
-                    'description': community_resources_scheme_mapping[i]['desc']
-                })
+        active = community_resources_model.get()
+        with span('features'):
+            record = active.schema.record(user_data)
+        scores = predict_record(community_resources_model, active, record)
 
-        return jsonify({
+        with span('serialize'):
+            return jsonify({
+                'success': True,
+                **scheme_fields(scores, active.scheme_mapping, options),
+                'modelVersion': active.version,
+                **subject_fields(community_resources_model, user_data)
+            })
+    except SchemaError as e:
+        return request_error(e)
+    except Exception as e:
+        return prediction_error(e)
+
+# ----------------- Screen Against Several Models -----------------
+def screen_one(served, user_data, options):
+    """One model's entry in a /api/screen response, timed; runs on the screening pool."""
+    started = time.perf_counter()
+    try:
+        # Lazily loaded models load here too, in parallel with the others
+        active = served.get()
+        record = active.schema.record(user_data)
+        scores = predict_record(served, active, record)
+        result = {
             'success': True,
-            'recommendedSchemes': recommended_schemes,
-            'communityName': user_data.get('Village', 'Community')
-        })
+            **scheme_fields(scores, active.scheme_mapping, options),
+            'modelVersion': active.version,
+            **subject_fields(served, user_data),
+        }
+    except SchemaError as e:
+        result = {'success': False, 'error': str(e), 'field': e.field, 'status': e.status}
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        result = {'success': False, 'error': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
+
+@app.route('/api/screen', methods=['POST'])
+def screen():
+    """
+    Scores one form against several models concurrently. The body is
+    {"userData": {...union of the models' fields...}, "models": [...]} (all
+    models by default) plus the usual scoring options. Each model gets an entry
+    under `results` shaped like its own route's response, with its `seconds`;
+    a model that rejects the form (validated against its schema before any
+    model work, see request_schema.py) or is not loaded gets an error entry,
+    with `field` and `status` for a validation error, while the others are
+    still scored.
+    """
+    started = time.perf_counter()
+    try:
+        with span('parse'):
+            data = request_body()
+            user_data = data.get('userData', {})
+            options = scoring_options(data)
+            names = data.get('models') or list(served_models)
+            if not isinstance(names, list) or not all(isinstance(name, str) and name in served_models for name in names):
+                raise SchemaError(f"models must be a list of: {', '.join(served_models)}", status=400, field='models')
+            if not isinstance(user_data, dict):
+                raise SchemaError("userData must be a JSON object", status=400, field='userData')
+    except SchemaError as e:
+        return request_error(e)
+
+    with span('predict'):
+        names = list(dict.fromkeys(names))
+        futures = [screen_pool().submit(screen_one, served_models[name], user_data, options) for name in names]
+        results = {name: future.result() for name, future in zip(names, futures)}
+
+    with span('serialize'):
+        return jsonify({
+            'success': any(result['success'] for result in results.values()),
+            'results': results,
+            'seconds': round(time.perf_counter() - started, 6),
+        })
+
+# ----------------- Batch Predictions -----------------
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_individual_batch():
+    return batch_response(individual_model)
+
+@app.route('/api/community/predict/batch', methods=['POST'])
+def predict_community_batch():
+    return batch_response(community_model)
+
+@app.route('/api/community-resources/predict/batch', methods=['POST'])
+def predict_community_resources_batch():
+    return batch_response(community_resources_model)
+
+# ----------------- Scoring Jobs -----------------
+def job_not_found(job_id):
+    return jsonify({'success': False, 'error': f"Unknown job '{job_id}'"}), 404
+
+def job_links(job_id):
+    return {
+        'statusUrl': url_for('job_status', job_id=job_id),
+        'resultsUrl': url_for('job_results', job_id=job_id),
+    }
+
+def read_job_submission():
+    """
+    (model, scoring options, write_input, input format, record count or None)
+    of a POST /api/jobs request. The input is written to the spool only once
+    the queue has accepted the job. Raises SchemaError.
+    """
+    if request.content_length is not None and request.content_length > JOB_MAX_UPLOAD_BYTES:
+        raise SchemaError(f"Job input is larger than {JOB_MAX_UPLOAD_BYTES} bytes", status=413)
+    upload = request.files.get('file')
+    if upload is not None:
+        fields = request.form
+        csv = (upload.filename or '').lower().endswith('.csv') or upload.mimetype == 'text/csv'
+        input_format, write_input, total = ('csv' if csv else 'ndjson'), upload.save, None
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        fields = request.args
+        input_format, total = 'ndjson', None
+
+        def write_input(path):
+            # Copied in blocks, so a large register is never held in memory
+            copied = 0
+            with open(path, 'wb') as f:
+                for block in iter(lambda: request.stream.read(1 << 20), b''):
+                    copied += len(block)
+                    if copied > JOB_MAX_UPLOAD_BYTES:
+                        raise SchemaError(f"Job input is larger than {JOB_MAX_UPLOAD_BYTES} bytes", status=413)
+                    f.write(block)
+    else:
+        fields = request_body()
+        records = fields.get('userData')
+        if not isinstance(records, list):
+            raise SchemaError("userData must be a list of records", status=400, field='userData')
+        input_format, total = 'ndjson', len(records)
+
+        def write_input(path):
+            with open(path, 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+    model = fields.get('model') or request.args.get('model')
+    if not isinstance(model, str) or model not in served_models:
+        raise SchemaError(f"model must be one of: {', '.join(served_models)}", status=400, field='model')
+    return model, scoring_options(fields), write_input, input_format, total
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queues a scoring job and answers 202 with its id and status/results URLs.
+    The input is a JSON body {"model": ..., "userData": [...]}, an NDJSON body
+    (?model=...), or a multipart upload of a CSV or NDJSON `file` with a
+    `model` field; scoring options (threshold, topK, includeProbabilities) go
+    alongside. Answers 429 with Retry-After while the queue is full.
+    """
+    try:
+        with span('parse'):
+            model, options, write_input, input_format, total = read_job_submission()
+        label_request(served_models[model])
+        job_id = job_queue.submit(model, options, write_input, input_format, total)
+    except SchemaError as e:
+        return request_error(e)
+    except JobQueueFull as e:
+        g.timer.fail(e)
+        response = jsonify({'success': False, 'error': f"Job queue is full: {e}", 'retryAfter': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except ValueError as e:
+        g.timer.fail(e)
+        return jsonify({'success': False, 'error': f"Invalid job input: {e}"}), 400
+
+    response = jsonify({'success': True, **job_summary(job_queue.store.get(job_id)), **job_links(job_id)})
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job_id)
+    return response
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    denied = admin_denied()
+    if denied:
+        return denied
+    job_queue.ensure_started()
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    return jsonify({
+        **job_queue.stats(),
+        'recent': [job_summary(job) for job in job_queue.store.recent(limit)],
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    # Polling also (re)starts this process's job threads, e.g. to resume jobs after a restart
+    job_queue.ensure_started()
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify({'success': True, **job_summary(job), **job_links(job_id)})
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """
+    A page of a job's results in input order: `limit` records (default
+    AI_JOB_PAGE_SIZE) from `offset`, each the line /batch would have sent.
+    Results are readable while the job runs; `nextOffset` is null once the
+    job has finished and the page reached its end.
+    """
+    job_queue.ensure_started()
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', JOB_PAGE_SIZE, type=int), JOB_MAX_PAGE_SIZE))
+    with span('predict'):
+        lines = job_queue.store.results(job_id, offset, limit)
+    next_offset = offset + len(lines)
+    finished = job['status'] in FINISHED and next_offset >= job['processed']
+    with span('serialize'):
+        envelope = json.dumps({
+            'success': True, 'jobId': job_id, 'status': job_summary(job)['status'],
+            'offset': offset, 'count': len(lines), 'nextOffset': None if finished else next_offset,
+        })
+        # Stored lines are already JSON; splice them in rather than parse and re-encode them
+        body = f'{envelope[:-1]}, "results": [{", ".join(lines)}]}}'
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancels a queued or running job; a finished job is deleted together with its results. Admin only."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job['status'] in FINISHED:
+        job_queue.store.delete([job_id])
+        return jsonify({'success': True, 'jobId': job_id, 'deleted': True})
+    return jsonify({'success': True, **job_summary(job_queue.cancel(job_id))})
+
+# Import-to-ready time of this module (models excluded unless loading eagerly)
+STARTUP_SECONDS = time.perf_counter() - STARTED_AT
+print(f"🚀 Prediction service ready in {STARTUP_SECONDS:.2f}s")
 
 # ================== RUN APP ==================
 if __name__ == '__main__':
@@ -0,0 +1,373 @@
+"""
+Reproducible benchmarks for the prediction service and model training.
+
+Synthetic individual, community and community-resource records are generated
+with the same columns as fra_holders.csv, community_data.csv and
+community_src.csv. Values are drawn from the sample files, plus numbered
+synthetic variants for the high-cardinality text columns, so any row count can
+be produced from a fixed seed.
+
+`run` measures, for each model:
+  - training time and peak RSS, each in a fresh subprocess through training.py
+  - app import time (cold start) and model load time
+  - single-request latency (p50/p95/p99) of the app.py route, via the Flask test client
+  - batch throughput of the /batch route in records per second
+
+and writes everything to a JSON file, together with the commit, library
+versions and AI_* settings in effect. `compare` diffs two such files.
+
+Usage:
+    python benchmark.py run --rows 20000 --requests 500 --output bench.json
+    python benchmark.py run --serve synthetic --models community --output bench.json
+    python benchmark.py compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_specs import AI_DIR, SPECS
+
+ROUTES = {
+    'individual': '/api/predict',
+    'community': '/api/community/predict',
+    'community_resources': '/api/community-resources/predict',
+}
+
+# Numeric columns and the range synthetic values are drawn from
+NUMERIC_RANGES = {
+    'Age': (18, 90),
+    'Extent of Land in Forest Villages': (0.0, 10.0),
+}
+
+# Text columns with more distinct values than the sample files show; synthetic
+# values such as "Village 17" are mixed in so encoders see realistic vocabularies
+HIGH_CARDINALITY = {
+    'Name of the Claimant', 'Name of the Spouse', 'Name of the Father', 'Address',
+    'District', 'Taluka', 'Gram Panchayat', 'Village', 'Compartment No',
+    'Bordering Villages', 'Name of members of the Gram Sabha',
+}
+
+MISSING_RATE = 0.05
+
+
+# ================== SYNTHETIC DATA ==================
+
+def synthetic_frame(name, rows, seed=0, vocabulary=200):
+    """
+    `rows` synthetic records for a model, with every column of its sample CSV.
+    About MISSING_RATE of text cells are 'N/A', like the real exports.
+    """
+    sample = pd.read_csv(SPECS[name].data_path, keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for column in sample.columns:
+        if column in NUMERIC_RANGES:
+            low, high = NUMERIC_RANGES[column]
+            values = rng.uniform(low, high, rows)
+            columns[column] = values.round(0).astype(int) if isinstance(low, int) else values.round(1)
+            continue
+        choices = sorted(set(sample[column].astype(str)) - {'N/A'})
+        if column in HIGH_CARDINALITY:
+            choices += [f"{column.split()[-1]} {i}" for i in range(vocabulary)]
+        values = np.array(choices, dtype=object)[rng.integers(0, len(choices), rows)]
+        values[rng.random(rows) < MISSING_RATE] = 'N/A'
+        columns[column] = values
+    return pd.DataFrame(columns, columns=list(sample.columns))
+
+
+def write_synthetic(name, rows, directory, seed=0):
+    path = os.path.join(directory, f"{name}_{rows}.csv")
+    synthetic_frame(name, rows, seed).to_csv(path, index=False)
+    return path
+
+
+# ================== MEASUREMENTS ==================
+
+def summarize(seconds):
+    """Latency summary in milliseconds."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        'count': int(ms.size),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def bench_training(name, csv_path, output_dir, n_jobs):
+    """Trains one model in a child process so its peak RSS is measured on its own."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), 'train-one', name, csv_path, output_dir, str(n_jobs)],
+        cwd=AI_DIR, capture_output=True, text=True, check=True,
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured['wall_seconds'] = round(time.perf_counter() - started, 3)
+    return measured
+
+
+def train_one(name, csv_path, output_dir, n_jobs):
+    """Child-process side of bench_training; prints one JSON line."""
+    import training
+
+    spec = SPECS[name]
+    artifact_path = os.path.join(output_dir, spec.artifact_file)
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        df = training.read_sources([spec], csv_path)[name]
+        parsed = time.perf_counter()
+        _, stats = training.train_model(spec, df, csv_path, artifact_path, n_jobs, report_limit=0)
+    peak = training.peak_rss_mb()
+    print(json.dumps({
+        'rows': stats['rows'],
+        'parse_seconds': round(parsed - started, 3),
+        'train_seconds': stats['train_seconds'],
+        'predict_seconds': stats['predict_seconds'],
+        'peak_rss_mb': round(peak, 1) if peak is not None else None,
+        'artifact_bytes': os.path.getsize(artifact_path),
+    }))
+
+
+def bench_import(env):
+    """Cold-start time of `import app` in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=AI_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return round(float(result.stdout.strip().splitlines()[-1]), 3)
+
+
+def bench_load(served, repeats):
+    """Time to load (and, if enabled, compile) a model version, without activating it."""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        served._load_version()
+        times.append(time.perf_counter() - started)
+    return {'min_seconds': round(min(times), 4), 'mean_seconds': round(sum(times) / len(times), 4)}
+
+
+def bench_latency(client, route, records, requests, warmup):
+    """
+    Times single-record requests. The first, warm-up and timed requests use
+    different records so the prediction cache does not flatter the numbers
+    until `requests` exceeds the number of records.
+    """
+    started = time.perf_counter()
+    response = client.post(route, json={'userData': records[0]})
+    first_request = time.perf_counter() - started
+    if not response.get_json().get('success'):
+        raise RuntimeError(f"{route} failed: {response.get_json()}")
+
+    for i in range(1, warmup + 1):
+        client.post(route, json={'userData': records[i % len(records)]})
+    samples = []
+    for i in range(warmup + 1, warmup + 1 + requests):
+        record = records[i % len(records)]
+        started = time.perf_counter()
+        client.post(route, json={'userData': record}).get_json()
+        samples.append(time.perf_counter() - started)
+    result = summarize(samples)
+    result['first_request_ms'] = round(first_request * 1000, 3)
+    return result
+
+
+def bench_batch(client, route, records, batch_size, repeats):
+    batch = records[:batch_size]
+    times, failures = [], 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        body = client.post(route + '/batch', json={'userData': batch}).get_data(as_text=True)
+        times.append(time.perf_counter() - started)
+        failures += sum(1 for line in body.splitlines() if not json.loads(line).get('success'))
+    total = sum(times)
+    return {
+        'batch_size': len(batch),
+        'repeats': repeats,
+        'records_per_second': round(len(batch) * repeats / total, 1),
+        'mean_batch_seconds': round(total / repeats, 4),
+        'failed_records': failures,
+    }
+
+
+# ================== RUN ==================
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=AI_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import sklearn
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'settings': {k: v for k, v in sorted(os.environ.items()) if k.startswith('AI_')},
+    }
+
+
+def run(args):
+    names = list(SPECS) if 'all' in args.models else args.models
+    workdir = tempfile.mkdtemp(prefix="ai-bench-")
+    results = {
+        'created_at': time.time(),
+        'config': {k: v for k, v in vars(args).items() if k != 'func'},
+        'environment': environment(),
+        'training': {},
+        'serving': {},
+    }
+
+    datasets = {}
+    for name in names:
+        datasets[name] = write_synthetic(name, args.rows, workdir, args.seed)
+        if not args.skip_training:
+            print(f"🏋️ training {name} on {args.rows} synthetic rows...")
+            results['training'][name] = bench_training(name, datasets[name], workdir, args.n_jobs)
+
+    if args.serve == 'synthetic':
+        if args.skip_training:
+            raise SystemExit("--serve synthetic needs the training step")
+        # The app reads these at import, so they must be set before importing it
+        os.environ['AI_MODEL_DIR'] = workdir
+        os.environ['AI_MODEL_REGISTRY'] = os.path.join(workdir, 'registry')
+    os.environ.setdefault('AI_MODEL_LOADING', 'lazy')
+
+    results['serving']['import_seconds'] = bench_import(dict(os.environ))
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    client = app.app.test_client()
+
+    for name in names:
+        print(f"⏱️ benchmarking {ROUTES[name]}...")
+        served = app.served_models[name]
+        records = synthetic_frame(name, max(args.requests + args.warmup + 1, args.batch_size), args.seed + 1).to_dict('records')
+        results['serving'][name] = {
+            'load': bench_load(served, args.load_repeats),
+            'latency': bench_latency(client, ROUTES[name], records, args.requests, args.warmup),
+            'batch': bench_batch(client, ROUTES[name], records, args.batch_size, args.batch_repeats),
+            'model_version': served.version,
+        }
+    results['serving']['prediction_cache'] = client.get('/api/health').get_json().get('prediction_cache')
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"✅ Results written to '{args.output}'")
+    print_summary(results)
+
+
+def print_summary(results):
+    for name, measured in results['training'].items():
+        print(f"  train {name}: {measured['train_seconds']:.2f}s, peak RSS {measured['peak_rss_mb']} MB")
+    for name in ROUTES:
+        measured = results['serving'].get(name)
+        if measured:
+            latency = measured['latency']
+            print(f"  serve {name}: p50 {latency['p50_ms']} ms | p95 {latency['p95_ms']} ms | "
+                  f"p99 {latency['p99_ms']} ms | batch {measured['batch']['records_per_second']} rec/s | "
+                  f"load {measured['load']['min_seconds']}s")
+
+
+# ================== COMPARE ==================
+
+# Metrics where a bigger number is an improvement; everything else is a cost
+HIGHER_IS_BETTER = {'records_per_second'}
+COMPARED = {
+    'train_seconds', 'peak_rss_mb', 'artifact_bytes', 'import_seconds', 'min_seconds',
+    'p50_ms', 'p95_ms', 'p99_ms', 'records_per_second',
+}
+
+
+def _flatten(data, prefix=''):
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key in COMPARED:
+            flat[path] = value
+    return flat
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    old = _flatten({'training': before['training'], 'serving': before['serving']})
+    new = _flatten({'training': after['training'], 'serving': after['serving']})
+
+    regressions = 0
+    for metric in sorted(old.keys() & new.keys()):
+        if not old[metric]:
+            continue
+        change = (new[metric] - old[metric]) / old[metric]
+        worse = -change if metric.rsplit('.', 1)[-1] in HIGHER_IS_BETTER else change
+        flag = '❌' if worse > args.threshold else ('✅' if worse < -args.threshold else '  ')
+        regressions += worse > args.threshold
+        print(f"{flag} {metric:<55} {old[metric]:>12} -> {new[metric]:>12} ({change:+.1%})")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+# ================== CLI ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the prediction service and model training.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help="run the benchmarks and write JSON results")
+    p.add_argument('--models', nargs='+', default=['all'], help=f"{', '.join(SPECS)} or all")
+    p.add_argument('--rows', type=int, default=10_000, help="synthetic training rows per model")
+    p.add_argument('--requests', type=int, default=300, help="timed single-record requests per route")
+    p.add_argument('--warmup', type=int, default=20, help="untimed requests before measuring")
+    p.add_argument('--batch-size', type=int, default=1000, help="records per batch request")
+    p.add_argument('--batch-repeats', type=int, default=3)
+    p.add_argument('--load-repeats', type=int, default=3)
+    p.add_argument('--n-jobs', type=int, default=-1, help="cores used for training (-1 = all)")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--serve', choices=['deployed', 'synthetic'], default='deployed',
+                   help="serve the deployed artifacts or the ones just trained on synthetic data")
+    p.add_argument('--skip-training', action='store_true')
+    p.add_argument('--output', default='benchmark_results.json')
+    p.set_defaults(func=run)
+
+    p = sub.add_parser('compare', help="compare two result files")
+    p.add_argument('before')
+    p.add_argument('after')
+    p.add_argument('--threshold', type=float, default=0.10, help="relative change reported as a regression")
+    p.set_defaults(func=compare)
+
+    p = sub.add_parser('train-one', help=argparse.SUPPRESS)
+    p.add_argument('name')
+    p.add_argument('csv_path')
+    p.add_argument('output_dir')
+    p.add_argument('n_jobs', type=int)
+    p.set_defaults(func=lambda a: train_one(a.name, a.csv_path, a.output_dir, a.n_jobs))
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
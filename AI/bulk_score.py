@@ -0,0 +1,312 @@
+"""
+Offline bulk scoring of claim exports with an already trained model.
+
+Streams a CSV or Parquet file of any size through a model in fixed-size
+chunks and writes the eligibility columns (one 0/1 column per scheme, named
+like the training targets, plus `<target>_probability` with --probabilities)
+next to the input columns. Feature cells are validated and normalized by the
+model's request schema (request_schema.py), exactly as the API does for a
+request: a row the API would reject is written with empty eligibility columns
+and the reason in `scoring_error`, and the rest of the file is still scored.
+Only a bounded number of chunks is ever in memory,
+so memory use does not grow with the file. With --jobs > 1 chunks are scored
+in parallel worker processes, each loading the model once (memory-mapped, so
+the workers share its arrays); output rows keep the input order.
+
+The model is the registry's current version by default, else the artifact
+under AI_MODEL_DIR, i.e. whatever the server would load; --model-path scores
+with a specific .pkl or .compact artifact (compact_model.py) instead. Nothing
+is retrained.
+
+Parquet input/output needs pyarrow, which is not in requirements.txt.
+
+Usage:
+    python bulk_score.py community claims.csv scored.csv
+    python bulk_score.py individual export.parquet scored.parquet --jobs 4 --probabilities
+    python bulk_score.py community_resources villages.csv out.csv --model-path /tmp/model.pkl --columns Village,District
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+from compact_model import load_model
+from model_specs import SPECS
+from request_schema import compile_schema
+from scoring import model_classes, proba_list, scores_from_proba
+
+DEFAULT_CHUNKSIZE = 50_000
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+
+
+def is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet files need pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def resolve_model(spec, model_path=None):
+    """(path, version) of the artifact to score with, resolved like the server does."""
+    if model_path:
+        return model_path, 'file'
+    version = model_registry.current_version(spec.name)
+    if version is not None and version != model_registry.UNVERSIONED:
+        model_registry.verify(spec.name, version)
+        return model_registry.artifact_path(spec.name, version), version
+    return os.path.join(model_registry.MODEL_DIR, spec.artifact_file), 'unversioned'
+
+
+# ================== READING / WRITING ==================
+
+def iter_chunks(path, chunksize, columns=None):
+    """
+    Yields DataFrames of at most `chunksize` rows. CSV cells are kept as text
+    without NA parsing, so passthrough columns are written back exactly as they
+    were read ('N/A', 'NA' and 'null' included); only the feature columns are
+    turned into missing values, by the request schema.
+    """
+    if is_parquet(path):
+        pa = _pyarrow()
+        source = pa.parquet.ParquetFile(path)
+        for batch in source.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False,
+                              na_filter=False, chunksize=chunksize)
+
+
+def input_columns(path):
+    if is_parquet(path):
+        return list(_pyarrow().parquet.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def total_rows(path):
+    """Row count when it is free to know (Parquet metadata), else None."""
+    if is_parquet(path):
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    return None
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = is_parquet(path)
+        self._writer = None
+        self._schema = None
+        self._header = True
+
+    def write(self, frame):
+        if self.parquet:
+            pa = _pyarrow()
+            if self._writer is None:
+                self._schema = pa.Table.from_pandas(frame, preserve_index=False).schema
+                self._writer = pa.parquet.ParquetWriter(self.path, self._schema)
+            # Cast to the first chunk's schema, e.g. for a column that is all empty in one chunk
+            self._writer.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# ================== SCORING ==================
+
+def score_frame(model, frame):
+    """(labels, probabilities) for a frame from one predict_proba() pass (see scoring.py)."""
+    steps = getattr(model, 'steps', None) or [(None, model)]
+    for _, step in steps[:-1]:
+        if step is not None and step != 'passthrough':
+            frame = step.transform(frame)
+    classifier = steps[-1][1]
+    return scores_from_proba(model_classes(classifier), proba_list(classifier.predict_proba(frame)))
+
+
+def score_chunk(model, schema, frame, n_targets):
+    """
+    (labels, probabilities, errors) for a chunk's feature columns. Rows the
+    schema rejects are not scored: they get 0 labels, NaN probabilities and
+    their error message in `errors` (None for scored rows).
+    """
+    normalized, invalid = schema.convert_columns(frame)
+    n = len(normalized)
+    labels = np.zeros((n, n_targets), dtype=np.int8)
+    probabilities = np.full((n, n_targets), np.nan)
+    errors = np.full(n, None, dtype=object)
+    for row, error in invalid.items():
+        errors[row] = str(error)
+    valid = np.ones(n, dtype=bool)
+    valid[list(invalid)] = False
+    if valid.any():
+        labels[valid], probabilities[valid] = score_frame(model, normalized[valid])
+    return labels, probabilities, errors
+
+
+_worker_model = None
+_worker_schema = None
+
+
+def _init_worker(model_path, features):
+    global _worker_model, _worker_schema
+    _worker_model = load_model(model_path)
+    _worker_schema = compile_schema(_worker_model, features)
+
+
+def _score_in_worker(frame, n_targets):
+    return score_chunk(_worker_model, _worker_schema, frame, n_targets)
+
+
+def scored_columns(spec, labels, probabilities, errors, with_probabilities, index):
+    invalid = pd.notna(errors)
+    columns = {}
+    for k, target in enumerate(spec.target_columns):
+        column = labels[:, k].astype(np.int8)
+        if invalid.any():
+            # Rejected rows have no eligibility rather than a 0
+            column = pd.array(column, dtype='Int8')
+            column[invalid] = pd.NA
+        columns[target] = column
+        if with_probabilities:
+            columns[f"{target}_probability"] = probabilities[:, k].round(6)
+    columns['scoring_error'] = np.where(invalid, errors, '')
+    return pd.DataFrame(columns, index=index)
+
+
+def score_file(spec, input_path, output_path, model_path=None, chunksize=DEFAULT_CHUNKSIZE,
+               jobs=1, with_probabilities=False, keep_columns=None):
+    """
+    Scores `input_path` into `output_path` chunk by chunk. `keep_columns` are
+    the input columns copied to the output (all of them by default). Returns a
+    summary dict.
+    """
+    path, version = resolve_model(spec, model_path)
+    header = input_columns(input_path)
+    features = list(spec.features)
+    missing = [c for c in features if c not in header]
+    if missing:
+        raise ValueError(f"'{input_path}' is missing columns: {', '.join(missing)}")
+    keep = header if keep_columns is None else keep_columns
+    unknown = [c for c in keep if c not in header]
+    if unknown:
+        raise ValueError(f"'{input_path}' has no columns: {', '.join(unknown)}")
+    read = list(dict.fromkeys(keep + features))
+    expected_rows = total_rows(input_path)
+    n_targets = len(spec.target_columns)
+
+    print(f"📦 Scoring '{input_path}' with the {spec.label} model ({version}: {path}), "
+          f"{jobs} worker(s), {chunksize} rows per chunk")
+    started = time.perf_counter()
+    writer = ChunkWriter(output_path)
+    rows = 0
+    rejected = 0
+    eligible = np.zeros(len(spec.target_columns), dtype=np.int64)
+    last_report = started
+
+    def write(chunk, scores):
+        nonlocal rows, rejected, last_report
+        labels, probabilities, errors = scores
+        scored = scored_columns(spec, labels, probabilities, errors, with_probabilities, chunk.index)
+        writer.write(pd.concat([chunk[keep], scored], axis=1))
+        rows += len(chunk)
+        rejected += int(pd.notna(errors).sum())
+        eligible[:] += labels.astype(bool).sum(axis=0)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            done = f"{rows}/{expected_rows} ({rows / expected_rows:.0%})" if expected_rows else f"{rows}"
+            print(f"⏱️ {done} rows | {rows / (now - started):,.0f} rows/s")
+
+    try:
+        chunks = iter_chunks(input_path, chunksize, read)
+        if jobs <= 1:
+            model = load_model(path)
+            schema = compile_schema(model, features)
+            for chunk in chunks:
+                write(chunk, score_chunk(model, schema, chunk[features], n_targets))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(path, features)) as pool:
+                # At most two chunks per worker in flight keeps memory flat and workers busy
+                pending = collections.deque()
+                for chunk in chunks:
+                    future = pool.submit(_score_in_worker, chunk[features], n_targets)
+                    pending.append((chunk, future))
+                    if len(pending) >= 2 * jobs:
+                        done_chunk, done_future = pending.popleft()
+                        write(done_chunk, done_future.result())
+                while pending:
+                    done_chunk, done_future = pending.popleft()
+                    write(done_chunk, done_future.result())
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    print(f"✅ {rows} rows scored into '{output_path}' in {seconds:.2f}s "
+          f"({rows / seconds if seconds else 0:,.0f} rows/s)")
+    if rejected:
+        print(f"⚠️ {rejected} rows rejected by the request schema (see 'scoring_error')")
+    for i, count in enumerate(eligible):
+        print(f"  {spec.scheme_mapping[i]['name']}: {int(count)} eligible")
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'rejected': rejected,
+        'model_version': version,
+        'eligible': {target: int(count) for target, count in zip(spec.target_columns, eligible)},
+    }
+
+
+# ================== CLI ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet export with a trained scheme model.")
+    parser.add_argument('model', choices=list(SPECS), help="which model to score with")
+    parser.add_argument('input', help="CSV or Parquet (.parquet/.pq) file with the model's feature columns")
+    parser.add_argument('output', help="output file; Parquet if it ends in .parquet/.pq, else CSV")
+    parser.add_argument('--model-path', dest='model_path',
+                        help="score with this .pkl instead of the registry's current version")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes (default 1 = score in-process)")
+    parser.add_argument('--probabilities', action='store_true',
+                        help="also write a <target>_probability column per scheme")
+    parser.add_argument('--columns',
+                        help="comma-separated input columns to copy to the output (default: all; '' for none)")
+    args = parser.parse_args(argv)
+    if args.chunksize < 1 or args.jobs < 1:
+        parser.error("--chunksize and --jobs must be at least 1")
+
+    keep = None
+    if args.columns is not None:
+        keep = [c.strip() for c in args.columns.split(',') if c.strip()]
+    try:
+        score_file(SPECS[args.model], args.input, args.output, args.model_path, args.chunksize,
+                   args.jobs, args.probabilities, keep)
+    except (FileNotFoundError, ValueError, model_registry.RegistryError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Micro-batching request coalescer for the prediction routes.
+
+Concurrent single-record requests for the same model are queued and scored
+together: a background worker takes the first waiting record, keeps collecting
+until either `max_batch_size` records are queued or `max_wait` seconds have
+passed, runs one batched predict() and hands each caller its own row back.
+Callers block in `submit()` exactly as if they had called predict() themselves,
+so the API contract of the routes does not change.
+
+Each record is submitted with the model version its request pinned, and a
+collected batch is split by version before scoring: a hot swap landing while
+records are queued never scores them with a model their response does not
+name.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+
+def _bucket_bounds(limit):
+    """Power-of-two histogram bucket upper bounds covering 1..limit."""
+    bounds = [1]
+    while bounds[-1] < limit:
+        bounds.append(bounds[-1] * 2)
+    return bounds
+
+
+class _Histogram:
+    def __init__(self, limit):
+        self.bounds = _bucket_bounds(limit)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def to_list(self):
+        # A list rather than a dict so bucket order survives JSON key sorting
+        buckets = [{'le': bound, 'count': count} for bound, count in zip(self.bounds, self.counts)]
+        buckets.append({'le': '+Inf', 'count': self.counts[-1]})
+        return buckets
+
+
+class MicroBatcher:
+    """Coalesces single-record predictions for one model into batched predict() calls."""
+
+    def __init__(self, name, predict_batch, max_batch_size=32, max_wait=0.005):
+        self.name = name
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._batch_sizes = _Histogram(max_batch_size)
+        self._queue_depths = _Histogram(max_batch_size * 4)
+        self._batches = 0
+        self._records = 0
+        self._errors = 0
+
+    def submit(self, record, version, timeout=None):
+        """
+        Queues one record to be scored by `version` (passed through to
+        predict_batch) and blocks until its prediction row is available.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((record, version, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_worker(self):
+        # Started lazily so the thread is created in the serving process, not
+        # in a parent that forks workers afterwards.
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run, name=f"coalescer-{self.name}", daemon=True
+                    )
+                    self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._lock:
+                self._queue_depths.observe(len(batch) + self._queue.qsize())
+            # Normally one group; two only while a hot swap is in flight
+            groups = {}
+            for record, version, future in batch:
+                groups.setdefault(id(version), (version, []))[1].append((record, future))
+            for version, entries in groups.values():
+                self._score(version, entries)
+
+    def _score(self, version, entries):
+        with self._lock:
+            self._batch_sizes.observe(len(entries))
+            self._batches += 1
+            self._records += len(entries)
+        try:
+            predictions = self.predict_batch([record for record, _ in entries], version)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        for (_, future), prediction in zip(entries, predictions):
+            future.set_result(prediction)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'records': self._records,
+                'errors': self._errors,
+                'mean_batch_size': self._records / self._batches if self._batches else 0.0,
+                'batch_size_histogram': self._batch_sizes.to_list(),
+                'queue_depth_histogram': self._queue_depths.to_list(),
+            }
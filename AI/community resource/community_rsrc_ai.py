@@ -1,103 +1,31 @@
-import pandas as pd
-import numpy as np
-import io
-import joblib
-from sklearn.pipeline import Pipeline
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.multioutput import MultiOutputClassifier
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
+import argparse
+import os
+import sys
 
-def train_and_run_community_resources_dss(file_path):
-    """
-    Reads a CSV file, trains a DSS model for community resource schemes,
-    and provides detailed recommendations for each community.
-    """
-    try:
-        df = pd.read_csv(file_path)
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found.")
-        return
-
-    # --- Configuration and Feature Definition ---
-    FEATURES = [
-        "Village", "Gram Panchayat", "Taluka", "District",
-        "Compartment No", "Bordering Villages", "List of Evidence in Support"
-    ]
-    
-    def create_eligibility_targets(df):
-        df['eligible_infrastructure_grant'] = df['List of Evidence in Support'].apply(
-            lambda x: 1 if 'resolution' in str(x).lower() or 'petition' in str(x).lower() else 0
-        )
-        df['eligible_conservation_fund'] = df['Compartment No'].apply(
-            lambda x: 1 if str(x) != 'N/A' and str(x) != 'nan' else 0
-        )
-        return df
-
-    SCHEMES_MAPPING = {
-        0: {"name": "Community Infrastructure Grant", "desc": "Grant for developing community infrastructure, based on community resolutions and evidence."},
-        1: {"name": "Resource Conservation Fund", "desc": "Funding for projects to conserve and protect specific forest compartments."},
-    }
+# The training pipeline lives in the shared library one directory up (training.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    df = create_eligibility_targets(df.copy())
-    TARGETS = list(SCHEMES_MAPPING.values())
+from model_specs import COMMUNITY_RESOURCES  # noqa: E402
+from training import DEFAULT_CHUNKSIZE, run_script  # noqa: E402
 
-    # --- Data Preprocessing ---
-    categorical_features = FEATURES
-    
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
-        ],
-        remainder='passthrough'
-    )
-    
-    # --- Model Training ---
-    model = Pipeline(steps=[
-        ('preprocessor', preprocessor), 
-        ('classifier', MultiOutputClassifier(RandomForestClassifier(random_state=42)))
-    ])
+FEATURES = COMMUNITY_RESOURCES.features
+SCHEMES_MAPPING = COMMUNITY_RESOURCES.scheme_mapping
 
-    print("Training the AI model...")
-    
-    # --- FIX APPLIED HERE ---
-    model.fit(df[FEATURES], df[['eligible_infrastructure_grant', 'eligible_conservation_fund']])
-    # --- END FIX ---
-    
-    print("Model training complete.")
-    
-    # --- Optimization: Save the Model and Make Single Prediction ---
-    try:
-        joblib.dump(model, "community_resources_model.pkl")
-        print("✅ Model successfully saved to 'community_resources_model.pkl'.")
-    except Exception as e:
-        print(f"❌ Error saving the model: {e}")
-    
-    predictions = model.predict(df[FEATURES])
-
-    # --- Report Generation ---
-    print("\n\n" + "=" * 60 + "\n")
-    print("AI Decision Support System for Community Resources")
-    print("-" * 50)
-    
-    for index, row in df.iterrows():
-        community_name = f"Village: **{row['Village']}**"
-        
-        print("\n\n" + "=" * 60 + "\n")
-        print(f"Simulating application for: {community_name}")
-        print("Recommended Government Schemes & Benefits:")
-        
-        recommended_schemes = [SCHEMES_MAPPING[i]['name'] for i, eligible in enumerate(predictions[index]) if eligible]
-        
-        if recommended_schemes:
-            for i, scheme in enumerate(recommended_schemes, 1):
-                print(f"{i}. **{scheme}**")
-                correct_desc = next(item['desc'] for item in SCHEMES_MAPPING.values() if item['name'] == scheme)
-                print(f"   - {correct_desc}")
-        else:
-            print("No specific schemes were recommended based on the provided details.")
-    print("\n" + "=" * 60)
-
-# Call the function with the path to your new CSV file
-train_and_run_community_resources_dss("community_src.csv")
\ No newline at end of file
+def train_and_run_community_resources_dss(file_path, chunksize=DEFAULT_CHUNKSIZE, n_jobs=-1, report_limit=None):
+    """
+    Reads a CSV file, trains a DSS model for community resource schemes, saves it
+    to 'community_resources_model.pkl' and provides detailed recommendations for
+    each community.
+    """
+    return run_script(COMMUNITY_RESOURCES.name, file_path, "community_resources_model.pkl",
+                      chunksize, n_jobs, report_limit)
+
+if __name__ == '__main__':
+    # Training used to run on import; it now only runs when the script is executed
+    parser = argparse.ArgumentParser(description="Train the community resources DSS model.")
+    parser.add_argument('file_path', nargs='?', default="community_src.csv")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="CSV rows read per chunk")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores used for training (-1 = all)")
+    parser.add_argument('--report-limit', type=int, default=None, help="print at most this many communities")
+    args = parser.parse_args()
+    train_and_run_community_resources_dss(args.file_path, args.chunksize, args.n_jobs, args.report_limit)
@@ -0,0 +1,470 @@
+"""
+Compact, memory-mappable artifact format for the scheme models.
+
+A joblib pickle of Pipeline(ColumnTransformer -> MultiOutputClassifier(RandomForest))
+stores every tree as a separate object with float64 thresholds, int64 node
+indices and a probability row for every node, and one object array of
+categories per encoder. Loading it means unpickling all of that into private
+memory in every worker. A `.compact` file stores the same model as the flat
+arrays of a CompiledPipeline (fast_inference.py):
+
+  - int32 feature / child-pointer arrays and float32 thresholds (rounded down,
+    which keeps comparisons exact) shared by all trees of all forests
+  - float64 probability rows for leaves only, one table per output
+  - one shared vocabulary of category values, referenced by index from each
+    one-hot column, so 'Yes'/'No'/'N/A' are stored once
+
+Layout: an 8-byte magic, the header length (8 bytes, little endian), a JSON
+header (columns, slots, vocabulary, forests, array directory, provenance), then
+each array at a 64-byte aligned offset. Uncompressed arrays are memory-mapped on
+load, so workers share the pages and loading reads almost nothing up front.
+With compression (zlib per array) the file is smaller but arrays are inflated
+into memory on load.
+
+A loaded artifact is a CompiledPipeline. It offers the sklearn-style
+predict_proba()/predict() the serving and bulk-scoring code use, and the
+compiled single-record path. export() checks it against the original
+pipeline's predict_proba before writing.
+
+Usage:
+    python compact_model.py export community                 # next to the artifact the server loads
+    python compact_model.py export individual --compress --data statewide.csv
+    python compact_model.py verify "community/community_model.compact"
+    python compact_model.py report all                       # size / load time / RSS per format
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import struct
+import subprocess
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from fast_inference import (
+    CompiledPipeline, _CategoricalSlot, _Forest, _NumericSlot, check_equivalence, compile_pipeline,
+)
+
+MAGIC = b'TE360CM1'
+FORMAT_VERSION = 1
+SUFFIX = '.compact'
+ALIGNMENT = 64
+# Rows of the source data used to validate an export
+VALIDATION_ROWS = 20_000
+
+
+class ArtifactError(ValueError):
+    """Raised for malformed, corrupt or stale compact artifacts."""
+
+
+def compact_path(artifact_path):
+    """Where the compact twin of a .pkl artifact lives."""
+    return os.path.splitext(artifact_path)[0] + SUFFIX
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ================== VALUES ==================
+# Category values, fill values and classes go into the JSON header. NaN is not
+# valid JSON, and NumPy scalars are not serializable, so both are mapped.
+
+def _encode_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return {'nan': True}
+    if value is not None and not isinstance(value, (str, int, float, bool)):
+        raise TypeError(f"Cannot store category value {value!r}")
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return float('nan')
+    return value
+
+
+# ================== WRITING ==================
+
+def _slot_header(slot, vocabulary, vocabulary_index):
+    if isinstance(slot, _NumericSlot):
+        return {'kind': 'numeric', 'column': slot.column, 'offset': slot.offset, 'fill_value': slot.fill_value}
+    categories = [None] * slot.width
+    for category, i in slot.index.items():
+        categories[i] = category
+    if slot.nan_index is not None:
+        categories[slot.nan_index] = float('nan')
+    refs = []
+    for category in categories:
+        encoded = _encode_value(category)
+        # type() keeps 1, 1.0 and True apart, which compare (and hash) equal
+        key = json.dumps(encoded, sort_keys=True) + type(encoded).__name__
+        if key not in vocabulary_index:
+            vocabulary_index[key] = len(vocabulary)
+            vocabulary.append(encoded)
+        refs.append(vocabulary_index[key])
+    return {
+        'kind': 'categorical', 'column': slot.column, 'offset': slot.offset,
+        'categories': refs, 'fill_value': _encode_value(slot.fill_value), 'impute': slot.impute,
+    }
+
+
+def write(compiled, path, compress=False, source=None):
+    """
+    Writes a CompiledPipeline as a compact artifact (atomically). `source` is
+    the .pkl it came from, recorded so stale exports can be detected.
+    """
+    vocabulary, vocabulary_index = [], {}
+    slots = [_slot_header(slot, vocabulary, vocabulary_index) for slot in compiled.slots]
+    arrays = {
+        'feature': compiled.feature, 'threshold': compiled.threshold,
+        'left': compiled.left, 'right': compiled.right, 'roots': compiled.roots,
+    }
+    forests = []
+    for k, forest in enumerate(compiled.forests):
+        arrays[f'leaf_proba_{k}'] = forest.leaf_proba
+        forests.append({
+            'classes': [_encode_value(c) for c in forest.classes],
+            'classes_dtype': np.asarray(forest.classes).dtype.str,
+            'n_trees': forest.n_trees,
+            'trees': [forest.tree_slice.start, forest.tree_slice.stop],
+            'node_offset': forest.node_offset,
+        })
+
+    blobs = []
+    directory = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        raw = array.tobytes()
+        data = zlib.compress(raw, 6) if compress else raw
+        directory[name] = {
+            'dtype': array.dtype.str, 'shape': list(array.shape), 'nbytes': len(raw),
+            'stored_bytes': len(data), 'crc32': zlib.crc32(raw),
+            'compression': 'zlib' if compress else None,
+        }
+        blobs.append((name, data))
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'columns': list(compiled.columns),
+        'n_encoded': compiled.n_encoded,
+        'slots': slots,
+        'vocabulary': vocabulary,
+        'forests': forests,
+        'arrays': directory,
+        'created_at': time.time(),
+    }
+    if source is not None:
+        stat = os.stat(source)
+        header['source'] = {
+            'path': os.path.basename(source), 'sha256': _sha256(source),
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        }
+
+    # Offsets depend on the header length, which depends on the offsets:
+    # reserve room for them first, then lay the arrays out after the header.
+    for name in directory:
+        directory[name]['offset'] = 0
+    header_length = len(json.dumps(header).encode('utf-8')) + 32 * len(directory) + 256
+    offset = _aligned(16 + header_length)
+    for name, data in blobs:
+        directory[name]['offset'] = offset
+        offset = _aligned(offset + len(data))
+    encoded = json.dumps(header).encode('utf-8')
+    if len(encoded) > header_length:
+        raise ArtifactError("header grew past its reserved size")
+    encoded = encoded.ljust(header_length)
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', header_length) + encoded)
+        for name, data in blobs:
+            f.seek(directory[name]['offset'])
+            f.write(data)
+        f.truncate(offset)
+    os.replace(tmp, path)
+    return header
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# ================== READING ==================
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ArtifactError(f"'{path}' is not a compact model artifact")
+        (length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length).decode('utf-8'))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f"'{path}' has unsupported format version {header.get('format_version')}")
+    return header
+
+
+def _read_array(path, name, spec, mmap_mode, data=None, verify=False):
+    dtype = np.dtype(spec['dtype'])
+    shape = tuple(spec['shape'])
+    if spec['compression'] == 'zlib':
+        with open(path, 'rb') as f:
+            f.seek(spec['offset'])
+            raw = zlib.decompress(f.read(spec['stored_bytes']))
+        array = np.frombuffer(raw, dtype=dtype).reshape(shape)
+    elif mmap_mode is not None:
+        if not spec['nbytes']:
+            return np.zeros(shape, dtype=dtype)
+        array = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=spec['offset'], shape=shape)
+    else:
+        array = np.frombuffer(data, dtype=dtype, count=math.prod(shape), offset=spec['offset']).reshape(shape)
+    if verify and zlib.crc32(np.ascontiguousarray(array).tobytes()) != spec['crc32']:
+        raise ArtifactError(f"'{path}': checksum mismatch in array '{name}'")
+    return array
+
+
+def load(path, mmap_mode='r', verify=False):
+    """
+    Loads a compact artifact as a CompiledPipeline. With mmap_mode (default
+    'r') uncompressed arrays are memory-mapped read-only; with None the file is
+    read into memory. verify=True checks every array's CRC (reads all pages).
+    """
+    header = read_header(path)
+    data = None
+    if mmap_mode is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    arrays = {
+        name: _read_array(path, name, spec, mmap_mode, data, verify)
+        for name, spec in header['arrays'].items()
+    }
+
+    vocabulary = [_decode_value(v) for v in header['vocabulary']]
+    slots = []
+    for slot in header['slots']:
+        if slot['kind'] == 'numeric':
+            slots.append(_NumericSlot(slot['column'], slot['offset'], slot['fill_value']))
+        else:
+            categories = [vocabulary[i] for i in slot['categories']]
+            slots.append(_CategoricalSlot(
+                slot['column'], slot['offset'], categories, _decode_value(slot['fill_value']), slot['impute'],
+            ))
+    forests = [
+        _Forest(
+            classes=np.asarray([_decode_value(c) for c in forest['classes']], dtype=forest['classes_dtype']),
+            n_trees=forest['n_trees'],
+            tree_slice=slice(*forest['trees']),
+            node_offset=forest['node_offset'],
+            leaf_proba=arrays[f'leaf_proba_{k}'],
+        )
+        for k, forest in enumerate(header['forests'])
+    ]
+    compiled = CompiledPipeline(
+        columns=header['columns'], slots=slots, n_encoded=header['n_encoded'],
+        feature=arrays['feature'], threshold=arrays['threshold'],
+        left=arrays['left'], right=arrays['right'], roots=arrays['roots'], forests=forests,
+    )
+    compiled.source = header.get('source')
+    return compiled
+
+
+def is_current(compact, artifact_path):
+    """True if a loaded compact artifact was exported from the .pkl at artifact_path as it is now."""
+    source = getattr(compact, 'source', None)
+    if not source:
+        return False
+    stat = os.stat(artifact_path)
+    return source['size'] == stat.st_size and source['mtime_ns'] == stat.st_mtime_ns
+
+
+def load_model(path, mmap_mode='r'):
+    """Loads either artifact format: a .compact file or a joblib pickle."""
+    if path.endswith(SUFFIX):
+        return load(path, mmap_mode)
+    import joblib
+
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+# ================== VALIDATION ==================
+
+def validate(pipeline, compiled, frame, single_records=200):
+    """
+    Compares a compact model with the pipeline it came from on `frame`: batch
+    probabilities must be identical, and so must single-record predictions on
+    the first `single_records` rows. Returns a summary; raises ArtifactError.
+    """
+    features = list(compiled.columns)
+    frame = frame[features]
+    expected = pipeline.predict_proba(frame)
+    expected = expected if isinstance(expected, list) else [expected]
+    actual = compiled.predict_proba(frame)
+    max_diff = max(float(np.max(np.abs(e - a), initial=0.0)) for e, a in zip(expected, actual))
+    labels_equal = bool((pipeline.predict(frame) == compiled.predict(frame)).all())
+    records = frame.head(single_records).to_dict('records')
+    mismatches = check_equivalence(pipeline, compiled, records)
+    summary = {
+        'rows': len(frame), 'max_probability_diff': max_diff,
+        'labels_equal': labels_equal, 'single_record_mismatches': len(mismatches),
+    }
+    if max_diff != 0.0 or not labels_equal or mismatches:
+        raise ArtifactError(f"compact model disagrees with the pipeline: {summary}")
+    return summary
+
+
+def export(pipeline_path, output_path=None, compress=False, frame=None):
+    """
+    Compiles the pickled pipeline at pipeline_path, validates the result on
+    `frame` (when given) and writes it. Returns (header, validation summary).
+    """
+    import joblib
+
+    pipeline = joblib.load(pipeline_path)
+    compiled = compile_pipeline(pipeline)
+    summary = validate(pipeline, compiled, frame) if frame is not None else None
+    output_path = output_path or compact_path(pipeline_path)
+    header = write(compiled, output_path, compress, source=pipeline_path)
+    # Round trip: what was written must load back to the same model
+    if frame is not None:
+        validate(pipeline, load(output_path, 'r', verify=True), frame, single_records=20)
+    return header, summary
+
+
+# ================== REPORT ==================
+# Each measurement runs in a fresh interpreter so the RSS is the artifact's own.
+
+_MEASURE = r'''
+import json, sys, time, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, sys.argv[1])
+import numpy, sklearn, pandas, fast_inference
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * __import__('os').sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+from compact_model import load_model
+path, mmap_mode = sys.argv[2], (None if sys.argv[3] == 'none' else sys.argv[3])
+before = rss_mb()
+started = time.perf_counter()
+model = load_model(path, mmap_mode)
+seconds = time.perf_counter() - started
+print(json.dumps({'load_seconds': seconds, 'rss_mb': rss_mb() - before}))
+'''
+
+
+def measure_load(path, mmap_mode):
+    out = subprocess.run(
+        [sys.executable, '-c', _MEASURE, os.path.dirname(os.path.abspath(__file__)), path, mmap_mode or 'none'],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def report(pipeline_path, repeats=3):
+    """Size, load time (best of `repeats`) and RSS added by loading, for each format."""
+    base = os.path.splitext(pipeline_path)[0]
+    plain, packed = f"{base}.report{SUFFIX}", f"{base}.report.zlib{SUFFIX}"
+    import joblib
+
+    compiled = compile_pipeline(joblib.load(pipeline_path))
+    write(compiled, plain)
+    write(compiled, packed, compress=True)
+    formats = [
+        ('joblib pickle', pipeline_path, None),
+        ('joblib pickle, mmap', pipeline_path, 'r'),
+        ('compact', plain, None),
+        ('compact, mmap', plain, 'r'),
+        ('compact, zlib', packed, None),
+    ]
+    rows = []
+    try:
+        for label, path, mmap_mode in formats:
+            runs = [measure_load(path, mmap_mode) for _ in range(repeats)]
+            rows.append({
+                'format': label,
+                'bytes': os.path.getsize(path),
+                'load_seconds': min(run['load_seconds'] for run in runs),
+                'rss_mb': min(run['rss_mb'] for run in runs),
+            })
+    finally:
+        for path in (plain, packed):
+            os.remove(path)
+    return rows
+
+
+# ================== CLI ==================
+
+def _source_frame(spec, data_path, rows):
+    from training import read_sources
+
+    frame = read_sources([spec], data_path)[spec.name]
+    return frame.head(rows)
+
+
+def main(argv=None):
+    from bulk_score import resolve_model
+    from model_specs import SPECS
+
+    parser = argparse.ArgumentParser(description="Export, verify and compare compact model artifacts.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('export', help="compile a .pkl into a validated .compact artifact")
+    p.add_argument('model', choices=list(SPECS))
+    p.add_argument('--model-path', help="the .pkl to export (default: the one the server loads)")
+    p.add_argument('--output', help=f"output path (default: the .pkl path with {SUFFIX})")
+    p.add_argument('--compress', action='store_true', help="zlib-compress arrays (smaller, but not mmap-able)")
+    p.add_argument('--data', help="CSV to validate against (default: the model's training CSV)")
+    p.add_argument('--validation-rows', type=int, default=VALIDATION_ROWS)
+    p = sub.add_parser('verify', help="check a .compact file's header and array checksums")
+    p.add_argument('path')
+    p = sub.add_parser('report', help="artifact size, load time and RSS for each format")
+    p.add_argument('models', nargs='*', default=['all'])
+    p.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'export':
+            spec = SPECS[args.model]
+            pipeline_path = args.model_path or resolve_model(spec)[0]
+            frame = _source_frame(spec, args.data, args.validation_rows)
+            header, summary = export(pipeline_path, args.output, args.compress, frame)
+            output = args.output or compact_path(pipeline_path)
+            print(f"✅ {spec.label} model exported to '{output}' ({os.path.getsize(output)} bytes, "
+                  f"{os.path.getsize(pipeline_path)} as a pickle)")
+            print(f"   validated on {summary['rows']} rows: identical probabilities and labels")
+        elif args.command == 'verify':
+            compiled = load(args.path, 'r', verify=True)
+            print(f"✅ '{args.path}': {len(compiled.feature)} nodes, "
+                  f"{len(compiled.forests)} forests, checksums OK")
+        else:
+            names = list(SPECS) if 'all' in args.models else args.models
+            for name in names:
+                pipeline_path = resolve_model(SPECS[name])[0]
+                print(f"{SPECS[name].label} ({pipeline_path})")
+                print(f"  {'format':<22}{'bytes':>12}{'load ms':>10}{'RSS MB':>9}")
+                for row in report(pipeline_path, args.repeats):
+                    print(f"  {row['format']:<22}{row['bytes']:>12}{row['load_seconds'] * 1000:>10.2f}"
+                          f"{row['rss_mb']:>9.2f}")
+    except (FileNotFoundError, ValueError, TypeError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
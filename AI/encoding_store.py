@@ -0,0 +1,381 @@
+"""
+Vocabulary / encoding store shared by training and serving.
+
+A Vocabulary is the fitted preprocessor of a model written down as data: for
+every categorical column its categories (a value's integer code is its index,
+its one-hot position is the column's offset plus that code) and how missing
+values are imputed, and for every numeric column its position and imputation
+mean. It is derived from the fitted ColumnTransformer, so it always agrees
+with the artifact it came from.
+
+Serving (opt-in, AI_VOCABULARY_ENCODING=1): each loaded sklearn pipeline gets
+its Vocabulary, and records are encoded by the compiled fast path's dict
+lookups (fast_inference.encode_many) into a float32 matrix that goes straight
+to the forests, skipping the ColumnTransformer (and the DataFrame it needs).
+Predictions are identical.
+
+Training: with --cache-encodings (training.py) the fitted preprocessor, its
+vocabulary.json, the encoded feature matrix and the label matrix are stored
+under AI_ENCODING_CACHE_DIR (default AI/encoding_cache/<model>/<key>/), keyed
+by the source file (path, size, mtime) and the spec's encoding settings. The
+matrices are plain .npy files (CSR data/indices/indptr, or one dense array,
+whichever the ColumnTransformer produces) and are memory-mapped on load, so
+repeated runs and experiments on the same data skip fitting and applying the
+encoders. On a miss the matrix is built from the parsed frame's categorical
+codes in a few vectorized NumPy operations instead of the ColumnTransformer;
+it is identical to ColumnTransformer.transform.
+
+Usage:
+    python encoding_store.py show individual      # the vocabulary of the trained artifact
+    python encoding_store.py list                 # cached encodings
+    python encoding_store.py clear [MODEL]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from model_specs import AI_DIR, SPECS
+
+CACHE_DIR = os.environ.get("AI_ENCODING_CACHE_DIR", os.path.join(AI_DIR, "encoding_cache"))
+# Cached encodings kept per model (older source versions are pruned)
+CACHE_KEEP = int(os.environ.get("AI_ENCODING_CACHE_KEEP", 3))
+FORMAT_VERSION = 1
+
+
+def _is_nan(value):
+    return isinstance(value, float) and value != value
+
+
+# ================== VOCABULARY ==================
+
+class Vocabulary:
+    """The one-hot layout and imputation values of a fitted preprocessor."""
+
+    def __init__(self, slots, width, sparse):
+        # fast_inference slots: each knows its column, offset and value -> code index
+        self.slots = slots
+        self.width = width
+        self.sparse = sparse
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        """Raises TypeError for preprocessors the compiled slots cannot describe exactly."""
+        from fast_inference import _compile_preprocessor
+
+        slots, width = _compile_preprocessor(preprocessor)
+        return cls(slots, width, bool(getattr(preprocessor, 'sparse_output_', False)))
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        return cls.from_preprocessor(pipeline.steps[0][1])
+
+    def to_dict(self):
+        from fast_inference import _NumericSlot
+
+        columns = []
+        for slot in self.slots:
+            if isinstance(slot, _NumericSlot):
+                columns.append({'column': slot.column, 'kind': 'numeric', 'offset': slot.offset,
+                                'fill_value': slot.fill_value})
+                continue
+            categories = [None] * slot.width
+            for value, code in slot.index.items():
+                categories[code] = value if isinstance(value, str) else repr(value)
+            columns.append({
+                'column': slot.column, 'kind': 'categorical', 'offset': slot.offset,
+                # The code of a value is its index here; the NaN category (if any) is null
+                'categories': categories,
+                'impute': slot.impute,
+                'fill_value': slot.fill_value if isinstance(slot.fill_value, str) else None,
+            })
+        return {'format_version': FORMAT_VERSION, 'width': self.width, 'sparse': self.sparse, 'columns': columns}
+
+    @property
+    def digest(self):
+        payload = json.dumps(self.to_dict(), sort_keys=True).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    # ---------- serving: dict lookups ----------
+
+    def encode_records(self, records):
+        """
+        float32 matrix of validated records, as the forests see them after the
+        ColumnTransformer: the compiled fast path's encoder over these slots.
+        """
+        from fast_inference import encode_many
+
+        return encode_many(self.slots, self.width, records)
+
+    # ---------- training: vectorized over category codes ----------
+
+    def _positions(self, slot, series):
+        """One-hot position per row for a categorical column (-1 = all-zero block)."""
+        import pandas as pd
+
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        lookup = np.array([slot.index.get(value, -1) for value in series.cat.categories], dtype=np.int64)
+        codes = series.cat.codes.to_numpy()
+        missing = codes < 0
+        if slot.impute:
+            nan_position = slot.index.get(slot.fill_value, -1)
+        elif slot.nan_index is not None:
+            nan_position = slot.nan_index
+        else:
+            if missing.any():
+                raise ValueError(f"Input contains NaN in column '{slot.column}'")
+            nan_position = -1
+        positions = np.where(missing, nan_position, lookup[np.maximum(codes, 0)] if len(lookup) else -1)
+        return np.where(positions >= 0, positions + slot.offset, -1)
+
+    def encode_frame(self, frame):
+        """Same matrix as the fitted ColumnTransformer's transform(frame), values and sparsity."""
+        import scipy.sparse as sp
+        from fast_inference import _NumericSlot
+
+        n = len(frame)
+        parts = []
+        run = []
+
+        def flush_categorical():
+            # One CSR block for a run of categorical slots, entries in column order per row
+            if not run:
+                return
+            start, stop = run[0].offset, run[-1].offset + run[-1].width
+            positions = np.column_stack([self._positions(slot, frame[slot.column]) for slot in run]) - start
+            present = positions >= 0
+            indptr = np.concatenate([[0], np.cumsum(present.sum(axis=1))])
+            indices = positions[present].astype(np.int32)
+            parts.append(sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, stop - start)))
+            run.clear()
+
+        for slot in self.slots:
+            if isinstance(slot, _NumericSlot):
+                flush_categorical()
+                values = frame[slot.column].to_numpy(dtype=np.float64, na_value=np.nan)
+                missing = np.isnan(values)
+                if missing.any():
+                    if slot.fill_value is None:
+                        raise ValueError(f"Input contains NaN in column '{slot.column}'")
+                    values = np.where(missing, slot.fill_value, values)
+                parts.append(values.reshape(-1, 1))
+            else:
+                run.append(slot)
+        flush_categorical()
+
+        if self.sparse:
+            return sp.hstack(parts).tocsr()
+        return np.hstack([part.toarray() if sp.issparse(part) else part for part in parts])
+
+
+# ================== TRAINING CACHE ==================
+
+def _source_identity(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cache_key(spec, data_path):
+    """Changes whenever the source file or anything that shapes the encoding does."""
+    import sklearn
+
+    payload = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'source': _source_identity(data_path),
+        'features': spec.features,
+        'categorical': spec.categorical_features,
+        'numeric': spec.numeric_features,
+        'impute_categorical': spec.impute_categorical,
+        'remainder': spec.remainder,
+        'targets': spec.target_columns,
+        'sklearn': sklearn.__version__,
+    }, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def entry_dir(spec, data_path, root=None):
+    return os.path.join(root or CACHE_DIR, spec.name, cache_key(spec, data_path))
+
+
+class EncodedData:
+    """A fitted preprocessor with the encoded features X and labels Y of one source file."""
+
+    def __init__(self, preprocessor, X, Y, vocabulary, meta):
+        self.preprocessor = preprocessor
+        self.X = X
+        self.Y = Y
+        self.vocabulary = vocabulary
+        self.meta = meta
+
+
+def _save_matrix(directory, X):
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        X = X.tocsr()
+        for name in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(directory, f'X.{name}.npy'), getattr(X, name))
+        return {'sparse': True, 'shape': list(X.shape)}
+    np.save(os.path.join(directory, 'X.npy'), np.ascontiguousarray(X))
+    return {'sparse': False, 'shape': list(X.shape)}
+
+
+def _load_matrix(directory, layout, mmap_mode):
+    import scipy.sparse as sp
+
+    if layout['sparse']:
+        data, indices, indptr = (np.load(os.path.join(directory, f'X.{name}.npy'), mmap_mode=mmap_mode)
+                                 for name in ('data', 'indices', 'indptr'))
+        return sp.csr_matrix((data, indices, indptr), shape=tuple(layout['shape']))
+    return np.load(os.path.join(directory, 'X.npy'), mmap_mode=mmap_mode)
+
+
+def load(spec, data_path, root=None, mmap_mode='r'):
+    """The cached EncodedData for this source file, or None."""
+    import joblib
+
+    directory = entry_dir(spec, data_path, root)
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        preprocessor = joblib.load(os.path.join(directory, 'preprocessor.joblib'))
+        X = _load_matrix(directory, meta['X'], mmap_mode)
+        Y = np.load(os.path.join(directory, 'Y.npy'), mmap_mode=mmap_mode)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+    return EncodedData(preprocessor, X, Y, Vocabulary.from_preprocessor(preprocessor), meta)
+
+
+def save(spec, data_path, encoded, root=None):
+    """Writes an entry atomically (a temp directory renamed into place) and prunes old ones."""
+    import joblib
+
+    directory = entry_dir(spec, data_path, root)
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    joblib.dump(encoded.preprocessor, os.path.join(tmp, 'preprocessor.joblib'))
+    np.save(os.path.join(tmp, 'Y.npy'), np.ascontiguousarray(encoded.Y))
+    meta = dict(encoded.meta, X=_save_matrix(tmp, encoded.X))
+    with open(os.path.join(tmp, 'vocabulary.json'), 'w') as f:
+        json.dump(encoded.vocabulary.to_dict(), f, indent=1)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    encoded.meta = meta
+    prune(spec, root)
+
+
+def prune(spec, root=None, keep=CACHE_KEEP):
+    model_dir = os.path.join(root or CACHE_DIR, spec.name)
+    if not os.path.isdir(model_dir):
+        return
+    entries = sorted(
+        (os.path.join(model_dir, name) for name in os.listdir(model_dir)),
+        key=os.path.getmtime, reverse=True,
+    )
+    for stale in entries[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def encode(spec, df):
+    """EncodedData for a parsed frame: fits the spec's preprocessor, then encodes via the vocabulary."""
+    from training import build_pipeline, derive_labels
+
+    started = time.perf_counter()
+    preprocessor = build_pipeline(spec).named_steps['preprocessor']
+    preprocessor.fit(df[spec.features])
+    try:
+        vocabulary = Vocabulary.from_preprocessor(preprocessor)
+        X = vocabulary.encode_frame(df)
+    except TypeError:
+        vocabulary, X = None, preprocessor.transform(df[spec.features])
+    Y = derive_labels(spec, df).to_numpy()
+    meta = {
+        'model': spec.name, 'rows': len(df), 'vocabulary': vocabulary.digest if vocabulary else None,
+        'encode_seconds': round(time.perf_counter() - started, 3), 'created_at': time.time(),
+    }
+    return EncodedData(preprocessor, X, Y, vocabulary, meta)
+
+
+def encoded_training_data(spec, data_path, df=None, root=None, chunksize=None):
+    """
+    (EncodedData, hit) for a source file: from the cache when it is current,
+    otherwise encoded (parsing the file unless `df` is given) and cached.
+    """
+    cached = load(spec, data_path, root)
+    if cached is not None:
+        print(f"⚡ Reusing cached {spec.label} encodings ({cached.meta['rows']} rows, "
+              f"vocabulary {cached.meta['vocabulary']})")
+        return cached, True
+    if df is None:
+        from training import DEFAULT_CHUNKSIZE, read_source
+
+        df = read_source(data_path, spec.source_columns, spec.numeric_features, chunksize or DEFAULT_CHUNKSIZE)
+    encoded = encode(spec, df)
+    if encoded.vocabulary is not None:
+        save(spec, data_path, encoded, root)
+        print(f"📦 Cached {spec.label} encodings ({len(df)} rows, {encoded.meta['encode_seconds']:.2f}s to encode)")
+    return encoded, False
+
+
+# ================== CLI ==================
+
+def _entries(root, names):
+    for name in names:
+        model_dir = os.path.join(root, name)
+        if not os.path.isdir(model_dir):
+            continue
+        for key in sorted(os.listdir(model_dir)):
+            try:
+                with open(os.path.join(model_dir, key, 'meta.json')) as f:
+                    yield name, key, json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the vocabulary / encoding store.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help="print the vocabulary of a trained artifact")
+    show.add_argument('model', choices=list(SPECS))
+    show.add_argument('--model-path', dest='model_path', help="artifact to read (default: the spec's .pkl)")
+    listing = sub.add_parser('list', help="list cached encodings")
+    listing.add_argument('--root', default=CACHE_DIR)
+    clear = sub.add_parser('clear', help="delete cached encodings")
+    clear.add_argument('model', nargs='?', choices=list(SPECS))
+    clear.add_argument('--root', default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        import joblib
+
+        spec = SPECS[args.model]
+        try:
+            vocabulary = Vocabulary.from_pipeline(joblib.load(args.model_path or spec.artifact_path))
+        except (FileNotFoundError, TypeError) as e:
+            print(f"❌ {e}")
+            return 1
+        print(json.dumps(dict(vocabulary.to_dict(), digest=vocabulary.digest), indent=2))
+    elif args.command == 'list':
+        for name, key, meta in _entries(args.root, list(SPECS)):
+            print(f"{name:<22} {key}  {meta['rows']:>9} rows  vocabulary {meta['vocabulary']}  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['created_at']))}")
+    else:
+        names = [args.model] if args.model else list(SPECS)
+        for name in names:
+            shutil.rmtree(os.path.join(args.root, name), ignore_errors=True)
+        print(f"✅ Cleared cached encodings for {', '.join(names)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
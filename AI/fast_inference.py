@@ -0,0 +1,417 @@
+"""
+Compiled, pandas-free inference for the scheme recommendation pipelines.
+
+The .pkl models are Pipeline(ColumnTransformer -> MultiOutputClassifier(RandomForest)).
+For a single request almost all of the time goes into building a DataFrame and
+running the ColumnTransformer; the trees themselves are tiny. `compile_pipeline`
+flattens a fitted pipeline into plain NumPy arrays once, at load time:
+
+  - every input column becomes a slot in the encoded vector (one-hot offsets for
+    categorical columns, imputation means for numeric ones)
+  - every tree of every forest is packed into shared int32 feature / child
+    pointer arrays and a float32 threshold array, plus a per-forest table of
+    normalized leaf probabilities with one row per leaf (a leaf's `right`
+    entry holds its row, since leaves have no children)
+
+`CompiledPipeline.predict_one(record)` then goes straight from the feature dict to
+an encoded vector and walks all trees at once. The arithmetic mirrors sklearn
+(float32 features compared against the thresholds, tree probabilities summed
+in tree order, then divided by the number of trees), so outputs are identical to
+`Pipeline.predict` on a one-row DataFrame. Thresholds are rounded down to the
+nearest float32, for which `x <= threshold` gives the same answer as sklearn's
+float64 comparison for every float32 x.
+
+The same arrays are what compact_model.py writes to disk, and CompiledPipeline
+also offers sklearn-style predict_proba()/predict() over many records, so a
+compact artifact can stand in for the pickled pipeline.
+"""
+
+import math
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from scoring import score_one
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+class _CategoricalSlot:
+    """One one-hot encoded column, optionally preceded by a constant imputer."""
+
+    def __init__(self, column, offset, categories, fill_value=None, impute=False):
+        self.column = column
+        self.offset = offset
+        self.width = len(categories)
+        self.fill_value = fill_value
+        self.impute = impute
+        self.index = {}
+        self.nan_index = None
+        for i, category in enumerate(categories):
+            if _is_nan(category):
+                self.nan_index = i
+            else:
+                self.index[category] = i
+
+    def encode(self, value, out):
+        if self.impute and _is_nan(value):
+            value = self.fill_value
+        if _is_nan(value):
+            if self.nan_index is None and not self.impute:
+                # sklearn cannot compare a NaN column against string categories either
+                raise ValueError(f"Input contains NaN in column '{self.column}'")
+            i = self.nan_index
+        else:
+            i = self.index.get(value)
+        # handle_unknown='ignore': unseen values leave the block all zeros
+        if i is not None:
+            out[self.offset + i] = 1.0
+
+
+class _NumericSlot:
+    """One numeric column, either passed through or mean/median/constant imputed."""
+
+    def __init__(self, column, offset, fill_value=None):
+        self.column = column
+        self.offset = offset
+        self.width = 1
+        self.fill_value = fill_value
+
+    def encode(self, value, out):
+        value = np.nan if value is None else float(value)
+        if math.isnan(value):
+            if self.fill_value is None:
+                raise ValueError(f"Input contains NaN in column '{self.column}'")
+            value = self.fill_value
+        out[self.offset] = value
+
+
+class _Forest:
+    """Leaf probability table (one row per leaf) and metadata for one RandomForestClassifier."""
+
+    def __init__(self, classes, n_trees, tree_slice, node_offset, leaf_proba):
+        self.classes = classes
+        self.n_trees = n_trees
+        self.tree_slice = tree_slice
+        self.node_offset = node_offset
+        self.leaf_proba = leaf_proba
+
+
+class CompiledPipeline:
+    """Flat-array equivalent of a fitted ColumnTransformer + MultiOutput forest pipeline."""
+
+    def __init__(self, columns, slots, n_encoded, feature, threshold, left, right, roots, forests):
+        # For leaves feature is -1 and right is the row in the forest's leaf_proba
+        self.columns = columns
+        self.slots = slots
+        self.n_encoded = n_encoded
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.roots = roots
+        self.forests = forests
+
+    def encode(self, record):
+        """Encodes a feature dict into the float32 vector the forests were trained on."""
+        out = np.zeros(self.n_encoded, dtype=np.float64)
+        for slot in self.slots:
+            slot.encode(record[slot.column], out)
+        # sklearn casts the transformed matrix to float32 before walking the trees
+        return out.astype(np.float32)
+
+    def apply(self, x):
+        """Returns the leaf node (global index) reached in every tree for encoded vector x."""
+        nodes = self.roots.copy()
+        while True:
+            feature = self.feature[nodes]
+            internal = feature >= 0
+            if not internal.any():
+                return nodes
+            active = nodes[internal]
+            go_left = x[feature[internal]] <= self.threshold[active]
+            nodes[internal] = np.where(go_left, self.left[active], self.right[active])
+
+    def predict_proba_one(self, record):
+        """Per-output class probabilities, as MultiOutputClassifier.predict_proba would give."""
+        return self.predict_proba_encoded(self.encode(record))
+
+    def predict_proba_encoded(self, x):
+        """predict_proba_one for a vector already produced by encode()."""
+        leaves = self.apply(x)
+        probas = []
+        for forest in self.forests:
+            tree_proba = forest.leaf_proba[self.right[leaves[forest.tree_slice]]]
+            # cumsum adds tree by tree, in the same order as sklearn's accumulation
+            probas.append(np.cumsum(tree_proba, axis=0)[-1] / forest.n_trees)
+        return probas
+
+    def predict_one(self, record):
+        """Predicts all outputs for one feature dict; same values as Pipeline.predict(...)[0]."""
+        return self.predict_encoded(self.encode(record))
+
+    def predict_encoded(self, x):
+        """predict_one for a vector already produced by encode()."""
+        probas = self.predict_proba_encoded(x)
+        return np.asarray([
+            forest.classes[np.argmax(proba)] for forest, proba in zip(self.forests, probas)
+        ])
+
+    def score_encoded(self, x):
+        """(labels, eligibility probabilities) for an encoded vector, from one traversal."""
+        return score_one([forest.classes for forest in self.forests], self.predict_proba_encoded(x))
+
+    # ---- sklearn-style batch interface (DataFrame or list of feature dicts) ----
+
+    @property
+    def classes_(self):
+        return [forest.classes for forest in self.forests]
+
+    def encode_many(self, data):
+        """Encodes a DataFrame or a list of feature dicts into an (n, n_encoded) float32 matrix."""
+        return encode_many(self.slots, self.n_encoded, data)
+
+    def apply_many(self, X):
+        """Leaf node reached in every tree for every row of an encoded matrix, shape (n, n_trees)."""
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        while True:
+            feature = self.feature[nodes]
+            rows, trees = np.nonzero(feature >= 0)
+            if not len(rows):
+                return nodes
+            active = nodes[rows, trees]
+            go_left = X[rows, feature[rows, trees]] <= self.threshold[active]
+            nodes[rows, trees] = np.where(go_left, self.left[active], self.right[active])
+
+    def predict_proba_matrix(self, X):
+        """Per-output (n, n_classes) probabilities for an encoded matrix."""
+        leaves = self.apply_many(X)
+        probas = []
+        for forest in self.forests:
+            rows = self.right[leaves[:, forest.tree_slice]]
+            total = np.zeros((len(X), len(forest.classes)), dtype=np.float64)
+            # Tree by tree, in sklearn's accumulation order
+            for tree in range(rows.shape[1]):
+                total += forest.leaf_proba[rows[:, tree]]
+            probas.append(total / forest.n_trees)
+        return probas
+
+    def predict_proba(self, data):
+        """Same values as MultiOutputClassifier.predict_proba on the pipeline's input."""
+        return self.predict_proba_matrix(self.encode_many(data))
+
+    def predict(self, data):
+        """Same values as Pipeline.predict, for a DataFrame or a list of feature dicts."""
+        probas = self.predict_proba(data)
+        return np.asarray([
+            np.asarray(forest.classes).take(np.argmax(proba, axis=1), axis=0)
+            for forest, proba in zip(self.forests, probas)
+        ]).T
+
+
+def encode_many(slots, width, data):
+    """
+    Encodes a DataFrame or a list of feature dicts with compiled slots into an
+    (n, width) float32 matrix, column by column. Shared with the vocabulary
+    path (encoding_store.py).
+    """
+    columns = list(dict.fromkeys(slot.column for slot in slots))
+    if hasattr(data, 'columns'):
+        values = {column: data[column].tolist() for column in columns}
+    else:
+        values = {column: [record[column] for record in data] for column in columns}
+    out = np.zeros((len(data), width), dtype=np.float64)
+    for slot in slots:
+        for row, value in zip(out, values[slot.column]):
+            slot.encode(value, row)
+    # sklearn casts the transformed matrix to float32 before walking the trees
+    return out.astype(np.float32)
+
+
+# ================== COMPILATION ==================
+
+def _column_names(preprocessor, columns):
+    names = list(preprocessor.feature_names_in_)
+    if isinstance(columns, slice) or np.ndim(columns) == 0:
+        columns = np.arange(len(names))[columns] if isinstance(columns, slice) else [columns]
+    return [names[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+
+
+def _compile_transformer(transformer, columns, offset):
+    """Builds the slots for one (transformer, columns) entry of a fitted ColumnTransformer."""
+    steps = transformer.steps if isinstance(transformer, Pipeline) else [(None, transformer)]
+    if transformer == 'passthrough':
+        steps = []
+
+    imputer = None
+    encoder = None
+    for _, step in steps:
+        if isinstance(step, SimpleImputer) and imputer is None and encoder is None:
+            imputer = step
+        elif isinstance(step, OneHotEncoder) and encoder is None:
+            encoder = step
+        else:
+            raise TypeError(f"Unsupported preprocessing step: {step!r}")
+
+    if imputer is not None:
+        if not _is_nan(imputer.missing_values) or imputer.add_indicator:
+            raise TypeError("Only SimpleImputer(missing_values=nan) without indicators is supported")
+        if any(_is_nan(s) for s in np.asarray(imputer.statistics_, dtype=object)):
+            raise TypeError("SimpleImputer dropped an all-missing column")
+
+    slots = []
+    if encoder is not None:
+        if encoder.drop is not None or getattr(encoder, '_infrequent_enabled', False):
+            raise TypeError("OneHotEncoder with drop/infrequent categories is not supported")
+        if encoder.handle_unknown != 'ignore':
+            raise TypeError("OneHotEncoder must use handle_unknown='ignore'")
+        for j, (column, categories) in enumerate(zip(columns, encoder.categories_)):
+            fill_value = imputer.statistics_[j] if imputer is not None else None
+            slot = _CategoricalSlot(column, offset, categories, fill_value, impute=imputer is not None)
+            slots.append(slot)
+            offset += slot.width
+    else:
+        for j, column in enumerate(columns):
+            fill_value = float(imputer.statistics_[j]) if imputer is not None else None
+            slots.append(_NumericSlot(column, offset, fill_value))
+            offset += 1
+    return slots, offset
+
+
+def _compile_preprocessor(preprocessor):
+    if not isinstance(preprocessor, ColumnTransformer):
+        raise TypeError("First pipeline step must be a ColumnTransformer")
+    slots = []
+    offset = 0
+    for name, transformer, columns in preprocessor.transformers_:
+        columns = _column_names(preprocessor, columns)
+        if transformer == 'drop' or not columns:
+            continue
+        new_slots, offset = _compile_transformer(transformer, columns, offset)
+        slots.extend(new_slots)
+    return slots, offset
+
+
+def float32_floor(values):
+    """
+    Largest float32 <= each float64 value. For float32 x, `x <= t` and
+    `x <= float32_floor(t)` always agree, unlike with round-to-nearest.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    too_big = rounded.astype(np.float64) > values
+    rounded[too_big] = np.nextafter(rounded[too_big], np.float32(-np.inf))
+    return rounded
+
+
+def _compile_forests(classifier):
+    if not isinstance(classifier, MultiOutputClassifier):
+        raise TypeError("Last pipeline step must be a MultiOutputClassifier")
+
+    feature, threshold, left, right, roots = [], [], [], [], []
+    forests = []
+    node_offset = 0
+    for forest in classifier.estimators_:
+        if not isinstance(forest, RandomForestClassifier) or forest.n_outputs_ != 1:
+            raise TypeError("Each output must be a single-output RandomForestClassifier")
+
+        forest_start = node_offset
+        first_tree = len(roots)
+        leaf_proba = []
+        n_leaves = 0
+        for tree in forest.estimators_:
+            t = tree.tree_
+            internal = t.children_left >= 0
+            leaf_rows = np.cumsum(~internal) - 1 + n_leaves
+            feature.append(np.where(internal, t.feature, -1))
+            threshold.append(np.where(internal, t.threshold, 0.0))
+            left.append(np.where(internal, t.children_left + node_offset, -1))
+            right.append(np.where(internal, t.children_right + node_offset, leaf_rows))
+            roots.append(node_offset)
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = t.value[~internal, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_proba.append(proba / normalizer)
+            n_leaves += len(proba)
+            node_offset += t.node_count
+
+        forests.append(_Forest(
+            classes=forest.classes_,
+            n_trees=len(forest.estimators_),
+            tree_slice=slice(first_tree, len(roots)),
+            node_offset=forest_start,
+            leaf_proba=np.concatenate(leaf_proba),
+        ))
+
+    return (
+        np.concatenate(feature).astype(np.int32),
+        float32_floor(np.concatenate(threshold)),
+        np.concatenate(left).astype(np.int32),
+        np.concatenate(right).astype(np.int32),
+        np.asarray(roots, dtype=np.int32),
+        forests,
+    )
+
+
+def compile_pipeline(pipeline):
+    """
+    Flattens a fitted Pipeline(ColumnTransformer, MultiOutputClassifier(RandomForest))
+    into a CompiledPipeline. Raises TypeError for pipeline shapes it cannot reproduce
+    exactly, so callers can fall back to the regular model.
+    """
+    if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 2:
+        raise TypeError("Expected a two-step Pipeline(preprocessor, classifier)")
+    preprocessor, classifier = pipeline.steps[0][1], pipeline.steps[1][1]
+    slots, n_encoded = _compile_preprocessor(preprocessor)
+    feature, threshold, left, right, roots, forests = _compile_forests(classifier)
+    return CompiledPipeline(
+        columns=list(preprocessor.feature_names_in_),
+        slots=slots,
+        n_encoded=n_encoded,
+        feature=feature,
+        threshold=threshold,
+        left=left,
+        right=right,
+        roots=roots,
+        forests=forests,
+    )
+
+
+def check_equivalence(pipeline, compiled, records):
+    """
+    Returns the indices of records where the compiled model disagrees with
+    Pipeline.predict on a one-row DataFrame (an empty list means identical).
+    The row gets each feature's serving dtype (request_schema.py), so a missing
+    category stays NaN in an object column instead of making it float64.
+    A record both implementations reject with an error counts as agreement.
+    """
+    from request_schema import compile_schema
+
+    schema = compile_schema(compiled, compiled.columns)
+
+    def outcome(predict, record):
+        try:
+            return predict(record)
+        except (ValueError, TypeError):
+            return None
+
+    mismatches = []
+    for i, record in enumerate(records):
+        expected = outcome(lambda r: pipeline.predict(schema.frame([r]))[0], record)
+        actual = outcome(compiled.predict_one, record)
+        if expected is None or actual is None:
+            # Both must reject the record for it to count as agreement
+            if (expected is None) != (actual is None):
+                mismatches.append(i)
+        elif expected.dtype != actual.dtype or not np.array_equal(expected, actual):
+            mismatches.append(i)
+    return mismatches
@@ -0,0 +1,56 @@
+"""
+gunicorn settings for serving app.py on N cores without N x the model memory.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- preload_app loads the models in the master before forking (AI_MODEL_LOADING
+  defaults to "eager" here), so workers share the model pages copy-on-write.
+- gc.freeze() moves everything loaded so far out of the garbage collector's
+  reach, so collections in the workers do not touch (and copy) those pages.
+- gthread workers bound the number of in-flight predictions per process to
+  AI_THREADS; slow predictions queue there instead of piling up unbounded.
+- BLAS/OpenMP pools are pinned to one thread per worker, since parallelism
+  comes from the worker processes.
+- Threads do not survive fork(): post_fork starts the registry watcher
+  (AI_REGISTRY_POLL_SECONDS) in each worker; the one started at import keeps
+  the master's preloaded copy current for workers forked later.
+- Every worker holds its own loaded models, so the admin reload and rollback
+  routes swap only the worker that handled the request. They also point the
+  registry's current.json at the new version, and the other workers follow
+  within one AI_REGISTRY_POLL_SECONDS interval; with polling off (the default)
+  they keep their version until restarted.
+
+Everything can be tuned through the environment variables read below.
+"""
+
+import gc
+import multiprocessing
+import os
+
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, "1")
+os.environ.setdefault("AI_MODEL_LOADING", "eager")
+
+bind = os.environ.get("AI_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("AI_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("AI_THREADS", 4))
+timeout = int(os.environ.get("AI_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then; the preloaded models survive in the master.
+max_requests = int(os.environ.get("AI_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    from model_store import watch_registry
+
+    watch_registry(app.served_models.values())
+    server.log.info("Worker %s ready with shared preloaded models", worker.pid)
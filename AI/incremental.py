@@ -0,0 +1,459 @@
+"""
+Incremental retraining: refresh a model in time proportional to what changed.
+
+Each model keeps a training state directory (AI_TRAINING_STATE_DIR, default
+AI/training_state/<model>/) next to its artifact:
+
+  state.json        source file size / processed bytes / prefix digest, row
+                    count, label totals, tree counts, the artifact it belongs to
+  fp-<k>.npy        64-bit fingerprints of the source rows in segment k
+  data-<k>.joblib   the parsed rows, their encoded feature matrix and labels
+
+A refresh first finds the delta. When the CSV only grew (the bytes processed
+last time hash the same) just the appended tail is parsed. Otherwise every row
+is fingerprinted and compared with the stored fingerprints, giving the added
+and removed rows (a changed claim is one of each).
+
+Then it either
+  - warm-starts: trains a few new trees per output on the added rows only
+    (their share of the forest ~ their share of the data) and appends them
+    to the existing forests, when rows were only added, or
+  - retrains from scratch whenever rows were removed (trees already fitted on
+    them would keep their influence), or when drift passes the threshold: churn (added +
+    removed rows relative to the history), the share of new rows with a
+    category the encoder has never seen, or how far the new rows move an
+    output's overall eligibility rate. It also retrains when the new rows miss or add a class,
+    or the forests have grown past MAX_TREE_GROWTH times their base size.
+    When the file only grew and the encoder would come out unchanged (no
+    unseen categories in this delta nor in any warm-started one since the
+    last full fit, no mean-imputed numerics), the cached encoded matrices
+    are reused and only the forests are refit. Either way the result is the
+    model a regular training run on the file would give.
+
+The first incremental run, or one whose artifact was replaced by a regular
+training run since, trains from scratch and records the state.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+
+from model_specs import AI_DIR
+from training import DEFAULT_CHUNKSIZE, derive_labels, fit, publish_artifact, read_source, save_artifact
+
+STATE_DIR = os.environ.get("AI_TRAINING_STATE_DIR", os.path.join(AI_DIR, "training_state"))
+DEFAULT_DRIFT_THRESHOLD = 0.2
+# Forests are rebuilt from scratch once warm starts have grown them this much
+MAX_TREE_GROWTH = 3.0
+STATE_VERSION = 1
+
+
+def state_dir(spec, root=None):
+    return os.path.join(root or STATE_DIR, spec.name)
+
+
+def _prefix_digest(path, length):
+    """blake2b of the first `length` bytes: a streaming read, far cheaper than parsing."""
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining:
+            block = f.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _ends_with_newline(path, size):
+    if not size:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+def fingerprint_rows(spec, frame):
+    """One uint64 per row over the source columns (values, not positions)."""
+    return pd.util.hash_pandas_object(frame[spec.source_columns], index=False).to_numpy(np.uint64)
+
+
+def _occurrence_rank(fingerprints):
+    """For each row, how many earlier rows share its fingerprint (0 for the first)."""
+    order = np.argsort(fingerprints, kind='stable')
+    ordered = fingerprints[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    lengths = np.diff(np.r_[starts, len(ordered)])
+    rank = np.empty(len(fingerprints), dtype=np.int64)
+    rank[order] = np.arange(len(ordered)) - np.repeat(starts, lengths)
+    return rank
+
+
+def _counts_of(values, reference):
+    """How often each of `values` occurs in `reference`."""
+    if not len(reference):
+        return np.zeros(len(values), dtype=np.int64)
+    unique, counts = np.unique(reference, return_counts=True)
+    position = np.minimum(np.searchsorted(unique, values), len(unique) - 1)
+    return np.where(unique[position] == values, counts[position], 0)
+
+
+def diff_fingerprints(old, new):
+    """
+    Multiset difference of two fingerprint arrays. Returns (kept mask over old,
+    added mask over new): the k-th duplicate of a row counts as present only if
+    the other side has at least k copies.
+    """
+    kept = _occurrence_rank(old) < _counts_of(old, new)
+    added = _occurrence_rank(new) >= _counts_of(new, old)
+    return kept, added
+
+
+# ================== STATE ==================
+
+class TrainingState:
+    """The persisted fingerprints, parsed rows and encodings behind one model's artifact."""
+
+    def __init__(self, directory, meta=None):
+        self.directory = directory
+        self.meta = meta
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            with open(os.path.join(directory, 'state.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return cls(directory)
+        return cls(directory, meta if meta.get('state_version') == STATE_VERSION else None)
+
+    def matches_artifact(self, artifact_path):
+        if self.meta is None or not os.path.exists(artifact_path):
+            return False
+        stat = os.stat(artifact_path)
+        artifact = self.meta['artifact']
+        return artifact['size'] == stat.st_size and artifact['mtime_ns'] == stat.st_mtime_ns
+
+    @property
+    def segments(self):
+        return self.meta['segments'] if self.meta else []
+
+    def fingerprints(self):
+        parts = [np.load(os.path.join(self.directory, f'fp-{k}.npy')) for k in self.segments]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+
+    def data(self):
+        """(rows, X, Y) of all segments, in fingerprint order."""
+        parts = [joblib.load(os.path.join(self.directory, f'data-{k}.joblib')) for k in self.segments]
+        rows = _concat_frames([part['rows'] for part in parts])
+        return rows, _stack([part['X'] for part in parts]), np.vstack([part['Y'] for part in parts])
+
+    def write_segment(self, k, fingerprints, rows, X, Y):
+        os.makedirs(self.directory, exist_ok=True)
+        np.save(os.path.join(self.directory, f'fp-{k}.npy'), fingerprints)
+        joblib.dump({'rows': rows, 'X': X, 'Y': Y}, os.path.join(self.directory, f'data-{k}.joblib'))
+
+    def save(self, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, 'state.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(self.directory, 'state.json'))
+        self.meta = meta
+
+    def reset(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.meta = None
+
+
+def _stack(matrices):
+    """Row-stacks encoded matrices, keeping the sparse/dense form the ColumnTransformer chose."""
+    if any(sp.issparse(m) for m in matrices):
+        return sp.vstack([sp.csr_matrix(m) for m in matrices]).tocsr()
+    return np.vstack(matrices)
+
+
+def _concat_frames(frames):
+    """pd.concat that keeps categorical columns categorical across differing category sets."""
+    from pandas.api.types import union_categoricals
+
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for column in frames[0].columns:
+        series = [frame[column] for frame in frames]
+        if isinstance(series[0].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals(series, ignore_order=True)
+        else:
+            columns[column] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+# ================== DELTA ==================
+
+def _read_tail(spec, path, offset, chunksize):
+    """Parses only the rows after byte `offset` (a row boundary), with training's dtypes."""
+    header = list(pd.read_csv(path, nrows=0).columns)
+    columns = spec.source_columns
+    dtypes = {c: ('float64' if c in spec.numeric_features else 'category') for c in columns}
+    if offset >= os.path.getsize(path):
+        return pd.DataFrame({c: pd.Series(dtype=dtypes[c]) for c in columns})
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunks = list(pd.read_csv(f, header=None, names=header, usecols=columns, dtype=dtypes, chunksize=chunksize))
+    if not chunks:
+        return pd.DataFrame({c: pd.Series(dtype=dtypes[c]) for c in columns})
+    return _concat_frames([chunk[columns] for chunk in chunks])
+
+
+def find_delta(spec, state, path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Returns (added rows, kept mask over the cached rows or None if all are kept,
+    mode, the whole parsed file or None). Only the appended tail is parsed when
+    the file just grew.
+    """
+    size = os.path.getsize(path)
+    meta = state.meta
+    source = meta['source']
+    if (os.path.abspath(path) == source['path'] and source['ends_with_newline']
+            and size >= source['processed_bytes']
+            and _prefix_digest(path, source['processed_bytes']) == source['prefix_digest']):
+        return _read_tail(spec, path, source['processed_bytes'], chunksize), None, 'append', None
+
+    frame = read_source(path, spec.source_columns, spec.numeric_features, chunksize)
+    kept, added = diff_fingerprints(state.fingerprints(), fingerprint_rows(spec, frame))
+    return frame[added].reset_index(drop=True), kept, 'diff', frame
+
+
+def _source_meta(path):
+    size = os.path.getsize(path)
+    return {
+        'path': os.path.abspath(path),
+        'processed_bytes': size,
+        'prefix_digest': _prefix_digest(path, size),
+        'ends_with_newline': _ends_with_newline(path, size),
+    }
+
+
+def _artifact_meta(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# ================== DRIFT ==================
+
+def unseen_category_share(pipeline, spec, X):
+    """Share of encoded rows whose one-hot block misses at least one column (an unseen category)."""
+    if X is None or not len(spec.categorical_features) or X.shape[0] == 0:
+        return 0.0
+    transformer = pipeline.named_steps['preprocessor'].named_transformers_['cat']
+    encoder = transformer.steps[-1][1] if hasattr(transformer, 'steps') else transformer
+    width = sum(len(categories) for categories in encoder.categories_)
+    # The categorical block comes first in the ColumnTransformer output
+    active = np.asarray(X[:, :width].sum(axis=1)).ravel()
+    return float(np.mean(active < len(spec.categorical_features)))
+
+
+def measure_drift(meta, kept, added_rows, added_Y, unseen_share):
+    history = meta['rows']
+    removed = 0 if kept is None else int((~kept).sum())
+    churn = (len(added_rows) + removed) / max(history, 1)
+    label_shift = 0.0
+    if len(added_rows):
+        # How far the new rows move the overall eligibility rates, so a handful
+        # of unusual rows does not count as drift on its own
+        before = np.asarray(meta['label_totals'], dtype=np.float64) / max(history, 1)
+        weight = len(added_rows) / max(history + len(added_rows), 1)
+        label_shift = float(np.max(np.abs(added_Y.mean(axis=0) - before), initial=0.0)) * weight
+    return {
+        'churn': round(churn, 6),
+        'unseen_categories': round(unseen_share, 6),
+        'label_shift': round(label_shift, 6),
+        'removed_rows': removed,
+        'added_rows': len(added_rows),
+    }
+
+
+# ================== WARM START ==================
+
+def add_trees(pipeline, X, Y, rows_total, base_trees, seed, n_jobs=-1):
+    """
+    Appends trees trained on (X, Y) to every output's forest, in proportion to
+    the new rows' share of all rows. Returns the number of trees added per
+    forest, or None if some output's classes would not line up.
+    """
+    classifier = pipeline.named_steps['classifier']
+    n_new = max(1, round(base_trees * len(Y) / max(rows_total, 1)))
+    grown = []
+    for k, forest in enumerate(classifier.estimators_):
+        params = dict(forest.get_params(), n_estimators=n_new, random_state=seed + k, n_jobs=n_jobs, warm_start=False)
+        new = RandomForestClassifier(**params).fit(X, Y[:, k])
+        if not np.array_equal(new.classes_, forest.classes_):
+            return None
+        grown.append(new)
+    for forest, new in zip(classifier.estimators_, grown):
+        for tree in new.estimators_:
+            tree.set_params(random_state=None)
+        forest.estimators_ = forest.estimators_ + new.estimators_
+        forest.n_estimators = len(forest.estimators_)
+        forest.n_jobs = None
+    return n_new
+
+
+def _missing_class_rows(pipeline, state, Y):
+    """
+    A few cached (X, Y) rows, one per class that some output's forest knows but
+    the new labels `Y` lack, or None if nothing is missing. A tree can only be
+    added to a forest when it was trained on the same classes, which a small
+    delta (a single changed claim, say) often is not.
+    """
+    classifier = pipeline.named_steps['classifier']
+    missing = [(k, label) for k, forest in enumerate(classifier.estimators_)
+               for label in forest.classes_ if not (Y[:, k] == label).any()]
+    if not missing:
+        return None
+    _, X_old, Y_old = state.data()
+    picks = []
+    for k, label in missing:
+        hits = np.flatnonzero(Y_old[:, k] == label)
+        if len(hits):
+            picks.append(hits[-1])
+    picks = sorted(set(picks))
+    return (X_old[picks], Y_old[picks]) if picks else None
+
+
+# ================== REFRESH ==================
+
+def _encode(pipeline, spec, rows):
+    return pipeline.named_steps['preprocessor'].transform(rows[spec.features])
+
+
+def _labels(spec, rows):
+    return derive_labels(spec, rows).to_numpy()
+
+
+def _full_retrain(spec, state, rows, n_jobs, reuse=None):
+    """Trains from scratch on `rows`, or refits only the forests on reused encodings; rewrites the state."""
+    if reuse is not None:
+        pipeline, X, Y = reuse
+        classifier = pipeline.named_steps['classifier']
+        classifier.set_params(estimator__n_jobs=n_jobs).fit(X, Y)
+        classifier.set_params(estimator__n_jobs=None)
+        for forest in classifier.estimators_:
+            forest.n_jobs = None
+    else:
+        pipeline = fit(spec, rows, n_jobs)
+        X, Y = _encode(pipeline, spec, rows), _labels(spec, rows)
+    state.reset()
+    state.write_segment(0, fingerprint_rows(spec, rows), rows, X, Y)
+    base_trees = len(pipeline.named_steps['classifier'].estimators_[0].estimators_)
+    return pipeline, {'segments': [0], 'rows': len(rows), 'label_totals': Y.sum(axis=0).tolist(),
+                      'base_trees': base_trees, 'trees': base_trees}
+
+
+def refresh_model(spec, data_path=None, artifact_path=None, drift_threshold=DEFAULT_DRIFT_THRESHOLD,
+                  n_jobs=-1, chunksize=DEFAULT_CHUNKSIZE, publish=False, state_root=None):
+    """Brings one model up to date with its source CSV. Returns a summary dict."""
+    data_path = data_path or spec.data_path
+    artifact_path = artifact_path or spec.artifact_path
+    state = TrainingState.load(state_dir(spec, state_root))
+    started = time.perf_counter()
+    summary = {'model': spec.name}
+
+    if not state.matches_artifact(artifact_path):
+        print(f"🧱 No usable training state for the {spec.label} model, training from scratch...")
+        rows = read_source(data_path, spec.source_columns, spec.numeric_features, chunksize)
+        pipeline, meta = _full_retrain(spec, state, rows, n_jobs)
+        summary.update(action='full', reason='no state', rows=len(rows))
+    else:
+        pipeline = joblib.load(artifact_path)
+        meta = dict(state.meta)
+        added, kept, mode, frame = find_delta(spec, state, data_path, chunksize)
+        summary['delta_mode'] = mode
+        if not len(added) and (kept is None or kept.all()):
+            print(f"✅ {spec.label} model is up to date ({meta['rows']} rows, nothing new)")
+            state.save(dict(meta, source=_source_meta(data_path)))
+            return dict(summary, action='none', seconds=round(time.perf_counter() - started, 3))
+
+        if len(added):
+            X_new, Y_new = _encode(pipeline, spec, added), _labels(spec, added)
+        else:
+            X_new, Y_new = None, np.zeros((0, len(spec.target_columns)), dtype=np.int64)
+        drift = measure_drift(meta, kept, added, Y_new, unseen_category_share(pipeline, spec, X_new))
+        summary['drift'] = drift
+        worst = max(drift['churn'], drift['unseen_categories'], drift['label_shift'])
+        rows_total = meta['rows'] - drift['removed_rows'] + len(added)
+        n_new = None
+        if (worst <= drift_threshold and not drift['removed_rows']
+                and meta['trees'] < MAX_TREE_GROWTH * meta['base_trees']):
+            X_fit, Y_fit = X_new, Y_new
+            borrowed = _missing_class_rows(pipeline, state, Y_new)
+            if borrowed is not None:
+                X_fit, Y_fit = _stack([X_new, borrowed[0]]), np.vstack([Y_new, borrowed[1]])
+            n_new = add_trees(pipeline, X_fit, Y_fit, rows_total, meta['base_trees'],
+                              seed=42 + 1000 * len(meta['segments']), n_jobs=n_jobs)
+
+        if n_new is not None:
+            if frame is not None:
+                # The file was parsed anyway: rewrite the state in its row order,
+                # so later deltas and retrains line up with the file
+                X_all, Y_all = _encode(pipeline, spec, frame), _labels(spec, frame)
+                state.reset()
+                state.write_segment(0, fingerprint_rows(spec, frame), frame, X_all, Y_all)
+                meta.update(segments=[0], label_totals=Y_all.sum(axis=0).tolist())
+            else:
+                k = max(meta['segments']) + 1
+                state.write_segment(k, fingerprint_rows(spec, added), added, X_new, Y_new)
+                meta.update(segments=meta['segments'] + [k],
+                            label_totals=(np.asarray(meta['label_totals']) + Y_new.sum(axis=0)).tolist())
+            meta.update(rows=rows_total, trees=meta['trees'] + n_new)
+            if drift['unseen_categories']:
+                # The encoder ignores these categories until the next full fit refits it
+                meta['unseen_since_fit'] = True
+            print(f"🌱 {spec.label} model: +{len(added)} rows, {n_new} tree(s) "
+                  f"added per output (drift {worst:.3f} <= {drift_threshold})")
+            summary.update(action='warm_start', trees_added=n_new, rows=rows_total)
+        else:
+            reuse = None
+            if frame is not None:
+                # Retrain on the file's own row order, as a regular training run would
+                rows = frame
+            else:
+                cached_rows, X_old, Y_old = state.data()
+                rows = _concat_frames([cached_rows, added])
+                if (drift['unseen_categories'] == 0 and not meta.get('unseen_since_fit')
+                        and not spec.numeric_features):
+                    # The encoder would be fitted to exactly the same categories: keep the encodings
+                    reuse = (pipeline, _stack([X_old, X_new]), np.vstack([Y_old, Y_new]))
+            if worst > drift_threshold:
+                reason = 'drift'
+            elif drift['removed_rows']:
+                reason = 'removed rows'
+            else:
+                reason = 'forest size or classes'
+            print(f"🔁 {spec.label} model: retraining on {len(rows)} rows ({reason}, drift {worst:.3f}"
+                  f"{', cached encodings' if reuse else ''})")
+            pipeline, meta = _full_retrain(spec, state, rows, n_jobs, reuse)
+            summary.update(action='full', reason=reason, reused_encodings=reuse is not None, rows=len(rows))
+
+    save_artifact(pipeline, artifact_path)
+    meta.update(state_version=STATE_VERSION, source=_source_meta(data_path),
+                artifact=_artifact_meta(artifact_path), updated_at=time.time())
+    state.save(meta)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    if publish:
+        summary['version'] = publish_artifact(spec, artifact_path, data_path, {
+            'rows': meta['rows'], 'incremental': summary['action'], 'train_seconds': summary['seconds'],
+        })
+    print(f"⏱️ {spec.label} refresh: {summary['action']} in {summary['seconds']:.2f}s")
+    return summary
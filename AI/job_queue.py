@@ -0,0 +1,521 @@
+"""
+Asynchronous scoring jobs for registers too large for one HTTP request.
+
+A job is a whole upload (CSV or NDJSON) or JSON list of records scored by one
+model in the background. Submitting spools the input to disk and returns a job
+id at once; the client then polls the job for progress and reads its results
+in pages. Jobs and results live in a local SQLite database (AI_JOB_DIR,
+default AI/jobs/), so every worker process can answer for every job and jobs
+survive restarts:
+
+  jobs     one row per job: model, options, status, progress, heartbeat, timings
+  results  one row per record, in input order: the NDJSON line /batch would send
+
+Execution: each process runs `workers` job threads, started on first use
+rather than at import, so gunicorn's preloading master never runs jobs. A
+thread claims the oldest queued job in a write transaction that also enforces
+`max_running` across all processes, scores the input `chunk_size` records at a
+time and commits each chunk's results together with the job's progress. While
+the job runs, a heartbeat thread refreshes its heartbeat every `stale_after`/3
+seconds, so a chunk that takes longer than `stale_after` to score is not taken
+for a dead worker. A running job whose heartbeat is older than `stale_after`
+(its worker was recycled or crashed) is claimed again and resumes after its
+last committed chunk.
+
+Backpressure: once `max_pending` jobs are queued or running, submissions are
+refused with JobQueueFull (429 with Retry-After). Before each chunk a job
+thread steps aside while interactive requests are in flight in its process,
+for at most `max_yield` seconds per chunk so jobs still finish under constant
+load; a single-record request therefore waits for at most one job chunk.
+
+Finished jobs and their results are deleted `ttl` seconds after they finish.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    input_format TEXT NOT NULL,
+    options TEXT,
+    total INTEGER,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    model_version TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while `max_pending` jobs are already waiting or running."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InFlight:
+    """Counts interactive requests in progress; job threads step aside while any are."""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self._count += 1
+
+    def exit(self):
+        with self._lock:
+            self._count -= 1
+
+    @property
+    def busy(self):
+        return self._count > 0
+
+
+# ================== STORE ==================
+
+class JobStore:
+    """The SQLite database holding jobs and their results; one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit; write transactions are opened explicitly with BEGIN IMMEDIATE
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def create(self, model, input_path, input_format, options, total, max_pending, job_id=None):
+        """Adds a queued job and returns its id. Raises JobQueueFull."""
+        job_id = job_id or uuid.uuid4().hex
+        with self._write() as db:
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= max_pending:
+                raise JobQueueFull(f"{pending} jobs are already queued or running", retry_after=None)
+            db.execute(
+                "INSERT INTO jobs (id, model, status, input_path, input_format, options, total, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, model, input_path, input_format, json.dumps(options), total, time.time()),
+            )
+        return job_id
+
+    def pending(self):
+        return self._db().execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def claim(self, owner, max_running, stale_after):
+        """
+        Marks the oldest runnable job (queued, or running with a stale
+        heartbeat) as running for `owner` and returns it, unless `max_running`
+        jobs are already running. Returns None when there is nothing to do.
+        """
+        now = time.time()
+        with self._write() as db:
+            running = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND heartbeat >= ?", (now - stale_after,),
+            ).fetchone()[0]
+            if running >= max_running:
+                return None
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?) "
+                "ORDER BY created_at LIMIT 1", (now - stale_after,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, started_at = COALESCE(started_at, ?) "
+                "WHERE id = ?", (owner, now, now, row['id']),
+            )
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+
+    def update(self, job_id, owner, **fields):
+        """Sets fields of a job this owner still holds (and its heartbeat); False if it lost the job."""
+        fields['heartbeat'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._write() as db:
+            cursor = db.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND owner = ? AND status = 'running'",
+                                (*fields.values(), job_id, owner))
+        return cursor.rowcount == 1
+
+    def record_chunk(self, job_id, owner, first_seq, lines, failed):
+        """
+        Stores one chunk's result lines and advances the job's progress in one
+        transaction. Returns 'cancel' if the job should stop, None if another
+        worker owns it now, else 'continue'.
+        """
+        with self._write() as db:
+            row = db.execute("SELECT processed, cancel_requested FROM jobs WHERE id = ? AND owner = ? "
+                             "AND status = 'running'", (job_id, owner)).fetchone()
+            if row is None or row['processed'] != first_seq:
+                return None
+            db.executemany("INSERT INTO results (job_id, seq, body) VALUES (?, ?, ?)",
+                           ((job_id, first_seq + i, line) for i, line in enumerate(lines)))
+            db.execute("UPDATE jobs SET processed = processed + ?, failed = failed + ?, heartbeat = ? WHERE id = ?",
+                       (len(lines), failed, time.time(), job_id))
+        return 'cancel' if row['cancel_requested'] else 'continue'
+
+    def finish(self, job_id, owner, status, error=None):
+        with self._write() as db:
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                       (status, error, time.time(), job_id, owner))
+
+    def get(self, job_id):
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def recent(self, limit=50):
+        rows = self._db().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def results(self, job_id, offset, limit):
+        """Up to `limit` stored result lines of a job, starting at record `offset`."""
+        rows = self._db().execute(
+            "SELECT body FROM results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?", (job_id, offset, limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def cancel(self, job_id):
+        """Cancels a queued job, asks a running one to stop; returns the job as it is now, or None."""
+        with self._write() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                       (time.time(), job_id))
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def delete(self, job_ids):
+        with self._write() as db:
+            for job_id in job_ids:
+                db.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def expired(self, ttl):
+        """(id, input path) of finished jobs that finished more than `ttl` seconds ago."""
+        rows = self._db().execute(
+            "SELECT id, input_path FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+            (time.time() - ttl,),
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+
+# ================== INPUT ==================
+
+def _record_id(record, index):
+    record_id = record.get('id', index)
+    # An empty id cell in a CSV reads as NaN, which JSON cannot carry
+    return index if isinstance(record_id, float) and math.isnan(record_id) else record_id
+
+
+def _pairs(records, start):
+    """(record_id, user_data) pairs like the /batch routes read them (see app.iter_batch_records)."""
+    for index, record in enumerate(records, start):
+        if not isinstance(record, dict):
+            yield index, record
+            continue
+        yield _record_id(record, index), record.get('userData', record)
+
+
+def count_records(path, input_format):
+    if input_format == 'csv':
+        import pandas as pd
+
+        return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], dtype=str, chunksize=100_000))
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def iter_chunks(path, input_format, chunk_size, skip=0):
+    """Yields lists of (record_id, user_data) pairs of the spooled input, after its first `skip` records."""
+    if input_format == 'csv':
+        import pandas as pd
+
+        # Cells stay text, as the form would send them; empty cells are NaN, i.e. missing
+        reader = pd.read_csv(path, dtype=str, chunksize=chunk_size, skiprows=range(1, skip + 1))
+        start = skip
+        for frame in reader:
+            yield list(_pairs(frame.to_dict('records'), start))
+            start += len(frame)
+        return
+    with open(path, 'rb') as f:
+        lines = (line for line in f if line.strip())
+        for _ in zip(range(skip), lines):
+            pass
+        chunk, start = [], skip
+        for number, line in enumerate(lines, skip + 1):
+            try:
+                chunk.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"record {number} is not valid JSON: {e}") from None
+            if len(chunk) >= chunk_size:
+                yield list(_pairs(chunk, start))
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield list(_pairs(chunk, start))
+
+
+# ================== QUEUE ==================
+
+class JobQueue:
+    """
+    Spools submitted jobs and runs them on a bounded pool of job threads.
+    `open_scorer(job)` returns (model version, score) where score(chunk)
+    returns one response body per (record_id, user_data) pair.
+    """
+
+    def __init__(self, directory, open_scorer, interactive=None, workers=1, max_running=1, max_pending=8,
+                 chunk_size=250, max_yield=0.1, stale_after=120, ttl=72 * 3600, poll_interval=1.0):
+        self.directory = directory
+        self.spool_dir = os.path.join(directory, 'spool')
+        self.store = JobStore(os.path.join(directory, 'jobs.sqlite3'))
+        self.open_scorer = open_scorer
+        self.interactive = interactive
+        self.workers = workers
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.max_yield = max_yield
+        self.stale_after = stale_after
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._purged_at = 0.0
+        self._chunk_seconds = None
+
+    # ---------- submitting ----------
+
+    def ensure_started(self):
+        """Starts this process's job threads (again after a fork)."""
+        with self._lock:
+            if self._pid == os.getpid() or self.workers <= 0:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, args=(f"{os.getpid()}-{i}",), name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def retry_after(self):
+        """Seconds a refused client should wait: roughly one job chunk per pending job, at least 1."""
+        chunk = self._chunk_seconds or 1.0
+        return max(1, math.ceil(chunk * self.max_pending))
+
+    def submit(self, model, options, write_input, input_format, total=None):
+        """
+        Queues a job whose input `write_input(path)` writes to the spool, and
+        returns its id. Raises JobQueueFull before anything is written when
+        the queue is already full.
+        """
+        self.ensure_started()
+        self.purge()
+        if self.store.pending() >= self.max_pending:
+            raise JobQueueFull(f"{self.max_pending} jobs are already queued or running", self.retry_after())
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{job_id}.{input_format}")
+        try:
+            write_input(path)
+            if total is None:
+                total = count_records(path, input_format)
+            self.store.create(model, path, input_format, options, total, self.max_pending, job_id)
+        except JobQueueFull as e:
+            _remove(path)
+            e.retry_after = self.retry_after()
+            raise
+        except Exception:
+            _remove(path)
+            raise
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        job = self.store.cancel(job_id)
+        if job is not None and job['status'] == 'cancelled':
+            _remove(job['input_path'])
+        return job
+
+    def purge(self):
+        """Deletes expired jobs, at most once a minute."""
+        now = time.monotonic()
+        if now - self._purged_at < 60:
+            return
+        self._purged_at = now
+        expired = self.store.expired(self.ttl)
+        for _, path in expired:
+            _remove(path)
+        if expired:
+            self.store.delete([job_id for job_id, _ in expired])
+
+    # ---------- running ----------
+
+    def _run(self, owner):
+        while True:
+            try:
+                job = self.store.claim(owner, self.max_running, self.stale_after)
+                if job is not None:
+                    self._process(job, owner)
+                    continue
+            except sqlite3.Error as e:
+                # A job left running is picked up again once its heartbeat is stale
+                print(f"⚠️ Job store unavailable: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _step_aside(self):
+        """Waits (boundedly) while interactive requests are in flight in this process."""
+        if self.interactive is None:
+            return
+        deadline = time.monotonic() + self.max_yield
+        while self.interactive.busy and time.monotonic() < deadline:
+            time.sleep(0.002)
+
+    @contextmanager
+    def _heartbeat(self, job_id, owner):
+        """Keeps a job's heartbeat fresh from a timer thread until the block exits or the job is lost."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.stale_after / 3):
+                try:
+                    if not self.store.update(job_id, owner):
+                        return
+                except sqlite3.Error as e:
+                    print(f"⚠️ Job {job_id} heartbeat failed: {e}")
+
+        thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _process(self, job, owner):
+        job_id = job['id']
+        resumed = job['processed']
+        print(f"🗂️ Job {job_id} ({job['model']}) {'resumed at record ' + str(resumed) if resumed else 'started'}")
+        started = time.perf_counter()
+        try:
+            with self._heartbeat(job_id, owner):
+                version, score = self.open_scorer(job)
+                if not self.store.update(job_id, owner, model_version=version):
+                    return
+                seq = resumed
+                for chunk in iter_chunks(job['input_path'], job['input_format'], self.chunk_size, skip=resumed):
+                    self._step_aside()
+                    chunk_started = time.perf_counter()
+                    bodies = score(chunk)
+                    self._chunk_seconds = time.perf_counter() - chunk_started
+                    outcome = self.store.record_chunk(
+                        job_id, owner, seq, [json.dumps(body) for body in bodies],
+                        sum(1 for body in bodies if not body['success']),
+                    )
+                    if outcome is None:
+                        print(f"⚠️ Job {job_id} was taken over by another worker")
+                        return
+                    seq += len(chunk)
+                    if outcome == 'cancel':
+                        self.store.finish(job_id, owner, 'cancelled')
+                        print(f"🛑 Job {job_id} cancelled after {seq} records")
+                        _remove(job['input_path'])
+                        return
+        except Exception as e:
+            self.store.finish(job_id, owner, 'failed', str(e))
+            print(f"❌ Job {job_id} failed: {e}")
+            return
+        self.store.finish(job_id, owner, 'done')
+        _remove(job['input_path'])
+        print(f"✅ Job {job_id} scored {seq - resumed} records in {time.perf_counter() - started:.2f}s")
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'running_here': self._pid == os.getpid(),
+            'max_running': self.max_running,
+            'max_pending': self.max_pending,
+            'chunk_size': self.chunk_size,
+            'jobs': self.store.counts(),
+        }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def job_summary(job):
+    """The public view of a job row, as the API returns it."""
+    total = job['total']
+    return {
+        'jobId': job['id'],
+        'model': job['model'],
+        'status': 'cancelling' if job['status'] == 'running' and job['cancel_requested'] else job['status'],
+        'processed': job['processed'],
+        'failed': job['failed'],
+        'total': total,
+        'progress': round(job['processed'] / total, 4) if total else (1.0 if job['status'] == 'done' else 0.0),
+        'modelVersion': job['model_version'],
+        'error': job['error'],
+        'createdAt': job['created_at'],
+        'startedAt': job['started_at'],
+        'finishedAt': job['finished_at'],
+    }
@@ -0,0 +1,193 @@
+"""
+Precomputed eligibility lookup tables for all-categorical pipelines.
+
+The community and community-resources models only see one-hot encoded
+categorical columns (handle_unknown='ignore'). For one column, the trees only
+look at the one-hot positions some split actually tests. So every value of
+that column falls into one of a few classes:
+
+  - one class per category whose one-hot position is used by a split
+  - one "other" class for everything else: categories no tree splits on,
+    values never seen in training, and (after imputation) missing values
+
+All values in one class produce exactly the same predictions. The set of
+distinct inputs the model can tell apart is therefore the product of the
+per-column class counts. tabulate_pipeline() evaluates the forest once for
+each of those combinations at load time. Each cell stores a small code into
+the distinct (labels, probabilities) rows the forest produced, so both the
+labels and the eligibility scores (see scoring.py) come from the table. A
+prediction then takes one dict probe per column and an array index, with no
+pandas or tree walk.
+
+When the product exceeds `max_cells`, or the pipeline has columns that are not
+one-hot encoded (like the individual model's numeric Age), TableTooLarge or
+TypeError is raised so the caller can keep using the real model.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from fast_inference import CompiledPipeline, _CategoricalSlot, _is_nan, compile_pipeline
+from scoring import model_classes, proba_list, scores_from_proba
+
+# Building evaluates the forest once per cell (~5 µs each), so this bounds load time
+DEFAULT_MAX_CELLS = 250_000
+# Cells evaluated per predict_proba() call while building the table
+BUILD_CHUNK = 8192
+# Codes are uint8 or uint16, so a table holds at most this many distinct rows
+MAX_PATTERNS = 65536
+
+
+class TableTooLarge(ValueError):
+    """Raised when the decision-relevant input space is bigger than allowed."""
+
+
+class _ColumnClasses:
+    """Maps a column's raw values to its decision-relevant class (0 = other)."""
+
+    def __init__(self, slot, used_positions):
+        self.column = slot.column
+        self.slot = slot
+        # Class k > 0 sets one-hot position positions[k - 1] of this column
+        self.positions = sorted(used_positions)
+        position_class = {position: k + 1 for k, position in enumerate(self.positions)}
+        self.value_class = {
+            category: position_class[position]
+            for category, position in slot.index.items() if position in position_class
+        }
+        self.nan_class = position_class.get(slot.nan_index, 0)
+        self.size = len(self.positions) + 1
+
+    def classify(self, value):
+        # Same imputation / NaN rules as the compiled slot (and sklearn)
+        slot = self.slot
+        if slot.impute and _is_nan(value):
+            value = slot.fill_value
+        if _is_nan(value):
+            if slot.nan_index is None and not slot.impute:
+                raise ValueError(f"Input contains NaN in column '{self.column}'")
+            return self.nan_class
+        return self.value_class.get(value, 0)
+
+
+class TabulatedPipeline:
+    """O(1) lookup equivalent of an all-categorical pipeline's predict()."""
+
+    def __init__(self, columns, column_classes, patterns, probabilities, codes, build_seconds):
+        self.columns = columns
+        self.column_classes = column_classes
+        self.strides = []
+        stride = 1
+        for classes in reversed(column_classes):
+            self.strides.append(stride)
+            stride *= classes.size
+        self.strides.reverse()
+        self.patterns = patterns
+        self.probabilities = probabilities
+        self.codes = codes
+        self.build_seconds = build_seconds
+
+    @property
+    def cells(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.patterns.nbytes + self.probabilities.nbytes
+
+    def cell(self, record):
+        return sum(
+            classes.classify(record[classes.column]) * stride
+            for classes, stride in zip(self.column_classes, self.strides)
+        )
+
+    def predict_one(self, record):
+        """Same values as Pipeline.predict on a one-row DataFrame (a read-only row)."""
+        return self.patterns[self.codes[self.cell(record)]]
+
+    def predict(self, records):
+        cells = np.fromiter((self.cell(record) for record in records), dtype=np.int64)
+        return self.patterns[self.codes[cells]]
+
+    def score_one(self, record):
+        """(labels, eligibility probabilities) for one record, as scoring.scores_from_proba gives."""
+        code = self.codes[self.cell(record)]
+        return self.patterns[code], self.probabilities[code]
+
+    def score(self, records):
+        cells = np.fromiter((self.cell(record) for record in records), dtype=np.int64)
+        codes = self.codes[cells]
+        return self.patterns[codes], self.probabilities[codes]
+
+    def info(self):
+        return {
+            'cells': self.cells,
+            'bytes': self.nbytes,
+            'classes_per_column': {c.column: c.size for c in self.column_classes},
+            'distinct_predictions': len(self.patterns),
+            'build_seconds': round(self.build_seconds, 4),
+        }
+
+
+def tabulate_pipeline(pipeline, max_cells=DEFAULT_MAX_CELLS):
+    """
+    Builds a TabulatedPipeline for a fitted all-categorical pipeline. Raises
+    TypeError for unsupported pipelines and TableTooLarge when the table would
+    need more than `max_cells` cells.
+    """
+    started = time.perf_counter()
+    # A model loaded from a compact artifact is already compiled
+    compiled = pipeline if isinstance(pipeline, CompiledPipeline) else compile_pipeline(pipeline)
+    if not all(isinstance(slot, _CategoricalSlot) for slot in compiled.slots):
+        raise TypeError("Only pipelines whose inputs are all one-hot encoded can be tabulated")
+    if sorted(slot.column for slot in compiled.slots) != sorted(compiled.columns):
+        raise TypeError("Every input column must be one-hot encoded")
+
+    used = set(np.unique(compiled.feature[compiled.feature >= 0]).tolist())
+    column_classes = [
+        _ColumnClasses(slot, [p for p in range(slot.width) if slot.offset + p in used])
+        for slot in compiled.slots
+    ]
+    cells = math.prod(classes.size for classes in column_classes)
+    if cells > max_cells:
+        raise TableTooLarge(f"{cells} decision-relevant combinations exceed the limit of {max_cells}")
+
+    # Evaluate the real forest on one representative encoded row per cell
+    if compiled is pipeline:
+        classifier, predict_proba = compiled, compiled.predict_proba_matrix
+    else:
+        classifier = pipeline.steps[-1][1]
+        predict_proba = classifier.predict_proba
+    shape = [classes.size for classes in column_classes]
+    output_classes = model_classes(classifier)
+    label_chunks, probability_chunks = [], []
+    for start in range(0, cells, BUILD_CHUNK):
+        flat = np.arange(start, min(start + BUILD_CHUNK, cells))
+        X = np.zeros((len(flat), compiled.n_encoded), dtype=np.float32)
+        for classes, class_index in zip(column_classes, np.unravel_index(flat, shape)):
+            rows = np.nonzero(class_index)[0]
+            positions = np.asarray(classes.positions, dtype=np.intp)
+            X[rows, classes.slot.offset + positions[class_index[rows] - 1]] = 1.0
+        labels, probabilities = scores_from_proba(output_classes, proba_list(predict_proba(X)))
+        label_chunks.append(labels)
+        probability_chunks.append(probabilities)
+    labels = np.concatenate(label_chunks)
+    probabilities = np.concatenate(probability_chunks)
+
+    # Distinct (labels, probabilities) rows; labels alone would only need a few
+    n_outputs = labels.shape[1]
+    rows, codes = np.unique(np.hstack([labels.astype(np.float64), probabilities]), axis=0, return_inverse=True)
+    if len(rows) > MAX_PATTERNS:
+        raise TableTooLarge(f"{len(rows)} distinct prediction rows do not fit a two-byte code")
+    codes = codes.reshape(-1).astype(np.uint8 if len(rows) <= 256 else np.uint16)
+    patterns = rows[:, :n_outputs].astype(labels.dtype)
+    probabilities = np.ascontiguousarray(rows[:, n_outputs:])
+    for array in (patterns, probabilities, codes):
+        array.flags.writeable = False
+    # Column order follows the compiled slots, which is the model's input order
+    columns = [classes.column for classes in column_classes]
+    return TabulatedPipeline(
+        columns, column_classes, patterns, probabilities, codes, time.perf_counter() - started
+    )
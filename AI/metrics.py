@@ -0,0 +1,170 @@
+"""
+Request timing spans and Prometheus-style metrics for the prediction service.
+
+Every request gets a RequestTimer. Code on the hot path wraps its stages in
+`timer.span(stage)`, e.g. 'parse', 'features', 'transform', 'predict' and
+'serialize'. A span that runs more than once in one request (one per batch
+chunk, say) adds up. When the request ends, record_request() folds the timer
+into per-route, per-model histograms. Metrics.render() writes all series in the
+Prometheus text exposition format, which app.py serves from /metrics.
+
+Only the standard library is used, so there is no client library to install.
+Metrics live in process memory: under gunicorn each worker reports its own
+series, so give every worker a scrape target (or run one worker per container)
+rather than reading aggregate numbers from whichever worker answers.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; low enough to resolve the ~0.1 ms compiled fast path
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+REQUEST_DURATION = 'ai_request_duration_seconds'
+STAGE_DURATION = 'ai_request_stage_seconds'
+REQUESTS_TOTAL = 'ai_requests_total'
+ERRORS_TOTAL = 'ai_request_errors_total'
+BATCH_RECORDS_TOTAL = 'ai_batch_records_total'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # bisect_left puts a value equal to a bound into that bound's bucket (le semantics)
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """A small thread-safe registry of labelled counters, histograms and gauges."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._descriptions = {}
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self.describe(REQUEST_DURATION, 'histogram', "Wall time of each request, by route, model and HTTP status.")
+        self.describe(STAGE_DURATION, 'histogram', "Time spent in each hot-path stage of a request.")
+        self.describe(REQUESTS_TOTAL, 'counter', "Requests handled, by route, model, HTTP status and outcome.")
+        self.describe(ERRORS_TOTAL, 'counter', "Requests that failed, by route, model and exception type.")
+        self.describe(BATCH_RECORDS_TOTAL, 'counter', "Records scored by the batch routes, by model and outcome.")
+
+    def describe(self, name, kind, help_text):
+        self._descriptions[name] = (kind, help_text)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collect):
+        """
+        Registers a callable run at render time that yields (name, labels, value)
+        samples, for gauges read from live state (model versions, cache sizes...).
+        The names must have been described.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """All series in the Prometheus text exposition format (version 0.0.4)."""
+        samples = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                lines = samples.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), histogram.counts):
+                    cumulative += count
+                    bucket_labels = labels + (('le', _format_value(float(bound))),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for (name, labels), value in self._counters.items():
+                samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                labels = tuple(sorted(labels.items()))
+                samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        out = []
+        for name in sorted(samples):
+            kind, help_text = self._descriptions.get(name, ('untyped', ''))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(sorted(samples[name]))
+        return "\n".join(out) + "\n"
+
+
+class RequestTimer:
+    """Collects the stage timings of one request."""
+
+    def __init__(self, route):
+        self.route = route
+        self.model = ''
+        self.status = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.spans = {}
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[stage] = self.spans.get(stage, 0.0) + time.perf_counter() - started
+
+    def fail(self, error):
+        self.error = type(error).__name__
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def record_request(metrics, timer, duration):
+    """Folds a finished request's timer into the request metrics."""
+    status = str(timer.status or 500)
+    metrics.observe(REQUEST_DURATION, duration, route=timer.route, model=timer.model, status=status)
+    for stage, seconds in timer.spans.items():
+        metrics.observe(STAGE_DURATION, seconds, route=timer.route, model=timer.model, stage=stage)
+    outcome = 'error' if timer.error else 'success'
+    metrics.inc(REQUESTS_TOTAL, route=timer.route, model=timer.model, status=status, outcome=outcome)
+    if timer.error:
+        metrics.inc(ERRORS_TOTAL, route=timer.route, model=timer.model, error=timer.error)
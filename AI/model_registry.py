@@ -0,0 +1,214 @@
+"""
+Versioned model registry.
+
+Layout (under AI_MODEL_REGISTRY, default <AI_MODEL_DIR>/registry):
+
+    <model name>/
+        current.json                 {"version": "<version>"}
+        versions/<version>/
+            model.pkl                the joblib artifact
+            manifest.json            checksum, training-data hash, features, schemes
+
+Publishing copies an artifact into a fresh version directory and only then
+flips current.json with an atomic rename, so a server polling or reloading the
+registry never sees a half-written version. Rolling back is just pointing
+current.json at an older version. current.json can also hold the pin
+{"version": "unversioned"}, which points the model back at its legacy .pkl
+under AI_MODEL_DIR (e.g. after rolling back past the first published version)
+without forgetting the published versions.
+
+Usage:
+    python model_registry.py publish individual Individual/schemes_model.pkl --data Individual/fra_holders.csv
+    python model_registry.py list individual
+    python model_registry.py activate individual <version>
+    python model_registry.py activate individual unversioned   # back to the legacy .pkl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+MODEL_DIR = os.environ.get("AI_MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+REGISTRY_DIR = os.environ.get("AI_MODEL_REGISTRY", os.path.join(MODEL_DIR, "registry"))
+ARTIFACT_NAME = "model.pkl"
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "current.json"
+# The version name of a legacy .pkl outside the registry; current.json may pin it
+UNVERSIONED = "unversioned"
+
+
+class RegistryError(Exception):
+    """Raised for missing versions, corrupt artifacts or checksum mismatches."""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def model_dir(name, registry_dir=None):
+    return os.path.join(registry_dir or REGISTRY_DIR, name)
+
+
+def version_dir(name, version, registry_dir=None):
+    return os.path.join(model_dir(name, registry_dir), "versions", version)
+
+
+def list_versions(name, registry_dir=None):
+    """All published versions of a model, oldest first."""
+    versions_root = os.path.join(model_dir(name, registry_dir), "versions")
+    if not os.path.isdir(versions_root):
+        return []
+    return sorted(
+        v for v in os.listdir(versions_root)
+        if os.path.isfile(os.path.join(versions_root, v, MANIFEST_NAME))
+    )
+
+
+def read_manifest(name, version, registry_dir=None):
+    path = os.path.join(version_dir(name, version, registry_dir), MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise RegistryError(f"{name} has no version '{version}'")
+
+
+def current_version(name, registry_dir=None):
+    """
+    The version current.json points at (UNVERSIONED when it pins the legacy
+    .pkl), or None if the model is not in the registry.
+    """
+    try:
+        with open(os.path.join(model_dir(name, registry_dir), CURRENT_NAME)) as f:
+            return json.load(f)["version"]
+    except FileNotFoundError:
+        return None
+
+
+def set_current(name, version, registry_dir=None):
+    if version != UNVERSIONED:
+        read_manifest(name, version, registry_dir)  # must exist
+    _write_json_atomic(os.path.join(model_dir(name, registry_dir), CURRENT_NAME), {'version': version})
+
+
+def artifact_path(name, version, registry_dir=None):
+    return os.path.join(version_dir(name, version, registry_dir), ARTIFACT_NAME)
+
+
+def verify(name, version, registry_dir=None):
+    """Checks the artifact against its manifest checksum and returns the manifest."""
+    manifest = read_manifest(name, version, registry_dir)
+    actual = file_sha256(artifact_path(name, version, registry_dir))
+    if actual != manifest['sha256']:
+        raise RegistryError(f"{name} {version}: checksum mismatch ({actual} != {manifest['sha256']})")
+    return manifest
+
+
+def publish(name, artifact, features, scheme_mapping=None, training_data=None,
+            version=None, activate=True, registry_dir=None, extra=None):
+    """
+    Copies `artifact` into the registry as a new version and writes its manifest.
+    With activate=True the new version also becomes current. Returns the manifest.
+    """
+    checksum = file_sha256(artifact)
+    version = version or f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{checksum[:8]}"
+    target = version_dir(name, version, registry_dir)
+    if os.path.exists(target):
+        raise RegistryError(f"{name} already has a version '{version}'")
+
+    manifest = {
+        'name': name,
+        'version': version,
+        'created_at': time.time(),
+        'artifact': ARTIFACT_NAME,
+        'sha256': checksum,
+        'size_bytes': os.path.getsize(artifact),
+        'training_data_sha256': file_sha256(training_data) if training_data else None,
+        'features': list(features),
+        'scheme_mapping': {str(k): v for k, v in (scheme_mapping or {}).items()},
+    }
+    manifest.update(extra or {})
+
+    versions_root = os.path.dirname(target)
+    os.makedirs(versions_root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=versions_root, prefix=".staging-")
+    try:
+        shutil.copy2(artifact, os.path.join(staging, ARTIFACT_NAME))
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        set_current(name, version, registry_dir)
+    return manifest
+
+
+# ================== CLI ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned model artifacts.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('publish', help="publish a .pkl artifact as a new version")
+    p.add_argument('name')
+    p.add_argument('artifact')
+    p.add_argument('--data', help="training CSV, hashed into the manifest")
+    p.add_argument('--version')
+    p.add_argument('--schemes', help="JSON file with the scheme mapping")
+    p.add_argument('--no-activate', action='store_true')
+
+    p = sub.add_parser('list', help="list versions of a model")
+    p.add_argument('name')
+
+    p = sub.add_parser('activate', help="point a model at an existing version (rollback)")
+    p.add_argument('name')
+    p.add_argument('version')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        import joblib
+
+        pipeline = joblib.load(args.artifact)
+        scheme_mapping = None
+        if args.schemes:
+            with open(args.schemes) as f:
+                scheme_mapping = json.load(f)
+        manifest = publish(
+            args.name, args.artifact, pipeline.feature_names_in_, scheme_mapping,
+            training_data=args.data, version=args.version, activate=not args.no_activate,
+        )
+        print(f"✅ Published {args.name} {manifest['version']}")
+    elif args.command == 'list':
+        current = current_version(args.name)
+        for version in list_versions(args.name):
+            manifest = read_manifest(args.name, version)
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}  {manifest['size_bytes']:>10} bytes  sha256={manifest['sha256'][:12]}")
+    elif args.command == 'activate':
+        set_current(args.name, args.version)
+        target = "its legacy .pkl" if args.version == UNVERSIONED else args.version
+        print(f"✅ {args.name} now points at {target}")
+
+
+if __name__ == '__main__':
+    main()
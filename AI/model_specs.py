@@ -0,0 +1,197 @@
+"""
+Per-model specifications shared by training (training.py) and serving (app.py).
+
+A ModelSpec holds everything that used to be copy-pasted across the three
+training scripts: where the data and artifact live, the feature list and its
+categorical/numeric split, how the eligibility labels are derived, the scheme
+mapping shown to users, and how the report names each row.
+
+This module deliberately imports nothing heavy, so app.py can use it without
+pulling pandas or sklearn in at startup.
+"""
+
+import os
+
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ModelSpec:
+    """Everything needed to train, publish and serve one scheme model."""
+
+    def __init__(self, name, label, data_file, artifact_file, features, categorical_features,
+                 numeric_features, labels, scheme_mapping, impute_categorical, remainder,
+                 report_heading, report_columns, report_subject):
+        self.name = name
+        self.label = label
+        self.data_file = data_file
+        self.artifact_file = artifact_file
+        self.features = features
+        self.categorical_features = categorical_features
+        self.numeric_features = numeric_features
+        # Ordered (target column, rule) pairs; a rule maps the frame to a 0/1 Series
+        self.labels = labels
+        self.scheme_mapping = scheme_mapping
+        self.impute_categorical = impute_categorical
+        self.remainder = remainder
+        self.report_heading = report_heading
+        self.report_columns = report_columns
+        self.report_subject = report_subject
+
+    @property
+    def data_path(self):
+        return os.path.join(AI_DIR, self.data_file)
+
+    @property
+    def artifact_path(self):
+        return os.path.join(AI_DIR, self.artifact_file)
+
+    @property
+    def target_columns(self):
+        return [target for target, _ in self.labels]
+
+    @property
+    def source_columns(self):
+        """Columns training needs from the source CSV: features plus report columns."""
+        return self.features + [c for c in self.report_columns if c not in self.features]
+
+
+# ================== LABEL RULES ==================
+# Rules are vectorized but reproduce the original row-wise lambdas exactly,
+# including how pandas' default NA parsing turns 'N/A' cells into NaN.
+
+def _map_values(series, predicate):
+    """
+    Applies a Python predicate to each distinct value rather than each row.
+    For categorical columns this is one call per category plus a code lookup.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        per_category = np.array([predicate(v) for v in series.cat.categories], dtype=bool)
+        codes = series.cat.codes.to_numpy()
+        result = np.where(codes >= 0, per_category[np.maximum(codes, 0)], predicate(np.nan))
+        return pd.Series(result.astype(int), index=series.index)
+    return series.map(lambda v: 1 if predicate(v) else 0).astype(int)
+
+
+def equals(column, value):
+    return lambda df: (df[column] == value).astype(int)
+
+
+def differs(column, value):
+    return lambda df: (df[column] != value).astype(int)
+
+
+def mentions(column, *words):
+    return lambda df: _map_values(df[column], lambda v: any(w in str(v).lower() for w in words))
+
+
+def recorded(column):
+    return lambda df: _map_values(df[column], lambda v: str(v) != 'N/A' and str(v) != 'nan')
+
+
+# ================== SPECS ==================
+
+INDIVIDUAL = ModelSpec(
+    name="individual",
+    label="Individual",
+    data_file="Individual/fra_holders.csv",
+    artifact_file="Individual/schemes_model.pkl",
+    features=[
+        "State", "Scheduled Tribe", "Other Traditional Forest Dweller", "Age",
+        "For Habitation", "For Self-Cultivation", "DisputedLands", "Pattas",
+        "Land from Where Displaced Without Compensation", "Extent of Land in Forest Villages"
+    ],
+    categorical_features=[
+        "State", "Scheduled Tribe", "Other Traditional Forest Dweller",
+        "For Habitation", "For Self-Cultivation", "DisputedLands", "Pattas",
+        "Land from Where Displaced Without Compensation"
+    ],
+    numeric_features=["Age", "Extent of Land in Forest Villages"],
+    labels=[
+        ('eligible_scholarship', equals('Scheduled Tribe', 'Yes')),
+        ('eligible_rehab', differs('Land from Where Displaced Without Compensation', 'N/A')),
+        ('eligible_pmkisan', equals('For Self-Cultivation', 'Yes')),
+        ('eligible_awas', equals('For Habitation', 'Yes')),
+    ],
+    scheme_mapping={
+        0: {"name": "ST/OTFD Scholarship", "desc": "Educational scholarships for students from Scheduled Tribe/Other Traditional Forest Dweller communities."},
+        1: {"name": "Rehabilitation & Resettlement Package", "desc": "Compensation and support for persons displaced without prior compensation."},
+        2: {"name": "PM-KISAN Scheme", "desc": "Financial assistance for land-holding farmers."},
+        3: {"name": "PM Awas Yojana (Housing Scheme)", "desc": "Housing assistance for eligible rural families."},
+    },
+    impute_categorical=True,
+    remainder='drop',
+    report_heading="AI Decision Support System for Government Schemes",
+    report_columns=["Name of the Claimant"],
+    report_subject=lambda row: f"claimant: **{row['Name of the Claimant']}**",
+)
+
+COMMUNITY = ModelSpec(
+    name="community",
+    label="Community",
+    data_file="community/community_data.csv",
+    artifact_file="community/community_model.pkl",
+    features=[
+        "State", "FDST community", "OTFD community", "Community rights such as nistar",
+        "Rights over minor forest produce", "Uses", "Grazing",
+        "Traditional resource access for nomadic and pastoralist",
+        "Community tenures of habitat and habitation",
+        "Right to access biodiversity", "Other traditional rights"
+    ],
+    categorical_features=[
+        "State", "FDST community", "OTFD community", "Community rights such as nistar",
+        "Rights over minor forest produce", "Uses", "Grazing",
+        "Traditional resource access for nomadic and pastoralist",
+        "Community tenures of habitat and habitation",
+        "Right to access biodiversity", "Other traditional rights"
+    ],
+    numeric_features=[],
+    labels=[
+        ('eligible_cfr', equals('Community tenures of habitat and habitation', 'Yes')),
+        ('eligible_mfp', differs('Rights over minor forest produce', 'N/A')),
+        ('eligible_grazing_rights', equals('Grazing', 'Yes')),
+    ],
+    scheme_mapping={
+        0: {"name": "Community Forest Rights (CFR) Recognition", "desc": "Formal recognition of rights over common forest lands, as per the Forest Rights Act."},
+        1: {"name": "Minor Forest Produce (MFP) Support Scheme", "desc": "Financial and technical support for sustainable harvesting and marketing of forest produce."},
+        2: {"name": "Customary Grazing Rights Recognition", "desc": "Recognition of traditional grazing rights in forest areas."},
+    },
+    impute_categorical=True,
+    remainder='passthrough',
+    report_heading="AI Decision Support System for Community-Based Schemes",
+    report_columns=["FDST community", "OTFD community"],
+    report_subject=lambda row: f"community: **{row['FDST community']} / {row['OTFD community']}**",
+)
+
+COMMUNITY_RESOURCES = ModelSpec(
+    name="community_resources",
+    label="Community resources",
+    data_file="community resource/community_src.csv",
+    artifact_file="community resource/community_resources_model.pkl",
+    features=[
+        "Village", "Gram Panchayat", "Taluka", "District",
+        "Compartment No", "Bordering Villages", "List of Evidence in Support"
+    ],
+    categorical_features=[
+        "Village", "Gram Panchayat", "Taluka", "District",
+        "Compartment No", "Bordering Villages", "List of Evidence in Support"
+    ],
+    numeric_features=[],
+    labels=[
+        ('eligible_infrastructure_grant', mentions('List of Evidence in Support', 'resolution', 'petition')),
+        ('eligible_conservation_fund', recorded('Compartment No')),
+    ],
+    scheme_mapping={
+        0: {"name": "Community Infrastructure Grant", "desc": "Grant for developing community infrastructure, based on community resolutions and evidence."},
+        1: {"name": "Resource Conservation Fund", "desc": "Funding for projects to conserve and protect specific forest compartments."},
+    },
+    impute_categorical=False,
+    remainder='passthrough',
+    report_heading="AI Decision Support System for Community Resources",
+    report_columns=["Village"],
+    report_subject=lambda row: f"village: **{row['Village']}**",
+)
+
+SPECS = {spec.name: spec for spec in (INDIVIDUAL, COMMUNITY, COMMUNITY_RESOURCES)}
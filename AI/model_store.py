@@ -0,0 +1,389 @@
+"""
+Model loading and hot reload for the prediction service.
+
+Each model served by app.py is described by a ServedModel. When the model has
+been published to the versioned registry (see model_registry.py) the version
+that registry's current.json points at is served; otherwise the legacy .pkl
+next to the training script is used, resolved against AI_MODEL_DIR (default:
+the directory containing this file) instead of a hard-coded drive path.
+
+Loading happens on first use, in a background warm-up thread, or eagerly at
+import, depending on AI_MODEL_LOADING:
+
+  lazy        load each model the first time a request needs it (default)
+  background  start serving immediately and load all models in a thread
+  eager       load everything at import (used by the gunicorn preload config)
+
+A loaded version is an immutable ModelVersion. Reloading builds the new one
+completely off the request path and then swaps it in with a single attribute
+assignment, so in-flight requests keep the version they started with and
+nothing ever waits on a reload. The previous version stays in memory so it can
+be rolled back to instantly.
+
+Optionally each version is also compiled for the pandas-free fast path
+(fast_inference.py) and/or tabulated into an O(1) lookup table
+(lookup_table.py); a model that cannot be compiled or tabulated is served by
+its sklearn pipeline as usual.
+
+With compact=True (AI_MODEL_FORMAT=compact) a version is loaded from the
+memory-mapped .compact twin of its .pkl (compact_model.py) when one was
+exported from exactly that .pkl; the loaded model then doubles as the compiled
+fast path. A missing or stale .compact file falls back to the .pkl.
+
+Every version also carries the request schema compiled from its own
+preprocessor (request_schema.py), which the routes validate payloads against,
+and with vocabulary_encoding=True the vocabulary (encoding_store.py) that lets
+the sklearn forests be fed without running the ColumnTransformer.
+
+joblib, sklearn and the fast-path compiler are only imported when a model is
+actually loaded, which keeps importing app.py cheap on cold start.
+"""
+
+import os
+import threading
+import time
+
+import model_registry
+
+MODEL_DIR = model_registry.MODEL_DIR
+MODEL_LOADING = os.environ.get("AI_MODEL_LOADING", "lazy")
+# After a failed load, requests report the failure for this long before retrying
+LOAD_RETRY_SECONDS = float(os.environ.get("AI_MODEL_LOAD_RETRY_SECONDS", 30))
+# With a positive value, a thread checks the registry this often and hot-swaps
+# any model whose current.json moved to another version
+REGISTRY_POLL_SECONDS = float(os.environ.get("AI_REGISTRY_POLL_SECONDS", 0))
+
+UNVERSIONED = model_registry.UNVERSIONED
+
+
+class ModelNotLoaded(Exception):
+    """Raised when a model is requested but its artifact could not be loaded."""
+
+
+class ModelVersion:
+    """A fully loaded model version together with the schema it was trained on."""
+
+    def __init__(self, model, compiled, version, path, manifest, features, scheme_mapping, load_seconds, table=None,
+                 schema=None, vocabulary=None):
+        self.model = model
+        self.compiled = compiled
+        self.table = table
+        # Encodes requests for the sklearn forests without the ColumnTransformer (encoding_store.py)
+        self.vocabulary = vocabulary
+        # Validates and normalizes request records for this version (request_schema.py)
+        self.schema = schema
+        self.version = version
+        self.path = path
+        self.manifest = manifest
+        self.features = features
+        self.scheme_mapping = scheme_mapping
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+
+class ServedModel:
+    """One model served by the API: its artifact, default schema, and load state."""
+
+    def __init__(self, name, label, path, features, scheme_mapping, mmap_mode=None, fast_inference=False,
+                 tabulate=False, table_max_cells=None, compact=False, vocabulary_encoding=False):
+        self.name = name
+        self.label = label
+        self.path = os.path.join(MODEL_DIR, path)
+        self.features = features
+        self.scheme_mapping = scheme_mapping
+        self.mmap_mode = mmap_mode
+        self.fast_inference = fast_inference
+        self.tabulate = tabulate
+        self.table_max_cells = table_max_cells
+        self.compact = compact
+        self.vocabulary_encoding = vocabulary_encoding
+        self.active = None
+        self.previous = None
+        self.cache = None
+        self.batcher = None
+        self.state = 'not_loaded'
+        self.error = None
+        self.reloading = False
+        self.swap_seconds = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.active is not None
+
+    # ---------- loading ----------
+
+    def _load_version(self, version=None):
+        """Loads (but does not activate) a version; the registry's current one by default."""
+        import joblib
+        from request_schema import compile_schema
+
+        if version is None:
+            version = model_registry.current_version(self.name)
+        started = time.perf_counter()
+        if version is None or version == UNVERSIONED:
+            version, path, manifest = UNVERSIONED, self.path, None
+        else:
+            manifest = model_registry.read_manifest(self.name, version)
+            path = model_registry.artifact_path(self.name, version)
+
+        loaded = self._load_compact(path, manifest) if self.compact else None
+        if loaded is not None:
+            model, path = loaded
+            compiled = model
+        else:
+            if manifest is not None:
+                model_registry.verify(self.name, version)
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            compiled = self._compile(model)
+        table = self._tabulate(model)
+        features = (manifest or {}).get('features') or self.features
+        scheme_mapping = self.scheme_mapping
+        if manifest and manifest.get('scheme_mapping'):
+            scheme_mapping = {int(k): v for k, v in manifest['scheme_mapping'].items()}
+        return ModelVersion(
+            model, compiled, version, path, manifest, features, scheme_mapping,
+            load_seconds=time.perf_counter() - started, table=table, schema=compile_schema(model, features),
+            vocabulary=self._vocabulary(model),
+        )
+
+    def _load_compact(self, path, manifest):
+        """(model, path) of the compact twin of `path` if it was exported from that exact .pkl, else None."""
+        import compact_model
+
+        compact_file = compact_model.compact_path(path)
+        if not os.path.exists(compact_file):
+            print(f"⚠️ {self.label} model has no {compact_model.SUFFIX} artifact, loading '{path}'")
+            return None
+        try:
+            model = compact_model.load(compact_file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ {self.label} compact artifact unusable, loading '{path}': {e}")
+            return None
+        source = model.source or {}
+        # Registry versions are matched by checksum, legacy files by size and mtime
+        current = (source.get('sha256') == manifest['sha256']) if manifest is not None \
+            else compact_model.is_current(model, path)
+        if not current:
+            print(f"⚠️ {self.label} compact artifact is stale, loading '{path}'")
+            return None
+        print(f"⚡ {self.label} model loaded from compact artifact '{compact_file}'")
+        return model, compact_file
+
+    def _compile(self, model):
+        if not self.fast_inference:
+            return None
+        from fast_inference import compile_pipeline
+
+        try:
+            compiled = compile_pipeline(model)
+            print(f"⚡ {self.label} model compiled for fast-path inference")
+            return compiled
+        except Exception as e:
+            print(f"⚠️ {self.label} model cannot be compiled, using the sklearn pipeline: {e}")
+            return None
+
+    def _vocabulary(self, model):
+        if not self.vocabulary_encoding or not hasattr(model, 'steps'):
+            # Compact models are already encoded without sklearn
+            return None
+        from encoding_store import Vocabulary
+
+        try:
+            return Vocabulary.from_pipeline(model)
+        except TypeError as e:
+            print(f"⚠️ {self.label} model has no vocabulary, encoding with the ColumnTransformer: {e}")
+            return None
+
+    def _tabulate(self, model):
+        if not self.tabulate:
+            return None
+        from lookup_table import DEFAULT_MAX_CELLS, TableTooLarge, tabulate_pipeline
+
+        try:
+            table = tabulate_pipeline(model, self.table_max_cells or DEFAULT_MAX_CELLS)
+        except (TypeError, TableTooLarge) as e:
+            print(f"⚠️ {self.label} model cannot be tabulated, using the regular model: {e}")
+            return None
+        print(f"📋 {self.label} model tabulated: {table.cells} cells, {table.nbytes} bytes "
+              f"in {table.build_seconds:.2f}s")
+        return table
+
+    def _activate(self, loaded):
+        started = time.perf_counter()
+        self.previous, self.active = self.active, loaded
+        self.swap_seconds = time.perf_counter() - started
+
+    def load(self):
+        """Loads the model if it is not loaded yet; returns the active version, or None on failure."""
+        with self._lock:
+            if self.active is not None:
+                return self.active
+            self.state = 'loading'
+            try:
+                loaded = self._load_version()
+            except Exception as e:
+                print(f"❌ Error loading {self.label} model: {e}")
+                self.state = 'failed'
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                return None
+            self._activate(loaded)
+            self.state = 'loaded'
+            self.error = None
+            print(f"✅ {self.label} model {loaded.version} loaded from '{loaded.path}' in {loaded.load_seconds:.2f}s")
+            return loaded
+
+    def get(self):
+        """Returns the active ModelVersion, loading it first if needed. Raises ModelNotLoaded."""
+        active = self.active
+        if active is not None:
+            return active
+        if self.state == 'failed' and time.monotonic() - self._failed_at < LOAD_RETRY_SECONDS:
+            raise ModelNotLoaded(f"{self.label} model not loaded")
+        active = self.load()
+        if active is None:
+            raise ModelNotLoaded(f"{self.label} model not loaded")
+        return active
+
+    def get_version(self, version):
+        """
+        Returns the ModelVersion `version` without activating it: the active or
+        previous one when it matches, else loaded from the registry. Raises
+        ModelNotLoaded if that version can no longer be loaded.
+        """
+        for candidate in (self.active, self.previous):
+            if candidate is not None and candidate.version == version:
+                return candidate
+        try:
+            return self._load_version(version)
+        except Exception as e:
+            raise ModelNotLoaded(f"{self.label} model {version} is no longer available: {e}") from None
+
+    # ---------- hot reload ----------
+
+    def reload(self, version=None, pin=False):
+        """
+        Loads `version` (default: the registry's current version) and swaps it in.
+        Requests keep being served by the old version until the swap. Returns the
+        new ModelVersion; on failure the old version stays active and the error is raised.
+        With pin=True an explicit version also becomes the registry's current
+        one, so other processes follow it and the registry watcher does not
+        swap it straight back.
+        """
+        with self._lock:
+            self.reloading = True
+            try:
+                loaded = self._load_version(version)
+            except Exception as e:
+                self.error = str(e)
+                print(f"❌ Reload of {self.label} model failed, keeping {self.version}: {e}")
+                raise
+            finally:
+                self.reloading = False
+            self._activate(loaded)
+            self.state = 'loaded'
+            self.error = None
+            if pin and version is not None:
+                model_registry.set_current(self.name, loaded.version)
+            print(f"🔄 {self.label} model now serving {loaded.version} (loaded in {loaded.load_seconds:.2f}s)")
+            return loaded
+
+    def reload_async(self, version=None, pin=False):
+        """Starts reload() in a background thread; returns False if a reload is already running."""
+        if self.reloading:
+            return False
+
+        def run():
+            try:
+                self.reload(version, pin)
+            except Exception:
+                pass  # already logged and recorded in self.error
+
+        self.reloading = True
+        threading.Thread(target=run, name=f"reload-{self.name}", daemon=True).start()
+        return True
+
+    def rollback(self):
+        """
+        Swaps the previously active version back in and points the registry at
+        it; rolling back to the legacy .pkl pins current.json to UNVERSIONED,
+        so restarts and the registry watcher keep serving it.
+        """
+        with self._lock:
+            if self.previous is None:
+                raise ModelNotLoaded(f"{self.label} model has no previous version to roll back to")
+            self._activate(self.previous)
+            if self.active.version != UNVERSIONED or model_registry.current_version(self.name) is not None:
+                model_registry.set_current(self.name, self.active.version)
+            print(f"↩️ {self.label} model rolled back to {self.active.version}")
+            return self.active
+
+    @property
+    def version(self):
+        active = self.active
+        return active.version if active is not None else None
+
+    def status(self):
+        active = self.active
+        previous = self.previous
+        return {
+            'state': self.state,
+            'version': active.version if active else None,
+            'previous_version': previous.version if previous else None,
+            'available_versions': model_registry.list_versions(self.name),
+            'path': active.path if active else self.path,
+            'load_seconds': active.load_seconds if active else None,
+            'loaded_at': active.loaded_at if active else None,
+            'swap_seconds': self.swap_seconds,
+            'reloading': self.reloading,
+            'error': self.error,
+            'fast_inference': active is not None and active.compiled is not None,
+            'lookup_table': active.table.info() if active is not None and active.table is not None else None,
+        }
+
+
+def start_loading(models, mode=MODEL_LOADING):
+    """Kicks off loading for `models` according to the AI_MODEL_LOADING mode."""
+    if mode == 'eager':
+        for served in models:
+            served.load()
+    elif mode == 'background':
+        def warm_up():
+            for served in models:
+                served.load()
+        threading.Thread(target=warm_up, name="model-warm-up", daemon=True).start()
+    elif mode != 'lazy':
+        raise ValueError(f"Unknown AI_MODEL_LOADING mode: {mode!r}")
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def watch_registry(models, interval=REGISTRY_POLL_SECONDS):
+    """
+    Polls the registry and hot-swaps models whose current version changed.
+    Threads do not survive fork(), so a preforking server calls this again in
+    every worker (see gunicorn.conf.py); further calls in a process that is
+    already watching return its existing thread.
+    """
+    if interval <= 0:
+        return None
+    models = list(models)
+
+    def poll():
+        while True:
+            time.sleep(interval)
+            for served in models:
+                wanted = model_registry.current_version(served.name)
+                if served.loaded and wanted is not None and wanted != served.version:
+                    served.reload_async(wanted)
+
+    pid = os.getpid()
+    with _watchers_lock:
+        if pid not in _watchers:
+            _watchers[pid] = threading.Thread(target=poll, name="registry-watch", daemon=True)
+            _watchers[pid].start()
+        return _watchers[pid]
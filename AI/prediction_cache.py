@@ -0,0 +1,160 @@
+"""
+In-process LRU/TTL cache for model predictions.
+
+Field officers resubmit the same form many times while editing it, and the
+community models only see low-cardinality categorical inputs, so identical
+feature vectors are common. Each model gets its own PredictionCache in front
+of it, keyed by a canonical hash of its ordered feature values.
+
+Keys apply the same blank -> NaN normalization as the training scripts
+(`df.replace('', np.nan)`) and keep value types apart wherever the pipeline
+would treat them differently (None and NaN, 'Yes' and True, '40' and 40).
+
+Entries belong to the model object the cache is bound to. Reads and writes
+check that binding under the cache lock, so a prediction computed by a model
+that was swapped out while it ran is dropped rather than stored under the new
+model's binding.
+"""
+
+import hashlib
+import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping overhead (OrderedDict slot, tuple, timestamps)
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def _canonical(value):
+    if value == '' or (isinstance(value, float) and math.isnan(value)):
+        return ['nan']
+    if value is None:
+        return ['none']
+    if isinstance(value, bool):
+        return ['bool', value]
+    if isinstance(value, (int, float)):
+        return ['num', float(value)]
+    if isinstance(value, str):
+        return ['str', value]
+    return [type(value).__name__, repr(value)]
+
+
+def feature_key(record, features):
+    """Canonical hash of the record's values for `features`, in that order."""
+    payload = json.dumps([_canonical(record.get(feature)) for feature in features])
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _value_size(value):
+    if isinstance(value, tuple):
+        # Scored predictions are (labels, probabilities) pairs
+        return sys.getsizeof(value) + sum(_value_size(part) for part in value)
+    return getattr(value, 'nbytes', 0) + sys.getsizeof(value)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache bounded by entry count and bytes, with a per-entry TTL."""
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._model = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def bind(self, model):
+        """
+        Ties the cache to a loaded model object. When a different model object is
+        bound (the model file was reloaded), every cached prediction is dropped.
+        """
+        with self._lock:
+            if model is not self._model:
+                if self._model is not None:
+                    self.invalidations += 1
+                self._clear()
+                self._model = model
+
+    def get(self, key, model=None):
+        """The cached value for `key`; with `model`, only while that model is the bound one."""
+        with self._lock:
+            entry = self._entries.get(key) if model is None or model is self._model else None
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, model=None):
+        """Stores `value`; with `model`, only if that model is still the bound one."""
+        size = len(key) + _value_size(value) + _ENTRY_OVERHEAD_BYTES
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if model is not None and model is not self._model:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, model, record, features, compute):
+        """
+        Returns the cached prediction of `model` for `record`, computing it on a
+        miss; it is stored only if `model` is still bound once it is computed.
+        """
+        self.bind(model)
+        key = feature_key(record, features)
+        value = self.get(key, model)
+        if value is None:
+            value = compute(record)
+            self.put(key, value, model)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,193 @@
+"""
+Request validation shared by all prediction routes.
+
+Every loaded model version gets a RequestSchema compiled from its own fitted
+preprocessor: one converter per feature that knows whether the column is
+numeric or one-hot encoded and what "missing" has to look like for the
+pipeline. A request's userData is validated and normalized into a record
+holding exactly the model's features, in order, before any model work:
+
+  - keys that are not features are ignored, so extra or misordered keys can no
+    longer change the columns the pipeline sees
+  - missing values, None, '' and the strings pandas' CSV reader turns into NaN
+    ('N/A', 'NA', 'null', ...) become NaN, as in the training data, wherever
+    the pipeline can take NaN (an imputer, or NaN seen as a category); in a
+    column that never saw NaN they become '', which the encoder ignores like
+    any unseen category (NaN would make sklearn fail there)
+  - numeric features accept numbers and numeric strings; anything else is
+    rejected, as are non-text categorical values
+
+Bad payloads raise SchemaError, which carries the 4xx status the routes answer
+with (400 for a malformed body, 422 for an invalid field). Normalized records
+are what the prediction cache keys, the lookup table, the compiled fast path
+and the batch DataFrames all see, so they cannot drift apart.
+
+Like model_specs.py this module imports nothing heavy at import time.
+"""
+
+import math
+
+# pd.read_csv's default NA strings: training never sees these as categories
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+# Longer text values are rejected rather than hashed and looked up
+MAX_TEXT_LENGTH = 1000
+
+
+class SchemaError(ValueError):
+    """A request the API rejects before scoring, with the HTTP status to answer it with."""
+
+    def __init__(self, message, status=422, field=None):
+        super().__init__(message)
+        self.status = status
+        self.field = field
+
+
+def _missing(value):
+    return value is None or (isinstance(value, str) and value in NA_VALUES) or (
+        isinstance(value, float) and math.isnan(value))
+
+
+class _TextField:
+    """A one-hot encoded feature: values are matched against the training categories as text."""
+
+    dtype = 'object'
+
+    def __init__(self, name, missing):
+        self.name = name
+        self.missing = missing
+
+    def convert(self, value):
+        if _missing(value):
+            return self.missing
+        if isinstance(value, str):
+            if len(value) > MAX_TEXT_LENGTH:
+                raise SchemaError(f"'{self.name}' is longer than {MAX_TEXT_LENGTH} characters", field=self.name)
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            # The CSV held the text, e.g. a compartment number 12 was read as '12'
+            return str(int(value)) if float(value).is_integer() else str(value)
+        raise SchemaError(f"'{self.name}' must be text, got {type(value).__name__}", field=self.name)
+
+
+class _NumberField:
+    """A numeric feature, NaN when missing if the pipeline imputes it."""
+
+    dtype = 'float64'
+
+    def __init__(self, name, imputed):
+        self.name = name
+        self.imputed = imputed
+
+    def convert(self, value):
+        if _missing(value):
+            if not self.imputed:
+                raise SchemaError(f"'{self.name}' is required", field=self.name)
+            return math.nan
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise SchemaError(f"'{self.name}' must be a number, got {type(value).__name__}", field=self.name)
+        try:
+            number = float(value)
+        except ValueError:
+            raise SchemaError(f"'{self.name}' must be a number, got {value!r}", field=self.name) from None
+        if not math.isfinite(number):
+            raise SchemaError(f"'{self.name}' must be a finite number", field=self.name)
+        return number
+
+
+class RequestSchema:
+    """The compiled converters for one model version's features, in feature order."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.features = [field.name for field in fields]
+
+    def record(self, user_data):
+        """Validated {feature: value} for a userData object. Raises SchemaError."""
+        if not isinstance(user_data, dict):
+            raise SchemaError("userData must be a JSON object", status=400, field='userData')
+        return {field.name: field.convert(user_data.get(field.name)) for field in self.fields}
+
+    def frame(self, records):
+        """
+        A DataFrame of validated records, filled column by column into arrays
+        preallocated with each feature's dtype (no per-cell type inference).
+        """
+        import numpy as np
+        import pandas as pd
+
+        n = len(records)
+        columns = {}
+        for field in self.fields:
+            column = np.empty(n, dtype=field.dtype)
+            name = field.name
+            for i, record in enumerate(records):
+                column[i] = record[name]
+            columns[name] = column
+        return pd.DataFrame(columns, columns=self.features)
+
+    def convert_columns(self, frame):
+        """
+        Validates a DataFrame of raw cells (e.g. a CSV read as text without NA
+        parsing) with the same converters as record(), converting each
+        distinct value of a column once. Returns (normalized frame, {row
+        position: SchemaError}); a row is reported with its first invalid
+        field, as record() would reject it, and its values in the frame are
+        placeholders.
+        """
+        import numpy as np
+        import pandas as pd
+
+        n = len(frame)
+        columns = {}
+        errors = {}
+        for field in self.fields:
+            values = frame[field.name].to_numpy(dtype=object) if field.name in frame else np.full(n, None, dtype=object)
+            codes, uniques = pd.factorize(values, use_na_sentinel=False)
+            converted = np.empty(len(uniques), dtype=field.dtype)
+            for i, value in enumerate(uniques):
+                try:
+                    converted[i] = field.convert(value)
+                except SchemaError as e:
+                    converted[i] = math.nan if field.dtype == 'float64' else ''
+                    for row in np.flatnonzero(codes == i):
+                        errors.setdefault(int(row), e)
+            columns[field.name] = converted[codes]
+        return pd.DataFrame(columns, columns=self.features, index=frame.index), errors
+
+
+def _slots(model):
+    """The fast-path slots describing a model's preprocessing, or None for pipelines it cannot describe."""
+    from fast_inference import CompiledPipeline, _compile_preprocessor
+
+    if isinstance(model, CompiledPipeline):
+        return model.slots
+    try:
+        return _compile_preprocessor(model.steps[0][1])[0]
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def compile_schema(model, features):
+    """
+    Compiles the RequestSchema of a fitted pipeline (or a CompiledPipeline) for
+    `features`. A pipeline whose preprocessing cannot be described gets plain
+    text fields with '' for missing values, which is how requests were filled
+    before.
+    """
+    from fast_inference import _NumericSlot
+
+    slots = {slot.column: slot for slot in _slots(model) or []}
+    fields = []
+    for name in features:
+        slot = slots.get(name)
+        if slot is None:
+            fields.append(_TextField(name, ''))
+        elif isinstance(slot, _NumericSlot):
+            fields.append(_NumberField(name, slot.fill_value is not None))
+        else:
+            takes_nan = slot.impute or slot.nan_index is not None
+            fields.append(_TextField(name, math.nan if takes_nan else ''))
+    return RequestSchema(fields)
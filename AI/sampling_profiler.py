@@ -0,0 +1,135 @@
+"""
+Low-overhead sampling profiler for catching slow requests in production.
+
+While enabled, a daemon thread wakes every `interval` seconds and records the
+current Python stack of each request thread that is being profiled
+(sys._current_frames(), no tracing hooks, so profiled code runs at full
+speed). When a request finishes, its samples are kept only if it took at least
+`slow_seconds`. The captures hold collapsed stacks ("outer;inner;leaf count",
+the flame-graph input format) and live in a bounded ring.
+
+`sample_rate` limits profiling to a random fraction of requests. Everything
+can be changed at runtime with configure(); app.py exposes it under
+/api/profiler.
+"""
+
+import collections
+import os
+import random
+import sys
+import threading
+import time
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class _Collector:
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def add(self, frame, max_depth):
+        labels = []
+        while frame is not None and len(labels) < max_depth:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(labels))] += 1
+        self.samples += 1
+
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight requests and keeps the slow ones."""
+
+    def __init__(self, enabled=False, interval=0.005, slow_seconds=0.25, sample_rate=1.0,
+                 max_captures=20, max_depth=48, top_stacks=25):
+        self.enabled = enabled
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.max_depth = max_depth
+        self.top_stacks = top_stacks
+        self.captures = collections.deque(maxlen=max_captures)
+        self.profiled = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, enabled=None, interval=None, slow_seconds=None, sample_rate=None):
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError("interval must be positive")
+            self.interval = interval
+        if slow_seconds is not None:
+            self.slow_seconds = slow_seconds
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if enabled is not None:
+            self.enabled = enabled
+            if not enabled:
+                with self._lock:
+                    self._active.clear()
+
+    def begin(self):
+        """Starts sampling the calling thread; returns a collector token or None if not profiled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        self._ensure_thread()
+        collector = _Collector(threading.get_ident())
+        with self._lock:
+            self._active[collector.thread_id] = collector
+        return collector
+
+    def end(self, collector, duration, details):
+        """Stops sampling; keeps the profile if the request was slow. Returns True if captured."""
+        if collector is None:
+            return False
+        with self._lock:
+            self._active.pop(collector.thread_id, None)
+            self.profiled += 1
+        if duration < self.slow_seconds:
+            return False
+        self.captures.append(dict(
+            details,
+            captured_at=time.time(),
+            duration_ms=round(duration * 1000, 3),
+            samples=collector.samples,
+            stacks=[f"{stack} {count}" for stack, count in collector.stacks.most_common(self.top_stacks)],
+        ))
+        return True
+
+    def _ensure_thread(self):
+        # Started lazily so the thread is created in the serving process, not
+        # in a parent that forks workers afterwards.
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, collector in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        collector.add(frame, self.max_depth)
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'interval_ms': self.interval * 1000,
+            'slow_ms': self.slow_seconds * 1000,
+            'sample_rate': self.sample_rate,
+            'profiled_requests': self.profiled,
+            'captures': list(self.captures),
+        }
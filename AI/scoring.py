@@ -0,0 +1,89 @@
+"""
+Per-scheme eligibility probabilities and ranking.
+
+RandomForestClassifier.predict() is predict_proba() followed by an argmax over
+each output's classes. So the serving paths compute the class probabilities
+once and derive both the usual labels and the probability of the positive
+label ("eligible") from them. Labels come out identical to predict(), and
+ranking or confidence costs no extra forest traversal.
+"""
+
+import numpy as np
+
+POSITIVE_LABEL = 1
+
+
+def _positive_column(classes):
+    """Index of the eligible class in `classes`, or None if training never saw it."""
+    hits = np.flatnonzero(np.asarray(classes) == POSITIVE_LABEL)
+    return int(hits[0]) if len(hits) else None
+
+
+def scores_from_proba(classes, probas):
+    """
+    (labels, probabilities) for a batch from per-output predict_proba() arrays
+    of shape (n_records, n_classes). Labels equal MultiOutputClassifier.predict().
+    """
+    labels = np.asarray([
+        np.asarray(output_classes).take(np.argmax(proba, axis=1), axis=0)
+        for output_classes, proba in zip(classes, probas)
+    ]).T
+    probabilities = np.zeros(labels.shape, dtype=np.float64)
+    for k, (output_classes, proba) in enumerate(zip(classes, probas)):
+        column = _positive_column(output_classes)
+        if column is not None:
+            probabilities[:, k] = proba[:, column]
+    return labels, probabilities
+
+
+def score_one(classes, probas):
+    """scores_from_proba for one record given 1-D per-output probability vectors."""
+    labels, probabilities = scores_from_proba(classes, [np.asarray(p)[np.newaxis, :] for p in probas])
+    return labels[0], probabilities[0]
+
+
+def model_classes(model):
+    """Per-output class arrays of a fitted pipeline's (multi-output) classifier."""
+    classifier = model.steps[-1][1] if hasattr(model, 'steps') else model
+    classes = classifier.classes_
+    # MultiOutputClassifier keeps a list with one array per output
+    return classes if isinstance(classes, list) else [classes]
+
+
+def proba_list(probas):
+    """MultiOutputClassifier.predict_proba returns a list; a single-output classifier does not."""
+    return probas if isinstance(probas, list) else [probas]
+
+
+def rank_schemes(labels, probabilities, scheme_mapping, threshold=None, top_k=None):
+    """
+    Response fields for a scored prediction:
+
+      recommendedSchemes  eligible schemes in scheme order, as before, each with
+                          its probability; with `threshold`, eligible means
+                          probability >= threshold instead of the model's label
+      schemeScores        every scheme, ranked by probability (highest first)
+      topSchemes          the first `top_k` of schemeScores (only with top_k)
+    """
+    scored = []
+    for i, (label, probability) in enumerate(zip(labels, probabilities)):
+        eligible = bool(probability >= threshold) if threshold is not None else bool(label)
+        scored.append({
+            'name': scheme_mapping[i]['name'],
+            'description': scheme_mapping[i]['desc'],
+            'probability': round(float(probability), 6),
+            'eligible': eligible,
+        })
+    ranked = sorted(scored, key=lambda scheme: -scheme['probability'])
+    fields = {
+        'recommendedSchemes': [
+            {'name': s['name'], 'description': s['description'], 'probability': s['probability']}
+            for s in scored if s['eligible']
+        ],
+        'schemeScores': ranked,
+    }
+    if threshold is not None:
+        fields['threshold'] = threshold
+    if top_k is not None:
+        fields['topSchemes'] = ranked[:top_k]
+    return fields
@@ -0,0 +1,105 @@
+"""
+Shared fixtures: small pipelines fitted exactly like training.py fits them,
+on synthetic data, so the tests never depend on the committed .pkl files.
+
+The service modules read their configuration from the environment at import
+time, so the model, registry and job directories are pointed at a scratch
+directory before anything from AI/ is imported.
+"""
+
+import os
+import sys
+import tempfile
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_DIR)
+
+_SCRATCH = tempfile.mkdtemp(prefix="ai-tests-")
+os.environ["AI_MODEL_DIR"] = _SCRATCH
+os.environ["AI_MODEL_REGISTRY"] = os.path.join(_SCRATCH, "registry")
+os.environ["AI_JOB_DIR"] = os.path.join(_SCRATCH, "jobs")
+os.environ["AI_REGISTRY_POLL_SECONDS"] = "0"
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_registry
+from model_specs import SPECS
+from request_schema import compile_schema
+from training import fit, save_artifact
+
+# Few categories per column keeps the all-categorical models small enough to tabulate
+CATEGORIES = np.array(['Yes', 'No', 'petition', np.nan], dtype=object)
+FOREST_PARAMS = {'n_estimators': 8}
+
+
+def synthetic_frame(spec, n=200, seed=0):
+    """Training-like rows for a spec: categoricals and numerics with some missing values."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for column in spec.categorical_features:
+        columns[column] = rng.choice(CATEGORIES, n)
+    for column in spec.numeric_features:
+        values = rng.integers(18, 80, n).astype('float64')
+        values[rng.random(n) < 0.1] = np.nan
+        columns[column] = values
+    return pd.DataFrame(columns)[spec.features]
+
+
+def fit_pipeline(spec, seed=0):
+    return fit(spec, synthetic_frame(spec, seed=seed), n_jobs=1, forest_params=FOREST_PARAMS)
+
+
+def request_records(spec, pipeline, n=60, seed=1):
+    """
+    Validated request records for a pipeline: unseen rows plus the awkward
+    cases (unknown categories, NA strings, numeric strings, missing keys).
+    """
+    schema = compile_schema(pipeline, spec.features)
+    raw = [
+        {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()}
+        for row in synthetic_frame(spec, n, seed).to_dict('records')
+    ]
+    raw.append({column: 'Unseen' for column in spec.categorical_features})
+    raw.append({column: 'N/A' for column in spec.categorical_features})
+    raw.append({})
+    if spec.numeric_features:
+        raw.append({**raw[0], **{column: '42' for column in spec.numeric_features}})
+    return [schema.record(user_data) for user_data in raw], schema
+
+
+@pytest.fixture(scope='session')
+def pipelines():
+    """{model name: fitted pipeline}, fitted once per session."""
+    return {name: fit_pipeline(spec) for name, spec in SPECS.items()}
+
+
+@pytest.fixture(scope='session')
+def artifacts(pipelines, tmp_path_factory):
+    """{model name: path of the fitted pipeline saved as a .pkl}."""
+    directory = tmp_path_factory.mktemp('artifacts')
+    paths = {}
+    for name, pipeline in pipelines.items():
+        paths[name] = str(directory / f"{name}.pkl")
+        save_artifact(pipeline, paths[name])
+    return paths
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """An empty model registry for one test."""
+    directory = str(tmp_path / 'registry')
+    monkeypatch.setattr(model_registry, 'REGISTRY_DIR', directory)
+    return directory
+
+
+@pytest.fixture(scope='session')
+def client(pipelines):
+    """A Flask test client of the app, serving the session pipelines as the legacy .pkl files."""
+    import app
+
+    for name, served in app.served_models.items():
+        os.makedirs(os.path.dirname(served.path), exist_ok=True)
+        save_artifact(pipelines[name], served.path)
+    return app.app.test_client()
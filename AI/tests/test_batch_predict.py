@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import app
+from conftest import request_records
+from model_specs import SPECS
+
+ROUTES = {
+    'individual': '/api/predict/batch',
+    'community': '/api/community/predict/batch',
+    'community_resources': '/api/community-resources/predict/batch',
+}
+
+
+def ndjson(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def stream(client, name, body, query=''):
+    """(record lines, closing summary line) of a batch response sent as NDJSON."""
+    response = client.post(ROUTES[name] + query, data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def user_data(name, pipelines, n=12):
+    """JSON-safe request rows for a model, without the NaN the validated records hold."""
+    records, _ = request_records(SPECS[name], pipelines[name], n=n)
+    return [{k: v for k, v in record.items() if v == v} for record in records[:n]]
+
+
+def expected_schemes(name, record):
+    served = app.served_models[name]
+    active = served.get()
+    labels, _ = app.predict_record(served, active, active.schema.record(record))
+    return app.recommend_schemes(labels, active.scheme_mapping)
+
+
+@pytest.mark.parametrize('name', list(ROUTES))
+@pytest.mark.parametrize('chunk_size', [1, 5, 500])
+def test_chunks_score_like_single_records(client, pipelines, name, chunk_size):
+    rows = user_data(name, pipelines)
+    lines, summary = stream(client, name, ndjson(rows), f'?chunkSize={chunk_size}')
+
+    assert [line['id'] for line in lines] == list(range(len(rows)))
+    for line, row in zip(lines, rows):
+        assert line['success'] and line['modelVersion'] == app.served_models[name].get().version
+        assert line['recommendedSchemes'] == expected_schemes(name, row)
+    assert summary == {'success': True, 'summary': {'records': len(rows), 'succeeded': len(rows), 'failed': 0}}
+
+
+def test_json_body_and_record_ids(client, pipelines):
+    rows = user_data('community', pipelines, n=3)
+    body = {'userData': [{'id': 'a', 'userData': rows[0]}, rows[1], {'id': 7, 'userData': rows[2]}]}
+    response = client.post(ROUTES['community'] + '?chunkSize=2', json=body)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [line.get('id') for line in lines] == ['a', 1, 7, None]
+    assert [line['recommendedSchemes'] for line in lines[:3]] == [expected_schemes('community', r) for r in rows]
+
+
+def test_invalid_lines_fail_alone(client, pipelines):
+    rows = user_data('individual', pipelines, n=4)
+    rows[1] = {**rows[1], 'Age': 'old'}
+    rows.insert(3, ['not', 'an', 'object'])
+    lines, summary = stream(client, 'individual', ndjson(rows), '?chunkSize=2')
+
+    assert [line['success'] for line in lines] == [True, False, True, False, True]
+    assert lines[1] == {'id': 1, 'success': False, 'error': "'Age' must be a number, got 'old'",
+                        'field': 'Age', 'status': 422}
+    assert lines[3]['field'] == 'userData' and lines[3]['status'] == 400
+    assert lines[4]['recommendedSchemes'] == expected_schemes('individual', rows[4])
+    assert summary['summary'] == {'records': 5, 'succeeded': 3, 'failed': 2}
+
+
+def test_malformed_input_scores_what_was_read_then_reports_it(client, pipelines):
+    rows = user_data('community_resources', pipelines, n=3)
+    lines, summary = stream(client, 'community_resources', ndjson(rows) + '{"broken\n' + ndjson(rows), '?chunkSize=2')
+
+    assert [line['id'] for line in lines] == [0, 1, 2]
+    assert summary['success'] is False and summary['error'].startswith('Invalid batch input: ')
+    assert summary['summary'] == {'records': 3, 'succeeded': 3, 'failed': 0}
+
+
+def test_an_empty_batch_still_ends_with_a_summary(client):
+    lines, summary = stream(client, 'community', '')
+    assert lines == [] and summary['summary'] == {'records': 0, 'succeeded': 0, 'failed': 0}
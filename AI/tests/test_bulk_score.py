@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_registry
+from bulk_score import score_file
+from conftest import synthetic_frame
+from model_specs import SPECS
+from request_schema import compile_schema
+from scoring import model_classes, proba_list, scores_from_proba
+
+SPEC = SPECS['individual']
+NOTES = ['N/A', 'NA', 'null', '', 'None', 'ok']
+REJECTED = 7
+
+
+@pytest.fixture
+def claims(tmp_path):
+    """A claims export as text: NA-like strings in every column, ages as digits and one unparseable age."""
+    source = synthetic_frame(SPEC, n=120, seed=3).astype(object).where(lambda df: df.notna(), 'N/A')
+    source.insert(0, 'Note', [NOTES[i % len(NOTES)] for i in range(len(source))])
+    source['Age'] = source['Age'].map(lambda v: v if v == 'N/A' else str(int(v)))
+    source.loc[REJECTED, 'Age'] = 'old'
+    path = tmp_path / 'claims.csv'
+    source.to_csv(path, index=False)
+    return source, str(path)
+
+
+def api_scores(pipeline, rows):
+    """(labels, probabilities) the API gives the same rows."""
+    schema = compile_schema(pipeline, SPEC.features)
+    frame = schema.frame([schema.record(row) for row in rows[SPEC.features].to_dict('records')])
+    return scores_from_proba(model_classes(pipeline), proba_list(pipeline.predict_proba(frame)))
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_csv_round_trip(jobs, claims, pipelines, artifacts, tmp_path):
+    source, input_path = claims
+    output_path = str(tmp_path / 'scored.csv')
+
+    summary = score_file(SPEC, input_path, output_path, artifacts[SPEC.name],
+                         chunksize=25, jobs=jobs, with_probabilities=True)
+    out = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+
+    # Passthrough cells come back verbatim, NA-like strings included
+    assert out.columns.tolist()[:len(source.columns)] == source.columns.tolist()
+    assert out['Note'].tolist() == source['Note'].tolist()
+    assert out['State'].tolist() == source['State'].tolist()
+    # The row the API would reject is reported, not scored
+    assert summary['rejected'] == 1
+    assert out.loc[REJECTED, 'scoring_error'] == "'Age' must be a number, got 'old'"
+    assert out.loc[REJECTED, SPEC.target_columns].tolist() == [''] * len(SPEC.target_columns)
+
+    # Everything else is scored exactly as the API scores the same records
+    labels, probabilities = api_scores(pipelines[SPEC.name], source.drop(index=REJECTED))
+    scored = out.drop(index=REJECTED)
+    np.testing.assert_array_equal(scored[SPEC.target_columns].astype(int).to_numpy(), labels)
+    np.testing.assert_array_equal(
+        scored[[f"{target}_probability" for target in SPEC.target_columns]].astype(float).to_numpy(),
+        probabilities.round(6))
+    assert (scored['scoring_error'] == '').all()
+    assert summary['rows'] == len(source)
+    assert summary['eligible'] == dict(zip(SPEC.target_columns, labels.sum(axis=0).tolist()))
+
+
+def test_keep_columns_selects_the_passthrough(claims, artifacts, tmp_path):
+    source, input_path = claims
+    output_path = str(tmp_path / 'scored.csv')
+
+    score_file(SPEC, input_path, output_path, artifacts[SPEC.name], chunksize=50, keep_columns=['Note'])
+    out = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+
+    assert out.columns.tolist() == ['Note', *SPEC.target_columns, 'scoring_error']
+    assert out['Note'].tolist() == source['Note'].tolist()
+
+
+@pytest.mark.parametrize('drop, keep, message', [
+    ('Age', None, "missing columns: Age"),
+    (None, ['Note', 'Remarks'], "has no columns: Remarks"),
+])
+def test_bad_inputs_are_refused_before_scoring(drop, keep, message, claims, artifacts, tmp_path):
+    source, _ = claims
+    input_path = str(tmp_path / 'claims.csv')
+    source.drop(columns=[drop] if drop else []).to_csv(input_path, index=False)
+    output_path = tmp_path / 'scored.csv'
+
+    with pytest.raises(ValueError, match=message):
+        score_file(SPEC, input_path, str(output_path), artifacts[SPEC.name], keep_columns=keep)
+    assert not output_path.exists()
+
+
+def test_scores_with_the_registry_current_version(registry, claims, artifacts, tmp_path):
+    _, input_path = claims
+    model_registry.publish(SPEC.name, artifacts[SPEC.name], SPEC.features, version='v3')
+
+    summary = score_file(SPEC, input_path, str(tmp_path / 'scored.csv'), chunksize=50)
+    assert summary['model_version'] == 'v3' and summary['rows'] == 120
@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import app
+from coalescer import MicroBatcher
+from conftest import request_records
+from model_specs import SPECS
+from model_store import ServedModel
+
+
+class Recorder:
+    """A predict_batch that answers (record, version) and remembers every batch it was given."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, records, version):
+        with self._lock:
+            self.batches.append((version, list(records)))
+        if self.fail:
+            raise RuntimeError('model exploded')
+        return [(record, version) for record in records]
+
+
+def submit_all(batcher, work, workers=16):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda item: batcher.submit(*item, timeout=5), work))
+
+
+def test_concurrent_records_share_batches():
+    predict = Recorder()
+    batcher = MicroBatcher('test', predict, max_batch_size=8, max_wait=0.05)
+    work = [(i, 'v1') for i in range(40)]
+
+    assert submit_all(batcher, work) == [(i, 'v1') for i in range(40)]
+    stats = batcher.stats()
+    assert stats['records'] == 40 and stats['errors'] == 0
+    assert stats['batches'] == len(predict.batches) < 40
+    assert max(len(records) for _, records in predict.batches) <= 8
+    assert sorted(r for _, records in predict.batches for r in records) == list(range(40))
+
+
+def test_a_batch_is_split_by_pinned_version():
+    predict = Recorder()
+    batcher = MicroBatcher('test', predict, max_batch_size=64, max_wait=0.05)
+    # Records pinned to two versions, as while a hot swap is in flight
+    work = [(i, ('old', 'new')[i % 2]) for i in range(32)]
+
+    assert submit_all(batcher, work) == work
+    for version, records in predict.batches:
+        assert {('old', 'new')[r % 2] for r in records} == {version}
+
+
+def test_a_failed_batch_fails_each_of_its_callers():
+    batcher = MicroBatcher('test', Recorder(fail=True), max_batch_size=4, max_wait=0.05)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(batcher.submit, i, 'v1', 5) for i in range(4)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match='model exploded'):
+                future.result()
+    assert batcher.stats()['errors'] == batcher.stats()['batches'] >= 1
+
+
+def test_coalesced_predictions_match_the_pipeline(registry, artifacts, pipelines, monkeypatch):
+    spec = SPECS['community']
+    monkeypatch.setattr(app, 'COALESCE', True)
+    served = ServedModel(spec.name, spec.label, artifacts[spec.name], spec.features, spec.scheme_mapping)
+    served.batcher = app.make_batcher(served)
+    active = served.get()
+    records, schema = request_records(spec, pipelines[spec.name])
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda record: app.predict_record(served, active, record), records))
+
+    _, probabilities = app.records_scores(active, records)
+    np.testing.assert_array_equal([result[0] for result in results], pipelines[spec.name].predict(schema.frame(records)))
+    np.testing.assert_array_equal([result[1] for result in results], probabilities)
+    assert served.batcher.stats()['records'] == len(records)
@@ -0,0 +1,93 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+import compact_model
+from conftest import fit_pipeline, synthetic_frame
+from model_specs import SPECS
+from model_store import ServedModel
+
+
+@pytest.fixture
+def exported(tmp_path):
+    """(pipeline, .pkl path, validation frame with blank cells) for the community-resources model."""
+    spec = SPECS['community_resources']
+    pipeline = fit_pipeline(spec)
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump(pipeline, path)
+    frame = synthetic_frame(spec, seed=4)
+    assert frame.isna().any().any()
+    return pipeline, path, frame
+
+
+@pytest.mark.parametrize('name', ['individual', 'community_resources'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_export_load_predict_round_trip(name, compress, tmp_path):
+    spec = SPECS[name]
+    pipeline = fit_pipeline(spec)
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump(pipeline, path)
+    frame = synthetic_frame(spec, seed=4)
+
+    header, summary = compact_model.export(path, compress=compress, frame=frame)
+    assert summary['single_record_mismatches'] == 0 and summary['max_probability_diff'] == 0.0
+    assert {a['compression'] for a in header['arrays'].values()} == {'zlib' if compress else None}
+
+    loaded = compact_model.load_model(compact_model.compact_path(path))
+    # Plain arrays are memory-mapped, compressed ones inflated into memory
+    assert isinstance(loaded.feature, np.memmap) != compress
+    np.testing.assert_array_equal(loaded.predict(frame), pipeline.predict(frame))
+    for ours, expected in zip(loaded.predict_proba(frame), pipeline.predict_proba(frame)):
+        np.testing.assert_array_equal(ours, expected)
+
+
+def test_validation_with_blank_cells_checks_single_records(exported):
+    pipeline, _, frame = exported
+    compiled = compact_model.compile_pipeline(pipeline)
+    summary = compact_model.validate(pipeline, compiled, frame)
+    assert summary == {'rows': len(frame), 'max_probability_diff': 0.0,
+                       'labels_equal': True, 'single_record_mismatches': 0}
+
+    # A compact model of a different pipeline is still caught
+    other = compact_model.compile_pipeline(fit_pipeline(SPECS['community_resources'], seed=9))
+    with pytest.raises(compact_model.ArtifactError):
+        compact_model.validate(pipeline, other, frame)
+
+
+def test_tampered_artifact_is_rejected(exported):
+    _, path, frame = exported
+    compact_model.export(path, frame=frame)
+    compact_file = compact_model.compact_path(path)
+    offset = compact_model.read_header(compact_file)['arrays']['threshold']['offset']
+    with open(compact_file, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(compact_model.ArtifactError, match='checksum mismatch'):
+        compact_model.load(compact_file, verify=True)
+
+    with open(compact_file, 'r+b') as f:
+        f.write(b'NOTMAGIC')
+    with pytest.raises(compact_model.ArtifactError, match='not a compact model artifact'):
+        compact_model.load(compact_file)
+
+
+def test_stale_artifact_falls_back_to_the_pickle(exported, registry):
+    pipeline, path, frame = exported
+    compact_model.export(path, frame=frame)
+    spec = SPECS['community_resources']
+
+    def serve():
+        return ServedModel(spec.name, spec.label, path, spec.features, spec.scheme_mapping, compact=True).get()
+
+    assert compact_model.is_current(compact_model.load(compact_model.compact_path(path)), path)
+    assert serve().path == compact_model.compact_path(path)
+
+    # Retraining rewrites the .pkl after the export
+    joblib.dump(pipeline, path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert not compact_model.is_current(compact_model.load(compact_model.compact_path(path)), path)
+    assert serve().path == path
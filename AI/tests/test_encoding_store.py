@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from conftest import request_records, synthetic_frame
+from encoding_store import Vocabulary
+from fast_inference import compile_pipeline
+from model_specs import SPECS
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_vocabulary_encoding_matches_sklearn(name, pipelines):
+    pipeline = pipelines[name]
+    records, schema = request_records(SPECS[name], pipeline)
+    frame = schema.frame(records)
+    classifier = pipeline.steps[-1][1]
+
+    X = Vocabulary.from_pipeline(pipeline).encode_records(records)
+    np.testing.assert_array_equal(classifier.predict(X), pipeline.predict(frame))
+    for ours, expected in zip(classifier.predict_proba(X), pipeline.predict_proba(frame)):
+        np.testing.assert_array_equal(ours, expected)
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_vocabulary_and_compiled_pipeline_encode_alike(name, pipelines):
+    pipeline = pipelines[name]
+    records, schema = request_records(SPECS[name], pipeline)
+    compiled = compile_pipeline(pipeline)
+
+    X = Vocabulary.from_pipeline(pipeline).encode_records(records)
+    assert X.dtype == np.float32
+    np.testing.assert_array_equal(X, compiled.encode_many(records))
+    np.testing.assert_array_equal(X, compiled.encode_many(schema.frame(records)))
+    np.testing.assert_array_equal(X[0], compiled.encode(records[0]))
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_encode_frame_matches_column_transformer(name, pipelines):
+    pipeline = pipelines[name]
+    frame = synthetic_frame(SPECS[name], seed=2)
+    expected = pipeline.steps[0][1].transform(frame)
+
+    encoded = Vocabulary.from_pipeline(pipeline).encode_frame(frame)
+    assert sp.issparse(encoded) == sp.issparse(expected)
+    dense = encoded.toarray() if sp.issparse(encoded) else encoded
+    np.testing.assert_array_equal(dense, expected.toarray() if sp.issparse(expected) else expected)
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from conftest import request_records
+from fast_inference import compile_pipeline
+from model_specs import SPECS
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_compiled_pipeline_matches_sklearn(name, pipelines):
+    pipeline = pipelines[name]
+    records, schema = request_records(SPECS[name], pipeline)
+    frame = schema.frame(records)
+    compiled = compile_pipeline(pipeline)
+
+    np.testing.assert_array_equal(compiled.predict(records), pipeline.predict(frame))
+    for ours, expected in zip(compiled.predict_proba(records), pipeline.predict_proba(frame)):
+        np.testing.assert_array_equal(ours, expected)
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_compiled_single_record_matches_sklearn(name, pipelines):
+    pipeline = pipelines[name]
+    records, schema = request_records(SPECS[name], pipeline)
+    expected = pipeline.predict(schema.frame(records))
+    compiled = compile_pipeline(pipeline)
+
+    for record, row in zip(records, expected):
+        np.testing.assert_array_equal(compiled.predict_one(record), row)
@@ -0,0 +1,103 @@
+import joblib
+import numpy as np
+import pytest
+
+import incremental
+from conftest import synthetic_frame
+from model_specs import SPECS
+from training import read_source, train_model
+
+SPEC = SPECS['community']
+
+
+@pytest.fixture
+def source(tmp_path):
+    """(data path, refresh(**kwargs)) for a community CSV of 300 rows with a trained state."""
+    data_path = tmp_path / 'community.csv'
+    synthetic_frame(SPEC, n=300, seed=10).to_csv(data_path, index=False)
+
+    def refresh(**kwargs):
+        return incremental.refresh_model(SPEC, str(data_path), str(tmp_path / 'model.pkl'), n_jobs=1,
+                                         state_root=str(tmp_path / 'state'), **kwargs)
+
+    assert refresh()['action'] == 'full'
+    return data_path, refresh
+
+
+def append(data_path, n, seed, **values):
+    rows = synthetic_frame(SPEC, n=n, seed=seed)
+    for column, (count, value) in values.items():
+        rows.loc[:count - 1, column] = value
+    rows.to_csv(data_path, mode='a', header=False, index=False)
+
+
+def assert_matches_regular_training(data_path, tmp_path):
+    rows = read_source(str(data_path), SPEC.source_columns, SPEC.numeric_features)
+    regular, _ = train_model(SPEC, rows, artifact_path=str(tmp_path / 'regular.pkl'), n_jobs=1, report_limit=0)
+    refreshed = joblib.load(tmp_path / 'model.pkl')
+    for ours, expected in zip(refreshed.predict_proba(rows[SPEC.features]), regular.predict_proba(rows[SPEC.features])):
+        np.testing.assert_array_equal(ours, expected)
+    return refreshed, regular
+
+
+def encoder_categories(pipeline, column):
+    transformer = pipeline.named_steps['preprocessor'].named_transformers_['cat']
+    encoder = transformer.steps[-1][1]
+    return list(encoder.categories_[SPEC.categorical_features.index(column)])
+
+
+def test_unchanged_file_is_up_to_date(source):
+    _, refresh = source
+    assert refresh()['action'] == 'none'
+
+
+def test_appended_rows_warm_start_from_the_tail(source):
+    data_path, refresh = source
+    append(data_path, 20, seed=11)
+    summary = refresh()
+    assert summary['delta_mode'] == 'append'
+    assert summary['action'] == 'warm_start'
+    assert summary['drift']['added_rows'] == 20
+    # 100 base trees, the new rows are 20 of 320
+    assert summary['trees_added'] == round(100 * 20 / 320)
+
+
+def test_edited_row_is_found_by_diff_and_retrains(source, tmp_path):
+    data_path, refresh = source
+    lines = data_path.read_text().splitlines(keepends=True)
+    fields = lines[150].rstrip('\n').split(',')
+    fields[0] = 'No' if fields[0] == 'Yes' else 'Yes'
+    lines[150] = ','.join(fields) + '\n'
+    data_path.write_text(''.join(lines))
+
+    summary = refresh()
+    assert summary['delta_mode'] == 'diff'
+    assert (summary['drift']['added_rows'], summary['drift']['removed_rows']) == (1, 1)
+    assert (summary['action'], summary['reason']) == ('full', 'removed rows')
+    assert_matches_regular_training(data_path, tmp_path)
+
+
+def test_drift_threshold_decides_between_warm_start_and_retrain(source, tmp_path):
+    data_path, refresh = source
+    append(data_path, 200, seed=12)
+    assert refresh(drift_threshold=1.0)['action'] == 'warm_start'
+
+    append(data_path, 200, seed=13)
+    summary = refresh()
+    assert summary['drift']['churn'] > incremental.DEFAULT_DRIFT_THRESHOLD
+    assert (summary['action'], summary['reason'], summary['reused_encodings']) == ('full', 'drift', True)
+    assert_matches_regular_training(data_path, tmp_path)
+
+
+def test_categories_from_an_earlier_warm_start_are_refit(source, tmp_path):
+    data_path, refresh = source
+    # Two rows of 20 bring a new State: below the threshold, so the encoder is not refit yet
+    append(data_path, 20, seed=14, State=(2, 'Zed'))
+    summary = refresh()
+    assert summary['action'] == 'warm_start' and summary['drift']['unseen_categories'] > 0
+
+    append(data_path, 200, seed=15)
+    summary = refresh()
+    assert (summary['action'], summary['reused_encodings']) == ('full', False)
+    refreshed, _ = assert_matches_regular_training(data_path, tmp_path)
+    assert 'Zed' in encoder_categories(refreshed, 'State')
@@ -0,0 +1,126 @@
+import json
+import shutil
+import threading
+import time
+
+import pytest
+
+import app
+import model_registry
+from conftest import fit_pipeline, request_records
+from job_queue import JobQueue
+from model_specs import SPECS
+from model_store import ServedModel
+from training import save_artifact
+
+SPEC = SPECS['community']
+
+
+@pytest.fixture
+def served(registry, artifacts, tmp_path, monkeypatch):
+    """The app's community model serving registry version 'v1', with a retrained 'v2' published beside it."""
+    retrained = str(tmp_path / 'retrained.pkl')
+    save_artifact(fit_pipeline(SPEC, seed=7), retrained)
+    model_registry.publish(SPEC.name, artifacts[SPEC.name], SPEC.features, version='v1')
+    model_registry.publish(SPEC.name, retrained, SPEC.features, version='v2', activate=False)
+    served = ServedModel(SPEC.name, SPEC.label, artifacts[SPEC.name], SPEC.features, SPEC.scheme_mapping)
+    monkeypatch.setitem(app.served_models, SPEC.name, served)
+    return served
+
+
+def submit(queue, records):
+    """Queues records the way POST /api/jobs spools a JSON or NDJSON body."""
+    def write_input(path):
+        with open(path, 'w') as f:
+            f.writelines(json.dumps({'id': f"r{i}", 'userData': r}) + '\n' for i, r in enumerate(records))
+    return queue.submit(SPEC.name, None, write_input, 'ndjson')
+
+
+def run(queue, owner, stale_after=60):
+    job = queue.store.claim(owner, max_running=1, stale_after=stale_after)
+    queue._process(job, owner)
+    return queue.store.get(job['id'])
+
+
+def bodies(queue, job_id):
+    return [json.loads(line) for line in queue.store.results(job_id, 0, 1000)]
+
+
+def test_ndjson_job_scores_like_the_batch_route(served, pipelines, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs'), app.open_job_scorer, workers=0, chunk_size=7)
+    records, schema = request_records(SPEC, pipelines[SPEC.name], n=20)
+    submit(queue, records)
+    job = run(queue, 'worker')
+
+    assert job['status'] == 'done' and job['input_format'] == 'ndjson'
+    assert (job['total'], job['processed'], job['failed']) == (len(records), len(records), 0)
+    results = bodies(queue, job['id'])
+    assert [body['id'] for body in results] == [f"r{i}" for i in range(len(records))]
+    expected = pipelines[SPEC.name].predict(schema.frame(records))
+    assert [body['recommendedSchemes'] for body in results] == [
+        app.recommend_schemes(labels, SPEC.scheme_mapping) for labels in expected]
+
+
+def interrupted(queue, records, done):
+    """A job whose worker committed its first `done` records on the active version, then died."""
+    job_id = submit(queue, records)
+    job = queue.store.claim('dead-worker', max_running=1, stale_after=60)
+    version, score = queue.open_scorer(job)
+    queue.store.update(job_id, 'dead-worker', model_version=version)
+    lines = [json.dumps(body) for body in score([(f"r{i}", records[i]) for i in range(done)])]
+    queue.store.record_chunk(job_id, 'dead-worker', 0, lines, 0)
+    return job_id
+
+
+def test_resumed_job_keeps_its_model_version(served, pipelines, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs'), app.open_job_scorer, workers=0, chunk_size=7)
+    records, schema = request_records(SPEC, pipelines[SPEC.name])
+    job_id = interrupted(queue, records, done=2)
+
+    # v1 is neither active nor previous by the time the job resumes
+    served.reload('v2', pin=True)
+    served.reload('v2')
+    job = run(queue, 'new-worker', stale_after=0)
+
+    assert job['id'] == job_id and job['status'] == 'done' and job['model_version'] == 'v1'
+    results = bodies(queue, job_id)
+    assert len(results) == len(records) and {body['modelVersion'] for body in results} == {'v1'}
+    expected = pipelines[SPEC.name].predict(schema.frame(records))
+    assert [body['recommendedSchemes'] for body in results] == [
+        app.recommend_schemes(labels, SPEC.scheme_mapping) for labels in expected]
+
+
+def test_resumed_job_fails_when_its_version_is_gone(served, pipelines, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs'), app.open_job_scorer, workers=0)
+    records, _ = request_records(SPEC, pipelines[SPEC.name])
+    job_id = interrupted(queue, records, done=2)
+
+    served.reload('v2', pin=True)
+    served.reload('v2')
+    shutil.rmtree(model_registry.version_dir(SPEC.name, 'v1'))
+    job = run(queue, 'new-worker', stale_after=0)
+
+    assert job['id'] == job_id and job['status'] == 'failed'
+    assert 'v1' in job['error'] and job['processed'] == 2
+
+
+def test_a_chunk_slower_than_stale_after_is_not_reclaimed(tmp_path):
+    stale_after = 0.3
+    claims = []
+
+    def open_scorer(job):
+        def score(chunk):
+            # Another worker looks for stale jobs while this chunk is still scoring
+            time.sleep(stale_after * 2)
+            claims.append(queue.store.claim('other-worker', max_running=2, stale_after=stale_after))
+            return [{'id': record_id, 'success': True} for record_id, _ in chunk]
+        return 'v1', score
+
+    queue = JobQueue(str(tmp_path / 'jobs'), open_scorer, workers=0, chunk_size=2, stale_after=stale_after)
+    job_id = submit(queue, [{}] * 3)
+    job = run(queue, 'worker', stale_after=stale_after)
+
+    assert claims == [None, None]
+    assert job['id'] == job_id and job['status'] == 'done' and job['owner'] == 'worker'
+    assert [body['id'] for body in bodies(queue, job_id)] == ['r0', 'r1', 'r2']
+    assert not [t for t in threading.enumerate() if t.name.startswith('job-heartbeat-')]
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from conftest import request_records
+from lookup_table import TableTooLarge, tabulate_pipeline
+from model_specs import SPECS
+from scoring import model_classes, proba_list, scores_from_proba
+
+
+def test_table_matches_sklearn(pipelines):
+    pipeline = pipelines['community_resources']
+    records, schema = request_records(SPECS['community_resources'], pipeline)
+    frame = schema.frame(records)
+    table = tabulate_pipeline(pipeline)
+
+    np.testing.assert_array_equal(table.predict(records), pipeline.predict(frame))
+    labels, probabilities = table.score(records)
+    expected_labels, expected_probabilities = scores_from_proba(
+        model_classes(pipeline), proba_list(pipeline.predict_proba(frame)))
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_array_equal(probabilities, expected_probabilities)
+
+
+def test_numeric_inputs_are_not_tabulated(pipelines):
+    with pytest.raises(TypeError):
+        tabulate_pipeline(pipelines['individual'])
+
+
+def test_oversized_table_is_refused(pipelines):
+    with pytest.raises(TableTooLarge):
+        tabulate_pipeline(pipelines['community'], max_cells=1000)
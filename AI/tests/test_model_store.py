@@ -0,0 +1,62 @@
+import pytest
+
+import model_registry
+from conftest import fit_pipeline
+from model_specs import SPECS
+from model_store import ModelNotLoaded, ServedModel
+from training import save_artifact
+
+SPEC = SPECS['community']
+
+
+def serve_community(path):
+    return ServedModel(SPEC.name, SPEC.label, path, SPEC.features, SPEC.scheme_mapping)
+
+
+@pytest.fixture
+def deployed(registry, artifacts, tmp_path):
+    """A community model serving published 'v1', with a retrained 'v2' published but not yet active."""
+    retrained = str(tmp_path / 'retrained.pkl')
+    save_artifact(fit_pipeline(SPEC, seed=7), retrained)
+    model_registry.publish(SPEC.name, artifacts[SPEC.name], SPEC.features, version='v1')
+    model_registry.publish(SPEC.name, retrained, SPEC.features, version='v2', activate=False)
+    return serve_community(artifacts[SPEC.name])
+
+
+def test_rollback_pins_the_previous_version(deployed):
+    v1 = deployed.get()
+    assert v1.version == 'v1'
+    v2 = deployed.reload('v2', pin=True)
+    assert model_registry.current_version(SPEC.name) == 'v2'
+    assert deployed.status()['previous_version'] == 'v1'
+
+    # The loaded v1 is swapped back in, not read again
+    assert deployed.rollback() is v1
+    assert model_registry.current_version(SPEC.name) == 'v1'
+    assert deployed.status()['previous_version'] == v2.version
+    # Another process (or a restart) follows the registry
+    assert serve_community(deployed.path).load().version == 'v1'
+    # and so does this one's registry-driven reload
+    assert deployed.reload().version == 'v1'
+
+
+def test_rollback_to_the_legacy_pkl_pins_unversioned(registry, artifacts):
+    served = serve_community(artifacts[SPEC.name])
+    assert served.get().version == model_registry.UNVERSIONED
+    assert model_registry.current_version(SPEC.name) is None
+
+    model_registry.publish(SPEC.name, artifacts[SPEC.name], SPEC.features, version='v1')
+    assert served.reload().version == 'v1'
+    assert served.rollback().version == model_registry.UNVERSIONED
+    assert model_registry.current_version(SPEC.name) == model_registry.UNVERSIONED
+
+    # Neither a fresh load nor a registry-driven reload brings v1 back
+    assert serve_community(artifacts[SPEC.name]).load().version == model_registry.UNVERSIONED
+    assert served.reload().version == model_registry.UNVERSIONED
+
+
+def test_rollback_without_a_previous_version(deployed):
+    deployed.get()
+    with pytest.raises(ModelNotLoaded, match='no previous version'):
+        deployed.rollback()
+    assert model_registry.current_version(SPEC.name) == 'v1'
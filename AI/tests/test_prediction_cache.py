@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import app
+import model_registry
+from conftest import fit_pipeline, request_records
+from model_specs import SPECS
+from model_store import ServedModel
+from prediction_cache import PredictionCache, feature_key
+from training import save_artifact
+
+SPEC = SPECS['community']
+
+
+@pytest.fixture
+def cached(registry, artifacts):
+    """The community model served from its .pkl with a prediction cache attached."""
+    served = ServedModel(SPEC.name, SPEC.label, artifacts[SPEC.name], SPEC.features, SPEC.scheme_mapping)
+    served.cache = PredictionCache()
+    return served
+
+
+def labels(served, active, records):
+    return [app.predict_record(served, active, record)[0] for record in records]
+
+
+def expected_labels(active, records):
+    return active.model.predict(active.schema.frame(records))
+
+
+def publish_retrained(tmp_path):
+    """Publishes a model fitted on other data as the current version, as a training run would."""
+    path = str(tmp_path / 'retrained.pkl')
+    save_artifact(fit_pipeline(SPEC, seed=7), path)
+    model_registry.publish(SPEC.name, path, SPEC.features, version='retrained')
+
+
+def test_resubmitted_forms_are_answered_from_the_cache(cached, pipelines):
+    records, _ = request_records(SPEC, pipelines[SPEC.name])
+    active = cached.get()
+    distinct = len({feature_key(record, active.features) for record in records})
+
+    first = labels(cached, active, records)
+    assert cached.cache.stats()['entries'] == distinct
+    assert cached.cache.stats()['misses'] == distinct
+    second = labels(cached, active, records)
+
+    np.testing.assert_array_equal(first, expected_labels(active, records))
+    np.testing.assert_array_equal(second, first)
+    assert cached.cache.stats()['hits'] == 2 * len(records) - distinct
+
+
+def test_a_reload_does_not_serve_cached_predictions(cached, pipelines, tmp_path):
+    records, _ = request_records(SPEC, pipelines[SPEC.name])
+    before = cached.get()
+    labels(cached, before, records)
+
+    publish_retrained(tmp_path)
+    after = cached.reload()
+    assert after.version == 'retrained'
+    assert not np.array_equal(expected_labels(before, records), expected_labels(after, records))
+
+    np.testing.assert_array_equal(labels(cached, after, records), expected_labels(after, records))
+    assert cached.cache.stats()['invalidations'] == 1
+
+
+def test_a_request_on_a_swapped_out_version_does_not_touch_the_cache(cached, pipelines, tmp_path):
+    records, _ = request_records(SPEC, pipelines[SPEC.name])
+    before = cached.get()
+    publish_retrained(tmp_path)
+    after = cached.reload()
+
+    # A request that started before the swap finishes after it: scored by its own version, not cached
+    np.testing.assert_array_equal(labels(cached, before, records), expected_labels(before, records))
+    assert cached.cache.stats()['entries'] == 0
+    np.testing.assert_array_equal(labels(cached, after, records), expected_labels(after, records))
+
+
+def test_prediction_of_an_unbound_model_is_not_stored():
+    cache = PredictionCache()
+    old, new = object(), object()
+    cache.bind(new)
+    cache.put('key', 'old result', model=old)
+    assert cache.get('key', new) is None
+    cache.put('key', 'new result', model=new)
+    assert cache.get('key', new) == 'new result'
+    assert cache.get('key', old) is None
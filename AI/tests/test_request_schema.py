@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_frame
+from model_specs import SPECS
+from request_schema import MAX_TEXT_LENGTH, SchemaError, _NumberField, compile_schema
+from training import fit
+
+NA_INPUTS = ['', 'N/A', 'NA', 'null', 'None', None, float('nan')]
+
+
+@pytest.fixture(scope='module')
+def individual(pipelines):
+    return compile_schema(pipelines['individual'], SPECS['individual'].features)
+
+
+@pytest.fixture(scope='module')
+def without_nan():
+    """community-resources schema of a model that never saw a missing value (no imputer either)."""
+    spec = SPECS['community_resources']
+    pipeline = fit(spec, synthetic_frame(spec).fillna('No'), n_jobs=1, forest_params={'n_estimators': 4})
+    return compile_schema(pipeline, spec.features)
+
+
+def test_malformed_body_is_400(individual):
+    for body in (None, [], 'text'):
+        with pytest.raises(SchemaError) as e:
+            individual.record(body)
+        assert (e.value.status, e.value.field) == (400, 'userData')
+
+
+def test_invalid_field_is_422(individual):
+    with pytest.raises(SchemaError) as e:
+        individual.record({'Age': 'forty'})
+    assert (e.value.status, e.value.field) == (422, 'Age')
+
+
+def test_record_holds_exactly_the_features_in_order(individual):
+    record = individual.record({'Unknown': 'x', 'Age': 30, 'State': 'Yes'})
+    assert list(record) == SPECS['individual'].features
+    assert record['Age'] == 30.0 and record['State'] == 'Yes'
+
+
+@pytest.mark.parametrize('value', NA_INPUTS)
+def test_missing_is_nan_where_the_column_takes_nan(value, individual, without_nan):
+    assert math.isnan(individual.record({'State': value})['State'])
+    assert math.isnan(individual.record({'Age': value})['Age'])
+    # An encoder that never saw NaN would fail on it: an ignored '' instead
+    assert without_nan.record({'Village': value})['Village'] == ''
+
+
+def test_missing_key_is_missing(individual, without_nan):
+    assert math.isnan(individual.record({})['Pattas'])
+    assert without_nan.record({})['District'] == ''
+
+
+def test_required_number_without_imputer():
+    field = _NumberField('Age', imputed=False)
+    with pytest.raises(SchemaError, match="'Age' is required"):
+        field.convert('N/A')
+
+
+@pytest.mark.parametrize('value, expected', [(42, 42.0), (41.5, 41.5), ('42', 42.0), (' 7 ', 7.0)])
+def test_numbers_and_numeric_strings_are_accepted(value, expected, individual):
+    assert individual.record({'Age': value})['Age'] == expected
+
+
+@pytest.mark.parametrize('value', [True, False, 'forty', 'inf', float('inf'), -float('inf'), [42], {'v': 1}])
+def test_bools_non_numbers_and_non_finite_numbers_are_rejected(value, individual):
+    with pytest.raises(SchemaError) as e:
+        individual.record({'Age': value})
+    assert (e.value.status, e.value.field) == (422, 'Age')
+
+
+@pytest.mark.parametrize('value, expected', [(12, '12'), (12.0, '12'), (12.5, '12.5'), ('Yes', 'Yes')])
+def test_categories_are_matched_as_text(value, expected, without_nan):
+    assert without_nan.record({'Compartment No': value})['Compartment No'] == expected
+
+
+@pytest.mark.parametrize('value', [True, ['Yes'], {'a': 1}, float('inf')])
+def test_non_text_categories_are_rejected(value, without_nan):
+    with pytest.raises(SchemaError) as e:
+        without_nan.record({'Village': value})
+    assert e.value.field == 'Village'
+
+
+def test_max_text_length(individual):
+    assert individual.record({'State': 'x' * MAX_TEXT_LENGTH})['State'] == 'x' * MAX_TEXT_LENGTH
+    with pytest.raises(SchemaError, match=f'longer than {MAX_TEXT_LENGTH}'):
+        individual.record({'State': 'x' * (MAX_TEXT_LENGTH + 1)})
+
+
+def test_undescribed_pipeline_gets_text_fields():
+    schema = compile_schema(object(), ['a', 'b'])
+    assert schema.record({'a': 'N/A', 'b': 3}) == {'a': '', 'b': '3'}
+
+
+def test_convert_columns_matches_record_and_reports_first_invalid_field(individual):
+    features = SPECS['individual'].features
+    rows = pd.DataFrame([
+        dict.fromkeys(features, 'Yes') | {'Age': '31', 'Extent of Land in Forest Villages': 'N/A'},
+        dict.fromkeys(features, 'Yes') | {'State': 'x' * (MAX_TEXT_LENGTH + 1), 'Age': 'old'},
+        dict.fromkeys(features, 'NA') | {'Age': 'old'},
+        dict.fromkeys(features, '') | {'Age': '40'},
+    ], columns=features, index=[10, 11, 12, 13])
+
+    frame, errors = individual.convert_columns(rows)
+    # Positions, not index labels; one error per row, the first field in feature order
+    assert sorted(errors) == [1, 2]
+    assert errors[1].field == 'State' and errors[2].field == 'Age'
+    assert list(frame.index) == [10, 11, 12, 13]
+    assert frame['Age'].dtype == np.float64
+    for position in (0, 3):
+        expected = individual.record(rows.iloc[position].to_dict())
+        for feature in features:
+            got, want = frame.iloc[position][feature], expected[feature]
+            assert got == want or (isinstance(want, float) and math.isnan(want) and math.isnan(got))
@@ -0,0 +1,80 @@
+import pytest
+
+from conftest import request_records
+from model_specs import SPECS
+
+URL = '/api/community/predict'
+USER = dict.fromkeys(SPECS['community'].features, 'Yes')
+
+
+def post(client, **options):
+    response = client.post(URL, json={'userData': USER, **options})
+    return response.status_code, response.get_json()
+
+
+def test_without_options_the_response_is_unchanged(client):
+    status, body = post(client)
+    assert status == 200
+    assert 'schemeScores' not in body and 'topSchemes' not in body
+    assert all(set(scheme) == {'name', 'description'} for scheme in body['recommendedSchemes'])
+
+
+@pytest.mark.parametrize('value', [True, 'true', 'True', 'TRUE', '1', 1])
+def test_include_probabilities(client, value):
+    status, body = post(client, includeProbabilities=value)
+    assert status == 200
+    scores = [scheme['probability'] for scheme in body['schemeScores']]
+    assert len(scores) == len(SPECS['community'].scheme_mapping)
+    assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize('value', [False, 'false', 'False', 'FALSE', '0', 0, ''])
+def test_include_probabilities_off(client, value):
+    status, body = post(client, includeProbabilities=value)
+    assert status == 200 and 'schemeScores' not in body
+
+
+@pytest.mark.parametrize('threshold', [0, 0.5, 1, '0.25'])
+def test_threshold_decides_eligibility_from_probabilities(client, threshold):
+    status, body = post(client, threshold=threshold)
+    assert status == 200
+    assert body['threshold'] == float(threshold)
+    eligible = [s['name'] for s in body['schemeScores'] if s['probability'] >= float(threshold)]
+    assert sorted(s['name'] for s in body['recommendedSchemes']) == sorted(eligible)
+    assert all(s['eligible'] == (s['name'] in eligible) for s in body['schemeScores'])
+
+
+@pytest.mark.parametrize('threshold', [True, False, -0.1, 1.5, 'high', [0.5], 'nan'])
+def test_invalid_threshold_is_400(client, threshold):
+    status, body = post(client, threshold=threshold)
+    assert status == 400 and body['field'] == 'threshold'
+
+
+@pytest.mark.parametrize('top_k, expected', [(1, 1), (2, 2), ('2', 2), (2.0, 2), (50, 3)])
+def test_top_k_returns_the_highest_ranked_schemes(client, top_k, expected):
+    status, body = post(client, topK=top_k)
+    assert status == 200
+    assert body['topSchemes'] == body['schemeScores'][:expected]
+
+
+@pytest.mark.parametrize('top_k', [True, 0, -1, 1.5, 'two', None])
+def test_invalid_top_k_is_400(client, top_k):
+    status, body = post(client, topK=top_k)
+    if top_k is None:
+        # An explicit null is the same as leaving topK out
+        assert status == 200 and 'topSchemes' not in body
+    else:
+        assert status == 400 and body['field'] == 'topK'
+
+
+def test_batch_routes_read_options_from_the_query_string(client, pipelines):
+    records, _ = request_records(SPECS['community'], pipelines['community'], n=5)
+    lines = [
+        client.post(f'/api/community/predict/batch?{query}', json={'userData': records}).get_data(as_text=True)
+        for query in ('includeProbabilities=True', 'includeProbabilities=False')
+    ]
+    # Every line but the closing summary is a record
+    assert all('schemeScores' in line for line in lines[0].splitlines()[:-1])
+    assert not any('schemeScores' in line for line in lines[1].splitlines())
+    # A query string has no booleans: 'true' is not a number
+    assert client.post('/api/community/predict/batch?topK=true', json={'userData': records}).status_code == 400
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import app
+from model_specs import SPECS
+from scoring import rank_schemes
+
+ROUTES = {
+    'individual': '/api/predict',
+    'community': '/api/community/predict',
+    'community_resources': '/api/community-resources/predict',
+}
+
+
+@pytest.fixture
+def form():
+    """One form carrying every model's fields."""
+    data = {}
+    for spec in SPECS.values():
+        data.update(dict.fromkeys(spec.categorical_features, 'Yes'))
+        data.update(dict.fromkeys(spec.numeric_features, 45))
+    data['FDST community'] = 'No'
+    return data
+
+
+def ranked(name, user_data, **options):
+    """The ranking a model gives the form, computed directly from predict_record."""
+    served = app.served_models[name]
+    active = served.get()
+    labels, probabilities = app.predict_record(served, active, active.schema.record(user_data))
+    # Through JSON, as the route answers
+    return json.loads(json.dumps(rank_schemes(labels, probabilities, active.scheme_mapping, **options)))
+
+
+def screen(client, **body):
+    response = client.post('/api/screen', json=body)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('threshold, top_k', [(None, None), (0.3, None), (0.6, 2), (None, 1)])
+def test_each_model_ranks_like_predict_record(client, form, threshold, top_k):
+    options = {k: v for k, v in (('threshold', threshold), ('topK', top_k)) if v is not None}
+    body = screen(client, userData=form, includeProbabilities=True, **options)
+
+    assert body['success'] and set(body['results']) == set(SPECS)
+    for name, result in body['results'].items():
+        expected = ranked(name, form, threshold=threshold, top_k=top_k)
+        assert {k: result[k] for k in expected} == expected
+        assert result['modelVersion'] == app.served_models[name].get().version
+        if threshold is not None:
+            eligible = {s['name'] for s in result['schemeScores'] if s['probability'] >= threshold}
+            assert {s['name'] for s in result['recommendedSchemes']} == eligible
+
+
+def test_each_result_matches_its_own_route(client, form):
+    results = screen(client, userData=form, threshold=0.5)['results']
+    for name, route in ROUTES.items():
+        single = client.post(route, json={'userData': form, 'threshold': 0.5}).get_json()
+        assert {k: v for k, v in results[name].items() if k != 'seconds'} == single
+
+
+def test_a_model_rejecting_the_form_does_not_stop_the_others(client, form):
+    form[SPECS['individual'].numeric_features[0]] = 'forty'
+    body = screen(client, userData=form, models=['individual', 'community'], topK=2)
+
+    assert set(body['results']) == {'individual', 'community'}
+    rejected = body['results']['individual']
+    assert not rejected['success'] and rejected['status'] == 422
+    assert rejected['field'] == SPECS['individual'].numeric_features[0]
+    assert body['success'] and body['results']['community']['topSchemes'] == ranked('community', form, top_k=2)['topSchemes']
+
+
+@pytest.mark.parametrize('body, field', [
+    ({'userData': {}, 'models': ['nope']}, 'models'),
+    ({'userData': [], 'models': ['community']}, 'userData'),
+    ({'userData': {}, 'threshold': True}, 'threshold'),
+])
+def test_malformed_screen_requests_are_400(client, body, field):
+    response = client.post('/api/screen', json=body)
+    assert response.status_code == 400 and response.get_json()['field'] == field
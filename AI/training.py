@@ -0,0 +1,375 @@
+"""
+Training library for the scheme recommendation models.
+
+Every model is described by a ModelSpec (model_specs.py); this module turns a
+spec plus a source CSV into a fitted pipeline, a .pkl artifact and, with
+--publish, a new registry version whose manifest the server reads (see
+model_registry.py). The per-model scripts under Individual/, community/ and
+"community resource/" are thin wrappers around train_model().
+
+Source CSVs are parsed once per process: when several models are trained from
+the same file, the union of their columns is read in a single chunked pass
+(text as categoricals) and cached, keyed by path, size and mtime.
+
+Usage:
+    python training.py all
+    python training.py individual --data Individual/fra_holders.csv
+    python training.py all --data statewide_export.csv --publish --report-limit 20
+    python training.py individual --incremental          # only process new/changed rows (incremental.py)
+    python training.py all --cache-encodings             # reuse encoded matrices across runs (encoding_store.py)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+import model_registry
+from model_specs import SPECS
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where `resource` is unavailable, e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# ================== SOURCE PARSING ==================
+
+_parsed_sources = {}
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _read_columns(path, columns, numeric_columns, chunksize):
+    """
+    Streams the CSV in chunks, keeping only `columns`. Text columns are read as
+    categoricals, so millions of repeated values like 'Yes'/'No' cost a small
+    integer code each instead of a Python string.
+    """
+    header = set(pd.read_csv(path, nrows=0).columns)
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise ValueError(f"'{path}' is missing columns: {', '.join(missing)}")
+
+    dtypes = {c: ('float64' if c in numeric_columns else 'category') for c in columns}
+    chunks = list(pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize))
+    if not chunks:
+        return pd.DataFrame({c: pd.Series(dtype=dtypes[c]) for c in columns})
+    # Chunks can see different category sets, so merge them rather than pd.concat
+    # (which would silently fall back to object columns).
+    return pd.DataFrame({
+        c: (union_categoricals([chunk[c] for chunk in chunks]) if dtypes[c] == 'category'
+            else pd.concat([chunk[c] for chunk in chunks], ignore_index=True))
+        for c in columns
+    })
+
+
+def read_source(path, columns, numeric_columns=(), chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Returns `columns` of the CSV at `path`, parsing only what is not cached yet.
+    The cache is invalidated when the file's size or mtime changes.
+    """
+    key = _source_key(path)
+    cached = _parsed_sources.get(key)
+    wanted = [c for c in columns if cached is None or c not in cached.columns]
+    if wanted:
+        parsed = _read_columns(path, wanted, set(numeric_columns), chunksize)
+        cached = parsed if cached is None else pd.concat([cached, parsed], axis=1)
+        for stale in [k for k in _parsed_sources if k[0] == key[0]]:
+            del _parsed_sources[stale]
+        _parsed_sources[key] = cached
+    return cached[list(columns)]
+
+
+def read_sources(specs, data_path=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Parses the training data for several specs, reading each distinct file once
+    for the union of the columns its models need. Returns {spec name: frame}.
+    """
+    by_path = {}
+    for spec in specs:
+        by_path.setdefault(data_path or spec.data_path, []).append(spec)
+
+    frames = {}
+    for path, path_specs in by_path.items():
+        columns = list(dict.fromkeys(c for spec in path_specs for c in spec.source_columns))
+        numeric = {c for spec in path_specs for c in spec.numeric_features}
+        source = read_source(path, columns, numeric, chunksize)
+        for spec in path_specs:
+            frames[spec.name] = source[spec.source_columns]
+    return frames
+
+
+# ================== PIPELINE ==================
+
+def build_pipeline(spec, n_jobs=None, forest_params=None):
+    """
+    The untrained pipeline for a spec: one-hot categoricals, mean-imputed
+    numerics, a multi-output forest. `forest_params` (e.g. from tuning.py)
+    override the RandomForestClassifier defaults.
+    """
+    if spec.impute_categorical:
+        categorical_transformer = Pipeline(steps=[
+            # Imputer handles any missing values in categorical data to prevent errors
+            ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+            ('onehot', OneHotEncoder(handle_unknown='ignore'))
+        ])
+    else:
+        categorical_transformer = OneHotEncoder(handle_unknown='ignore')
+
+    transformers = [('cat', categorical_transformer, spec.categorical_features)]
+    if spec.numeric_features:
+        transformers.append(('num', Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='mean'))
+        ]), spec.numeric_features))
+
+    return Pipeline(steps=[
+        ('preprocessor', ColumnTransformer(transformers=transformers, remainder=spec.remainder)),
+        ('classifier', MultiOutputClassifier(
+            RandomForestClassifier(random_state=42, n_jobs=n_jobs, **(forest_params or {}))))
+    ])
+
+
+def derive_labels(spec, df):
+    """Scheme eligibility columns, computed column-wise rather than row by row."""
+    return pd.DataFrame({target: rule(df) for target, rule in spec.labels}, index=df.index)
+
+
+def fit(spec, df, n_jobs=-1, encoded=None, forest_params=None):
+    """
+    Trains the spec's pipeline on `df` and returns it ready for single-row
+    serving. With `encoded` (encoding_store.EncodedData for the same rows) the
+    fitted preprocessor and encoded matrices are reused and only the forests
+    are trained; the result is the same pipeline.
+    """
+    pipeline = build_pipeline(spec, n_jobs, forest_params)
+    if encoded is None:
+        pipeline.fit(df[spec.features], derive_labels(spec, df))
+    else:
+        pipeline.steps[0] = ('preprocessor', encoded.preprocessor)
+        pipeline.named_steps['classifier'].fit(encoded.X, encoded.Y)
+    # Trees are identical whatever n_jobs was; serve single rows without a thread pool
+    pipeline.set_params(classifier__estimator__n_jobs=None)
+    for forest in pipeline.named_steps['classifier'].estimators_:
+        forest.n_jobs = None
+    return pipeline
+
+
+# ================== REPORT ==================
+
+def print_report(spec, df, predictions, report_limit=None):
+    """Prints recommended schemes per row (at most `report_limit` rows) and eligibility totals."""
+    subjects = df[spec.report_columns].to_dict('records') if report_limit is None \
+        else df[spec.report_columns].head(report_limit).to_dict('records')
+    for row, schemes_predictions in zip(subjects, predictions):
+        print("\n\n" + "=" * 60 + "\n")
+        print(f"Simulating application for {spec.report_subject(row)}")
+        print(spec.report_heading)
+        print("-" * 50)
+
+        print("Recommended Government Schemes & Benefits:")
+        recommended = [spec.scheme_mapping[i] for i, eligible in enumerate(schemes_predictions) if eligible]
+        if recommended:
+            for i, scheme in enumerate(recommended, 1):
+                print(f"{i}. **{scheme['name']}**")
+                print(f"   - {scheme['desc']}")
+        else:
+            print("No specific schemes were recommended based on the provided details.")
+    if report_limit is not None and len(df) > report_limit:
+        print(f"\n... report truncated after {report_limit} rows.")
+    print("\n" + "=" * 60)
+
+    eligible_counts = np.asarray(predictions).sum(axis=0)
+    print(f"{spec.label} rows scored: {len(df)}")
+    for i, count in enumerate(eligible_counts):
+        print(f"  {spec.scheme_mapping[i]['name']}: {int(count)} eligible")
+
+
+# ================== TRAIN + PUBLISH ==================
+
+def train_model(spec, df, data_path=None, artifact_path=None, n_jobs=-1,
+                report_limit=None, publish=False, cache_encodings=False):
+    """
+    Trains one model on an already parsed frame, saves the artifact, prints the
+    report and, with publish=True, registers the artifact as the new current
+    version. With cache_encodings=True the encoded training matrices come from
+    (or go to) the encoding store (encoding_store.py). Returns (pipeline, stats).
+    """
+    artifact_path = artifact_path or spec.artifact_path
+    print(f"Training the {spec.label} AI model on {len(df)} rows...")
+    started = time.perf_counter()
+    encoded = None
+    if cache_encodings and data_path:
+        import encoding_store
+        encoded, _ = encoding_store.encoded_training_data(spec, data_path, df)
+    pipeline = fit(spec, df, n_jobs, encoded)
+    trained = time.perf_counter()
+    print("Model training complete.")
+    save_artifact(pipeline, artifact_path)
+
+    # One batched prediction pass for the whole report
+    if encoded is not None:
+        predictions = pipeline.named_steps['classifier'].predict(encoded.X)
+    else:
+        predictions = pipeline.predict(df[spec.features])
+    predicted = time.perf_counter()
+    print_report(spec, df, predictions, report_limit)
+
+    stats = {
+        'rows': len(df),
+        'train_seconds': round(trained - started, 3),
+        'predict_seconds': round(predicted - trained, 3),
+    }
+    if publish:
+        stats['version'] = publish_artifact(spec, artifact_path, data_path, stats)
+    return pipeline, stats
+
+
+def save_artifact(pipeline, artifact_path):
+    try:
+        joblib.dump(pipeline, artifact_path)
+        print(f"✅ Model successfully saved to '{artifact_path}'.")
+    except Exception as e:
+        print(f"❌ Error saving the model: {e}")
+        raise
+
+
+def publish_artifact(spec, artifact_path, data_path, stats):
+    """Registers the artifact as the model's new current version; returns the version."""
+    manifest = model_registry.publish(
+        spec.name, artifact_path, spec.features, spec.scheme_mapping,
+        training_data=data_path, extra={'training': stats},
+    )
+    print(f"📦 Published {spec.name} {manifest['version']} to the model registry")
+    return manifest['version']
+
+
+def train_models(names, data_path=None, chunksize=DEFAULT_CHUNKSIZE, n_jobs=-1,
+                 report_limit=None, publish=False, output_dir=None, cache_encodings=False):
+    """
+    Trains the named models. With `data_path`, all of them read from that one
+    file, which is then parsed only once. Returns {name: pipeline}.
+    """
+    specs = [SPECS[name] for name in names]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    frames = read_sources(specs, data_path, chunksize)
+    loaded = time.perf_counter()
+    print(f"⏱️ parsed training data for {len(specs)} model(s) in {loaded - started:.2f}s")
+
+    pipelines = {}
+    for spec in specs:
+        artifact_path = None
+        if output_dir:
+            artifact_path = os.path.join(output_dir, os.path.basename(spec.artifact_file))
+        pipelines[spec.name], _ = train_model(
+            spec, frames[spec.name], data_path or spec.data_path, artifact_path,
+            n_jobs, report_limit, publish, cache_encodings,
+        )
+
+    peak = peak_rss_mb()
+    print(f"⏱️ load {loaded - started:.2f}s | total {time.perf_counter() - started:.2f}s | "
+          f"peak RSS {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
+    return pipelines
+
+
+def run_script(name, file_path, artifact_path, chunksize=DEFAULT_CHUNKSIZE, n_jobs=-1, report_limit=None):
+    """Entry point for the per-model scripts: train from `file_path` into `artifact_path`."""
+    spec = SPECS[name]
+    started = time.perf_counter()
+    try:
+        df = read_sources([spec], file_path, chunksize)[spec.name]
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found.")
+        print("Please ensure your CSV file is in the same directory as the script.")
+        return None
+    loaded = time.perf_counter()
+    pipeline, stats = train_model(spec, df, file_path, artifact_path, n_jobs, report_limit)
+    peak = peak_rss_mb()
+    print(f"⏱️ load {loaded - started:.2f}s | "
+          f"train {stats['train_seconds']:.2f}s | predict {stats['predict_seconds']:.2f}s | "
+          f"total {time.perf_counter() - started:.2f}s | "
+          f"peak RSS {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
+    return pipeline
+
+
+# ================== CLI ==================
+
+def refresh_models(names, args):
+    import incremental
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    drift_threshold = incremental.DEFAULT_DRIFT_THRESHOLD if args.drift_threshold is None else args.drift_threshold
+    for name in names:
+        spec = SPECS[name]
+        artifact_path = None
+        if args.output_dir:
+            artifact_path = os.path.join(args.output_dir, os.path.basename(spec.artifact_file))
+        incremental.refresh_model(
+            spec, args.data, artifact_path, drift_threshold, args.n_jobs, args.chunksize,
+            args.publish, args.state_dir,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the scheme recommendation models.")
+    parser.add_argument('models', nargs='*', default=['all'],
+                        help=f"models to train: {', '.join(SPECS)} or all (default)")
+    parser.add_argument('--data', help="train every selected model from this CSV instead of its default file")
+    parser.add_argument('--output-dir', help="write artifacts here instead of next to each default CSV")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="CSV rows read per chunk")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores used for training (-1 = all)")
+    parser.add_argument('--report-limit', type=int, default=None, help="print at most this many rows per model")
+    parser.add_argument('--publish', action='store_true', help="publish each artifact to the model registry")
+    parser.add_argument('--cache-encodings', action='store_true',
+                        help="reuse/store the encoded training matrices (encoding_store.py)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="refresh from the rows added/changed since the last incremental run")
+    parser.add_argument('--drift-threshold', type=float, default=None,
+                        help="with --incremental, retrain from scratch above this drift (default 0.2)")
+    parser.add_argument('--state-dir', help="with --incremental, where training state is kept")
+    args = parser.parse_args(argv)
+
+    names = list(SPECS) if 'all' in args.models else args.models
+    unknown = [name for name in names if name not in SPECS]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+
+    try:
+        if args.incremental:
+            refresh_models(names, args)
+        else:
+            train_models(names, args.data, args.chunksize, args.n_jobs, args.report_limit,
+                         args.publish, args.output_dir, args.cache_encodings)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
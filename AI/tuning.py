@@ -0,0 +1,294 @@
+"""
+Model-size vs. accuracy tuning for the scheme forests.
+
+The models are trained with RandomForestClassifier defaults: 100 trees per
+scheme, grown until every leaf is pure. The eligibility rules they learn are
+simple (`Scheduled Tribe == 'Yes'`, `Grazing == 'Yes'`, ...), so most of that
+size buys nothing, while artifact size, load time and per-request latency all
+grow with it. `tune_model` sweeps n_estimators x max_depth x min_samples_leaf
+and records for every setting:
+
+  - agreement: the share of held-out rows whose recommended schemes are
+    exactly those of the full (default) model, and accuracy against the
+    rule-derived labels
+  - single-record latency (p50/p95 of predict_proba on one encoded row) and
+    the batch cost per row
+  - the size of its joblib artifact and the time to load it in a fresh
+    interpreter
+
+The smallest setting whose disagreement stays within --budget is refitted on
+all rows and written as the production artifact (with --publish, also as a new
+registry version whose manifest records the chosen parameters).
+
+Each model's data is parsed and encoded once (through the encoding store with
+--cache-encodings), and every max_depth x min_samples_leaf pair is trained only
+once, with the largest tree count: each tree's seed is drawn in turn from
+random_state, so a forest's first k trees are the forest n_estimators=k would
+have grown, and the smaller counts are taken as prefixes.
+
+Usage:
+    python tuning.py individual
+    python tuning.py all --data statewide_export.csv --budget 0.002 --publish
+    python tuning.py community --n-estimators 10 25 50 --max-depth none 6 --results tuning.json
+    python tuning.py community_resources --report-only
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+import training
+from benchmark import environment, summarize
+from compact_model import measure_load
+from model_specs import SPECS
+
+# The setting every model is trained with today, i.e. the "full model"
+REFERENCE_PARAMS = {'n_estimators': 100, 'max_depth': None, 'min_samples_leaf': 1}
+DEFAULT_N_ESTIMATORS = [10, 25, 50, 100]
+DEFAULT_MAX_DEPTH = [None, 4, 8, 16]
+DEFAULT_MIN_SAMPLES_LEAF = [1, 5, 20]
+# Largest share of held-out rows whose schemes may differ from the full model's
+DEFAULT_BUDGET = 0.001
+DEFAULT_HOLDOUT = 0.2
+# Held-out rows timed one at a time per setting
+LATENCY_ROWS = 200
+
+
+# ================== CANDIDATES ==================
+
+def split_rows(n, holdout=DEFAULT_HOLDOUT, seed=0):
+    """(train, held-out) row indices, each in file order."""
+    if n < 2:
+        raise ValueError(f"need at least 2 rows to tune, got {n}")
+    order = np.random.default_rng(seed).permutation(n)
+    cut = n - min(n - 1, max(1, round(n * holdout)))
+    return np.sort(order[:cut]), np.sort(order[cut:])
+
+
+def first_trees(classifier, n_estimators):
+    """A copy of a fitted MultiOutputClassifier keeping the first `n_estimators` trees of each forest."""
+    pruned = copy.copy(classifier)
+    pruned.estimators_ = []
+    for forest in classifier.estimators_:
+        forest = copy.copy(forest)
+        forest.estimators_ = forest.estimators_[:n_estimators]
+        forest.n_estimators = n_estimators
+        forest.n_jobs = None
+        pruned.estimators_.append(forest)
+    return pruned
+
+
+def measure(classifier, preprocessor, X, Y, reference, workdir, latency_rows=LATENCY_ROWS, load_repeats=1):
+    """Agreement, accuracy, latency, artifact size and load time of one candidate on the held-out rows."""
+    from sklearn.pipeline import Pipeline
+
+    started = time.perf_counter()
+    predicted = classifier.predict(X)
+    batch_seconds = time.perf_counter() - started
+    samples = []
+    for i in range(min(latency_rows, X.shape[0])):
+        row = X[i:i + 1]
+        started = time.perf_counter()
+        classifier.predict_proba(row)
+        samples.append(time.perf_counter() - started)
+    latency = summarize(samples)
+
+    path = os.path.join(workdir, 'candidate.pkl')
+    joblib.dump(Pipeline(steps=[('preprocessor', preprocessor), ('classifier', classifier)]), path)
+    load_seconds = min(measure_load(path, None)['load_seconds'] for _ in range(load_repeats))
+    return {
+        'agreement': float((predicted == reference).all(axis=1).mean()),
+        'label_accuracy': float((predicted == Y).all(axis=1).mean()),
+        'p50_ms': latency['p50_ms'],
+        'p95_ms': latency['p95_ms'],
+        'batch_us_per_row': round(batch_seconds / X.shape[0] * 1e6, 3),
+        'nodes': int(sum(tree.tree_.node_count for forest in classifier.estimators_ for tree in forest.estimators_)),
+        'artifact_bytes': os.path.getsize(path),
+        'load_seconds': round(load_seconds, 4),
+    }
+
+
+def choose(results, budget=DEFAULT_BUDGET):
+    """The smallest artifact (then the fastest) whose disagreement with the full model is within `budget`."""
+    within = [r for r in results if 1 - r['agreement'] <= budget + 1e-12]
+    return min(within, key=lambda r: (r['artifact_bytes'], r['p50_ms']))
+
+
+def _params(result):
+    return {k: result[k] for k in REFERENCE_PARAMS}
+
+
+# ================== TUNE ==================
+
+def tune_model(spec, df, data_path, n_estimators=DEFAULT_N_ESTIMATORS, max_depth=DEFAULT_MAX_DEPTH,
+               min_samples_leaf=DEFAULT_MIN_SAMPLES_LEAF, budget=DEFAULT_BUDGET, holdout=DEFAULT_HOLDOUT,
+               seed=0, n_jobs=-1, latency_rows=LATENCY_ROWS, load_repeats=1, cache_encodings=False):
+    """
+    Sweeps the grid for one model on an already parsed frame. Returns
+    (encoded data, summary) where the summary holds every candidate's
+    measurements and the chosen setting.
+    """
+    import encoding_store
+
+    if cache_encodings:
+        encoded, _ = encoding_store.encoded_training_data(spec, data_path, df)
+    else:
+        encoded = encoding_store.encode(spec, df)
+    train, held = split_rows(len(encoded.Y), holdout, seed)
+    X_train, Y_train = encoded.X[train], encoded.Y[train]
+    X_held, Y_held = encoded.X[held], encoded.Y[held]
+
+    reference_pair = (REFERENCE_PARAMS['max_depth'], REFERENCE_PARAMS['min_samples_leaf'])
+    pairs = list(dict.fromkeys([reference_pair] + [(d, l) for d in max_depth for l in min_samples_leaf]))
+    trees = max(max(n_estimators), REFERENCE_PARAMS['n_estimators'])
+    print(f"🔧 Tuning the {spec.label} model: {len(train)} training / {len(held)} held-out rows, "
+          f"{len(pairs)} depth/leaf settings up to {trees} trees")
+
+    reference = None
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ai-tune-") as workdir:
+        for depth, leaf in pairs:
+            started = time.perf_counter()
+            params = {'n_estimators': trees, 'max_depth': depth, 'min_samples_leaf': leaf}
+            classifier = training.build_pipeline(spec, n_jobs, params).named_steps['classifier']
+            classifier.fit(X_train, Y_train)
+            print(f"  🌲 max_depth={depth}, min_samples_leaf={leaf}: {trees} trees per scheme "
+                  f"in {time.perf_counter() - started:.2f}s")
+
+            counts = set(n_estimators)
+            if (depth, leaf) == reference_pair:
+                counts.add(REFERENCE_PARAMS['n_estimators'])
+                reference = first_trees(classifier, REFERENCE_PARAMS['n_estimators']).predict(X_held)
+            for count in sorted(counts):
+                result = {'n_estimators': count, 'max_depth': depth, 'min_samples_leaf': leaf}
+                result.update(measure(first_trees(classifier, count), encoded.preprocessor, X_held, Y_held,
+                                      reference, workdir, latency_rows, load_repeats))
+                result['reference'] = _params(result) == REFERENCE_PARAMS
+                results.append(result)
+            del classifier
+
+    chosen = choose(results, budget)
+    full = next(r for r in results if r['reference'])
+    summary = {
+        'rows': len(encoded.Y),
+        'holdout_rows': len(held),
+        'budget': budget,
+        'reference': REFERENCE_PARAMS,
+        'chosen': _params(chosen),
+        'chosen_agreement': chosen['agreement'],
+        'size_ratio': round(chosen['artifact_bytes'] / full['artifact_bytes'], 4),
+        'candidates': results,
+    }
+    return encoded, summary
+
+
+def print_table(spec, summary):
+    chosen = summary['chosen']
+    print(f"\n{spec.label} ({summary['holdout_rows']} held-out rows, budget {summary['budget']:.2%})")
+    print(f"  {'trees':>5} {'depth':>5} {'leaf':>4} {'agree':>8} {'accuracy':>8} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'us/row':>7} {'nodes':>9} {'bytes':>11} {'load ms':>8}")
+    for r in sorted(summary['candidates'], key=lambda r: r['artifact_bytes']):
+        mark = '✅' if _params(r) == chosen else ('* ' if r['reference'] else '  ')
+        print(f"{mark}{r['n_estimators']:>5} {str(r['max_depth']):>5} {r['min_samples_leaf']:>4} "
+              f"{r['agreement']:>8.2%} {r['label_accuracy']:>8.2%} {r['p50_ms']:>7.3f} {r['p95_ms']:>7.3f} "
+              f"{r['batch_us_per_row']:>7.2f} {r['nodes']:>9} {r['artifact_bytes']:>11} "
+              f"{r['load_seconds'] * 1000:>8.1f}")
+    print(f"  (* full model, ✅ chosen: {summary['size_ratio']:.1%} of the full model's size)")
+
+
+def emit(spec, df, encoded, summary, data_path, artifact_path=None, n_jobs=-1, publish=False):
+    """Refits the chosen setting on all rows and saves (and optionally publishes) it. Returns the pipeline."""
+    artifact_path = artifact_path or spec.artifact_path
+    params = summary['chosen']
+    started = time.perf_counter()
+    pipeline = training.fit(spec, df, n_jobs, encoded, forest_params=params)
+    print(f"📉 {spec.label} model refitted with {params} on {len(df)} rows "
+          f"in {time.perf_counter() - started:.2f}s")
+    training.save_artifact(pipeline, artifact_path)
+    if publish:
+        stats = {
+            'rows': len(df), 'forest_params': params,
+            'tuning': {k: v for k, v in summary.items() if k != 'candidates'},
+        }
+        training.publish_artifact(spec, artifact_path, data_path, stats)
+    return pipeline
+
+
+# ================== CLI ==================
+
+def _depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trade model size against agreement with the full model.")
+    parser.add_argument('models', nargs='*', default=['all'],
+                        help=f"models to tune: {', '.join(SPECS)} or all (default)")
+    parser.add_argument('--data', help="tune every selected model on this CSV instead of its default file")
+    parser.add_argument('--output-dir', help="write artifacts here instead of next to each default CSV")
+    parser.add_argument('--chunksize', type=int, default=training.DEFAULT_CHUNKSIZE, help="CSV rows read per chunk")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores used for training (-1 = all)")
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=DEFAULT_N_ESTIMATORS)
+    parser.add_argument('--max-depth', type=_depth, nargs='+', default=DEFAULT_MAX_DEPTH,
+                        help="tree depths to try ('none' = unbounded)")
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=DEFAULT_MIN_SAMPLES_LEAF)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="largest share of held-out rows allowed to disagree with the full model")
+    parser.add_argument('--holdout', type=float, default=DEFAULT_HOLDOUT, help="share of rows held out")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the held-out split")
+    parser.add_argument('--latency-rows', type=int, default=LATENCY_ROWS)
+    parser.add_argument('--load-repeats', type=int, default=1)
+    parser.add_argument('--cache-encodings', action='store_true',
+                        help="reuse/store the encoded training matrices (encoding_store.py)")
+    parser.add_argument('--report-only', action='store_true', help="measure and report, but write no artifact")
+    parser.add_argument('--publish', action='store_true', help="publish each chosen artifact to the model registry")
+    parser.add_argument('--results', help="also write every measurement to this JSON file")
+    args = parser.parse_args(argv)
+
+    names = list(SPECS) if 'all' in args.models else args.models
+    unknown = [name for name in names if name not in SPECS]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+    if not 0 < args.holdout < 1:
+        parser.error("--holdout must be between 0 and 1")
+
+    specs = [SPECS[name] for name in names]
+    results = {'created_at': time.time(), 'environment': environment(), 'models': {}}
+    try:
+        frames = training.read_sources(specs, args.data, args.chunksize)
+        if args.output_dir and not args.report_only:
+            os.makedirs(args.output_dir, exist_ok=True)
+        for spec in specs:
+            data_path = args.data or spec.data_path
+            encoded, summary = tune_model(
+                spec, frames[spec.name], data_path, args.n_estimators, args.max_depth, args.min_samples_leaf,
+                args.budget, args.holdout, args.seed, args.n_jobs, args.latency_rows, args.load_repeats,
+                args.cache_encodings,
+            )
+            results['models'][spec.name] = summary
+            print_table(spec, summary)
+            if not args.report_only:
+                artifact_path = None
+                if args.output_dir:
+                    artifact_path = os.path.join(args.output_dir, os.path.basename(spec.artifact_file))
+                emit(spec, frames[spec.name], encoded, summary, data_path, artifact_path, args.n_jobs, args.publish)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.results:
+        with open(args.results, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✅ Results written to '{args.results}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
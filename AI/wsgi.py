@@ -0,0 +1,13 @@
+"""
+Production WSGI entry point for the AI prediction service.
+
+Run with the bundled gunicorn config from the AI/ directory:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The config preloads this module in the gunicorn master, so the .pkl models
+(and their compiled fast-path arrays, when AI_FAST_INFERENCE=1) are loaded once
+and shared copy-on-write by every forked worker instead of once per worker.
+"""
+
+from app import app  # noqa: F401
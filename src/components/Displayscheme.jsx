@@ -10,6 +10,13 @@ export const Displayscheme = () => {
   const [userName, setUserName] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // "confidence" sorts by eligibility probability; "default" keeps the scheme order
+  const [sortBy, setSortBy] = useState('confidence');
+
+  // Probabilities come with the prediction, so re-sorting needs no new request
+  const displayedSchemes = sortBy === 'confidence'
+    ? [...recommendedSchemes].sort((a, b) => (b.probability ?? 0) - (a.probability ?? 0))
+    : recommendedSchemes;
 
   // ---------------- INDIVIDUAL FORM TRANSFORM ----------------
   const transformFormData = (formData) => {
@@ -71,7 +78,7 @@ export const Displayscheme = () => {
       const response = await fetch("http://localhost:5000/api/predict", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ userData }),
+        body: JSON.stringify({ userData, includeProbabilities: true }),
       });
       const data = await response.json();
       if (data.success) {
@@ -95,7 +102,7 @@ export const Displayscheme = () => {
       const response = await fetch("http://localhost:5000/api/community/predict", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ userData }),
+        body: JSON.stringify({ userData, includeProbabilities: true }),
       });
       const data = await response.json();
       if (data.success) {
@@ -119,7 +126,7 @@ export const Displayscheme = () => {
       const response = await fetch("http://localhost:5000/api/community-resources/predict", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ userData }),
+        body: JSON.stringify({ userData, includeProbabilities: true }),
       });
       const data = await response.json();
       if (data.success) {
@@ -164,11 +171,28 @@ export const Displayscheme = () => {
             <h2 className="text-lg font-semibold mb-3">
               Recommended Schemes for {userName}
             </h2>
+            <div className="flex items-center justify-end mb-2 text-sm">
+              <label htmlFor="sortBy" className="mr-2 text-gray-600">Sort by</label>
+              <select
+                id="sortBy"
+                value={sortBy}
+                onChange={(e) => setSortBy(e.target.value)}
+                className="border rounded px-2 py-1"
+              >
+                <option value="confidence">Confidence</option>
+                <option value="default">Default</option>
+              </select>
+            </div>
             <div className="border-2 border-green-400 p-4 rounded-lg">
-              {recommendedSchemes.map((scheme, index) => (
-                <div key={index} className="mb-3 last:mb-0">
+              {displayedSchemes.map((scheme, index) => (
+                <div key={scheme.name} className="mb-3 last:mb-0">
                   <h3 className="font-semibold text-green-800">
                     {index + 1}. {scheme.name}
+                    {scheme.probability !== undefined && (
+                      <span className="ml-2 text-sm font-normal text-gray-500">
+                        {Math.round(scheme.probability * 100)}% match
+                      </span>
+                    )}
                   </h3>
                   <p className="text-sm text-gray-600">{scheme.description}</p>
                 </div>